@@ -12,6 +12,7 @@ from sc2.player import Bot, Computer
 
 from sc2.sc2process import SC2Process
 from sc2.client import Client
+from sc2.protocol import ConnectionAlreadyClosed
 
 # Run ladder game
 # This lets python-sc2 connect to a LadderManager game: https://github.com/Cryptyc/Sc2LadderServer
@@ -67,7 +68,8 @@ def run_ladder_game(bot):
 # Modified version of sc2.main._join_game to allow custom host and port, and to not spawn an additional sc2process (thanks to alkurbatov for fix)
 async def join_ladder_game(host, port, players, realtime, portconfig, save_replay_as=None, step_time_limit=None, game_time_limit=None):
     ws_url = "ws://{}:{}/sc2api".format(host, port)
-    ws_connection = await aiohttp.ClientSession().ws_connect(ws_url, timeout=120)
+    session = aiohttp.ClientSession()
+    ws_connection = await session.ws_connect(ws_url, timeout=120)
     client = Client(ws_connection)
 
     try:
@@ -80,6 +82,17 @@ async def join_ladder_game(host, port, players, realtime, portconfig, save_repla
         logging.error(f"Connection was closed before the game ended")
         return None
     finally:
-        ws_connection.close()
+        await ws_connection.close()
+        await session.close()
 
     return result
+
+# Run several ladder games at the same time in one event loop, each over its own connection.
+# Each game is a dict of join_ladder_game() arguments, and each must have its own bot instance (e.g. Bot(Race.Protoss, CannonLoverBot())).
+# Returns the results in the same order (None for games whose connection was closed)
+def run_concurrent_games(games):
+    for i, game in enumerate(games):
+        for other in games[i + 1:]:
+            assert game["players"][0].ai is not other["players"][0].ai, "Games can't share a bot instance"
+
+    return asyncio.get_event_loop().run_until_complete(asyncio.gather(*[join_ladder_game(**game) for game in games]))
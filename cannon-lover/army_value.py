@@ -0,0 +1,20 @@
+import numpy as np
+
+
+# Sum the value of all units within each unit's counting radius, for many query positions at once.
+# positions is (M, 2), unit_positions is (N, 2), unit_values and unit_radii are (N,). Returns (M,).
+def values_within(positions, unit_positions, unit_values, unit_radii):
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    if len(unit_values) == 0:
+        return np.zeros(len(positions))
+
+    delta = positions[:, np.newaxis, :] - unit_positions[np.newaxis, :, :]
+    distance_squared = np.einsum("ijk,ijk->ij", delta, delta)
+    in_range = distance_squared < (unit_radii * unit_radii)[np.newaxis, :]
+
+    return in_range.astype(np.float64) @ unit_values
+
+
+# Turn unit arrays into per-unit values: health + shield * shield_weight + bonus
+def unit_values(health, shield, shield_weight, bonus):
+    return np.asarray(health, dtype=np.float64) + np.asarray(shield, dtype=np.float64) * np.asarray(shield_weight, dtype=np.float64) + np.asarray(bonus, dtype=np.float64)
@@ -0,0 +1,111 @@
+import numpy as np
+
+
+SECOND_WORKER_COST = 4 # Extra cost (distance units) of a second worker on a mineral patch, so patches get one worker each before any get two
+CLOSE_PATCH_WEIGHT = 1 # Cost per distance unit from the town hall to a patch, so patches close to the town hall (shorter trips) are filled first
+
+
+# Minimum cost assignment of rows to columns (Hungarian algorithm, shortest augmenting paths with potentials).
+# Each row gets at most one column and each column at most one row; if there are more rows than columns some rows get none.
+# Rows are first matched to a free column at their minimum, so only the rest need an augmenting path. The matrices here are small
+# (tens of rows), so the augmenting paths are searched on plain lists, where NumPy's per-call overhead would dominate.
+# Returns an array with the column of each row (-1 if none).
+def linear_assignment(costs):
+    costs = np.asarray(costs, dtype=np.float64)
+    transposed = costs.shape[0] > costs.shape[1]
+    if transposed:
+        costs = costs.T
+    rows, columns = costs.shape
+
+    # Row potentials start at the row minimums, column potentials at 0 (columns left without a row must keep a potential of at most 0)
+    row_minimums = costs.min(axis=1)
+    tight = costs - row_minimums[:, np.newaxis] <= 1e-9
+    matrix = costs.tolist()
+    u = row_minimums.tolist()
+    v = [0.0] * columns
+    row_of = [-1] * columns # Row matched to each column
+    column_of = [-1] * rows # Column matched to each row
+    for row in range(rows):
+        for column in np.flatnonzero(tight[row]).tolist():
+            if row_of[column] < 0:
+                row_of[column] = row
+                column_of[row] = column
+                break
+
+    for row in [row for row in range(rows) if column_of[row] < 0]:
+        # Shortest paths (in reduced costs) from row to every column, until we reach a column without a row
+        costs_row, u_row = matrix[row], u[row]
+        distances = [costs_row[column] - u_row - v[column] for column in range(columns)]
+        previous = [-1] * columns # Previous column on the shortest path (-1 if reached from row directly)
+        unvisited = list(range(columns))
+        visited = []
+        while True:
+            column = min(unvisited, key=distances.__getitem__)
+            distance = distances[column]
+            unvisited.remove(column)
+            visited.append(column)
+            other_row = row_of[column]
+            if other_row < 0:
+                break
+
+            costs_other = matrix[other_row]
+            offset = distance - costs_other[column] + v[column]
+            for next_column in unvisited:
+                candidate = offset + costs_other[next_column] - v[next_column]
+                if candidate < distances[next_column]:
+                    distances[next_column] = candidate
+                    previous[next_column] = column
+
+        # Update potentials, so matched pairs and the new path have zero reduced cost
+        u[row] += distance
+        for visited_column in visited[:-1]:
+            delta = distances[visited_column] - distance
+            v[visited_column] += delta
+            u[row_of[visited_column]] -= delta
+
+        # Flip the path
+        while True:
+            previous_column = previous[column]
+            new_row = row if previous_column < 0 else row_of[previous_column]
+            row_of[column] = new_row
+            column_of[new_row] = column
+            if previous_column < 0:
+                break
+            column = previous_column
+
+    return np.array(row_of if transposed else column_of, dtype=np.int64)
+
+
+# Assign workers to slots (e.g. one per worker a resource can take) by distance plus each slot's own cost.
+# Positions are (N, 2) arrays. Returns the slot of each worker (-1 if there are more workers than slots)
+def assign_workers(worker_positions, slot_positions, slot_costs=None):
+    worker_positions = np.asarray(worker_positions, dtype=np.float64).reshape(-1, 2)
+    slot_positions = np.asarray(slot_positions, dtype=np.float64).reshape(-1, 2)
+    if len(worker_positions) == 0 or len(slot_positions) == 0:
+        return np.full(len(worker_positions), -1, dtype=np.int64)
+
+    delta = worker_positions[:, np.newaxis, :] - slot_positions[np.newaxis, :, :]
+    costs = np.sqrt(np.einsum("ijk,ijk->ij", delta, delta))
+    if slot_costs is not None:
+        costs += np.asarray(slot_costs, dtype=np.float64)[np.newaxis, :]
+    return linear_assignment(costs)
+
+
+# Slots of mineral patches for assign_workers(): per_patch slots per patch, with the costs that fill patches close to the
+# town hall first and give every patch one worker before any gets two. Returns slot positions, slot costs and the patch of each slot
+def mineral_slots(patch_positions, townhall_position=None, per_patch=2):
+    patch_positions = np.asarray(patch_positions, dtype=np.float64).reshape(-1, 2)
+    patch_costs = np.zeros(len(patch_positions))
+    if townhall_position is not None:
+        patch_costs = CLOSE_PATCH_WEIGHT * np.hypot(patch_positions[:, 0] - townhall_position[0], patch_positions[:, 1] - townhall_position[1])
+
+    patches = np.tile(np.arange(len(patch_positions)), per_patch)
+    slot_costs = patch_costs[patches] + SECOND_WORKER_COST * np.repeat(np.arange(per_patch), len(patch_positions))
+    return patch_positions[patches], slot_costs, patches
+
+
+# Assign workers to mineral patches, at most per_patch workers each, close patches first. Returns the patch of each worker (-1 if there's no room)
+def assign_to_patches(worker_positions, patch_positions, townhall_position=None, per_patch=2):
+    slot_positions, slot_costs, patches = mineral_slots(patch_positions, townhall_position, per_patch)
+    slots = assign_workers(worker_positions, slot_positions, slot_costs)
+    return np.where(slots >= 0, patches[slots], -1)
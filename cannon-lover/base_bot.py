@@ -1,11 +1,29 @@
+import random, math, time, os
 
-import random, math, time
+import numpy as np
 
 import sc2
 from sc2 import Race, Difficulty
 from sc2.constants import *
 from sc2.player import Bot, Computer
 
+from spatial_index import SpatialIndex
+from unit_tables import UnitTable
+from pathing_service import PathingService
+from placement_grid import PlacementGrid
+from warp_planner import WarpPlanner
+from resource_manager import ResourceManager
+from assignment import assign_to_patches
+from influence_map import InfluenceMap
+from combat_sim import CombatSimulator
+from scheduler import Scheduler
+from profiler import Profiler
+from recorder import ObservationRecorder
+from enemy_memory import EnemyMemory
+from unit_history import UnitHistory
+from map_grid import pixel_map_to_array, cells_within_band
+from map_analysis import MapAnalysis, analyze_map, cache_path
+from flow_field import FlowFields
 
 # This fix is required for the queued order system to work correctly (self.execute_order_queue())
 import itertools
@@ -20,13 +38,131 @@ sc2.position.Pointlike.__eq__ = eq
 
 
 class BaseBot(sc2.BotAI):
-    under_construction = {}
-    timer = None
-    order_queue = []
-
-    remembered_enemy_units = []
-    remembered_enemy_units_by_tag = {}
-    remembered_friendly_units_by_tag = {}
+    # Settings (shared by all instances, override in subclasses or per instance)
+    enemy_unit_max_age = 1344 # Game loops (~60 seconds) an enemy unit is remembered after it was last seen (structures are remembered until we see they're gone)
+    unit_history_length = 16 # Steps of health and shield to remember per unit
+    units_to_ignore = set() # Unit types that don't count as threats or army (e.g. workers and overlords)
+    non_blocking_structure_types = {CREEPTUMOR, CREEPTUMORBURROWED, CREEPTUMORQUEEN} # Structures that units walk over, so they don't block paths
+    ability_snapshot_types = [] # Unit types whose abilities are fetched in one query each step (see update_ability_snapshot())
+    order_target_epsilon = 0.1 # Max distance between an order's target position and the unit's current target to count as the same order
+    placement_reservation_time = 672 # Game loops (~30 seconds) a chosen building spot stays reserved
+    step_time_budget = 0.04 # Wall-clock time (seconds) a step may take before low priority tasks get deferred
+    scheduled_tasks = {} # Task name -> (cadence in steps, priority, expected time in seconds)
+    profiling = True # Set to False to turn off timing instrumentation
+    profile_path = None # Where to save the profile summary (JSON) when the game ends, usually next to the replay
+    recording_path = None # Set to record observations, actions and queries to this file (can be replayed with OfflineClient.from_recording())
+    map_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "map_cache") # Where map analyses are saved (None to analyze every game)
+
+    # Game state lives on the instance, so several bots can play at the same time in one process (see run_concurrent_games() in __init__.py)
+    def __init__(self):
+        super().__init__()
+        self.under_construction = {}
+        self.timer = None
+        self.order_queue = []
+        self.order_queue_keys = set() # (unit tag, ability, target) of this step's orders, to drop repeats (see is_redundant_order())
+        self.order_queue_stats = {} # Queued, dropped and sent actions, and commands sent for the last step (see execute_order_queue())
+        self.random = random.Random() # This bot's own random numbers, so games played side by side don't share one sequence (seed it for repeatable games)
+
+        self.enemy_memory = None # EnemyMemory with every enemy unit we know about, also those not seen anymore (see remember_enemy_units())
+        self.remembered_enemy_units = []
+        self.unit_history = None # UnitHistory with our units' recent health and shield, for damage rates (see remember_friendly_units())
+
+        self.ability_snapshot = {} # Unit tag -> available abilities for this step
+
+        self.pathing = None # PathingService for batched, memoized ground distance queries
+        self.pathing_structure_tags = set() # Our structures and remembered enemy structures when pathing memo was last valid
+        self.pathable = None # Boolean grid [x, y] of cells that were pathable when the game started
+        self.flow_fields = None # FlowFields with ground distances and paths toward key locations, computed locally (see update_pathing())
+        self.placement = None # PlacementGrid for finding building spots locally (see update_placement())
+        self.influence = None # InfluenceMap of enemy threat and our strength (see update_influence())
+        self.combat = None # CombatSimulator for predicting fights (see predict_fight())
+        self.resources = None # ResourceManager with our bases' minerals and geysers and which worker mines what (see update_resources())
+        self.warp_planner = None # WarpPlanner that hands out a distinct powered warp-in spot to each warpgate (see warp_in())
+        self.scheduler = None # Scheduler that runs subsystems at their own cadence and within the step's time budget (see run_task())
+        self.profiler = None # Profiler that records subsystem timings (see measure())
+        self.recorder = None # ObservationRecorder, when recording the game
+        self.cached_expansion_locations = None # See expansion_locations
+        self.map_analysis = None # MapAnalysis with expansions, naturals, ramps and chokes, loaded or computed once per map (see analyze_map())
+
+        # Our units by type (e.g. self.unit_table.ready(NEXUS)), rebuilt every step like the spatial indexes. Remembered enemy units have no table:
+        # they're only looked up by position (self.enemy_index) and counted by type (self.enemy_memory.composition, kept up to date incrementally)
+        self.unit_table = None
+
+        # Spatial indexes, rebuilt every step (see build_spatial_indexes() and remember_enemy_units())
+        self.own_index = None
+        self.known_enemy_index = None
+        self.enemy_index = None
+        self.mineral_field_index = None
+        self.vespene_geyser_index = None
+
+    # Same as BotAI.expansion_locations, but cached per bot instead of once per process (which would give every game the first game's map).
+    # Uses the map analysis' expansions when there is one, so resources don't need to be grouped again
+    @property
+    def expansion_locations(self):
+        if self.cached_expansion_locations is None:
+            if self.map_analysis is not None:
+                self.cached_expansion_locations = self.map_analysis.expansion_resources(self.state.mineral_field | self.state.vespene_geyser)
+            else:
+                self.cached_expansion_locations = sc2.BotAI.expansion_locations.fget.__wrapped__(self)
+        return self.cached_expansion_locations
+
+    # Set up helpers that need the client (called once when game starts)
+    def on_start(self):
+        self.pathing = PathingService(self._client)
+        self.pathable = pixel_map_to_array(self.game_info.pathing_grid) > 0
+        self.flow_fields = FlowFields(self.game_info)
+        self.placement = PlacementGrid(self.game_info, self.random)
+        self.warp_planner = WarpPlanner(self.game_info)
+        self.resources = ResourceManager()
+        self.influence = InfluenceMap(self.game_info)
+        self.combat = CombatSimulator(self._game_data)
+        self.enemy_memory = EnemyMemory(self._game_data, self.enemy_unit_max_age)
+        self.unit_history = UnitHistory(self.unit_history_length)
+
+        self.scheduler = Scheduler(self.step_time_budget)
+        for name, (cadence, priority, budget) in self.scheduled_tasks.items():
+            self.scheduler.add_task(name, cadence, priority, budget)
+
+        self.profiler = Profiler(self.profiling)
+        self.profiler.attach(self._client)
+
+        if self.recording_path:
+            self.recorder = ObservationRecorder(self.recording_path)
+            self.recorder.write_game_info(self._game_info, self._game_data)
+            self.recorder.attach(self._client)
+
+    # Save profile summary (and finish recording) when the game ends
+    def on_end(self, result):
+        if self.recorder:
+            self.recorder.close()
+
+        if self.profiler.enabled and self.profile_path:
+            tasks = {name: {"runs": task.run_count, "deferred": task.defer_count} for name, task in self.scheduler.tasks.items()}
+            self.profiler.save(self.profile_path, {
+                "result": result.name,
+                "game_loop": self.state.game_loop,
+                "scheduler": {"overrun_steps": self.scheduler.overrun_count, "steps": self.scheduler.step_count, "tasks": tasks},
+            })
+
+    # Must be called at the start of each step
+    def begin_step(self, iteration):
+        self.scheduler.begin_step(iteration)
+        self.profiler.begin_step()
+
+    # Must be called at the end of each step, after execute_order_queue()
+    def end_step(self):
+        self.scheduler.end_step()
+        self.profiler.end_step()
+
+    # Await a subsystem, recording its duration when profiling
+    async def measure(self, name, function, *args):
+        return await self.profiler.measure(name, function, *args)
+
+    # Run a subsystem through the scheduler (only if it's due and there's time for it this step). Returns whether it ran
+    async def run_task(self, name, function, *args):
+        if self.profiler.enabled:
+            return await self.scheduler.run(name, self.profiler.measure, name, function, *args)
+        return await self.scheduler.run(name, function, *args)
 
     def reset_timer(self):
         self.timer = time.time()
@@ -57,22 +193,116 @@ class BaseBot(sc2.BotAI):
     def get_game_time(self):
         return self.state.game_loop*0.725*(1/16)
 
+    # Forget remembered ground distances and update flow fields when our structures or the enemy structures we remember have changed
+    # (placed or destroyed), as they can block paths (e.g. an enemy wall-off). Creep tumors and lifted structures don't block anything.
+    # Must be called once per step, after remember_enemy_units()
+    def update_pathing(self):
+        structures = [unit for unit in self.units.structure + self.remembered_enemy_units.structure
+                      if unit.type_id not in self.non_blocking_structure_types and not unit.is_flying]
+        structure_tags = {unit.tag for unit in structures}
+        self.flow_fields.set_game_loop(self.state.game_loop)
+        if structure_tags != self.pathing_structure_tags:
+            self.pathing.invalidate()
+            self.flow_fields.update([self.placement.unit_footprint(unit)[:4] for unit in structures])
+            self.pathing_structure_tags = structure_tags
+
+    # Update placement grid occupancy with our structures, remembered enemy structures, resources and creep, and warp-in spots with this step's power fields.
+    # Must be called once per step, after remember_enemy_units()
+    def update_placement(self):
+        structures = self.units.structure + self.remembered_enemy_units.structure
+        self.placement.update(structures + self.state.mineral_field + self.state.vespene_geyser, self.state.game_loop, pixel_map_to_array(self.state.creep) > 0)
+
+        ground_units = [unit for unit in self.units + self.known_enemy_units if not unit.is_structure and not unit.is_flying]
+        self.warp_planner.update(self.state.psionic_matrix.sources, self.placement.occupied > 0, ground_units)
+
+    # Sync worker assignments with this step's bases, resources and workers. Must be called once per step, after build_spatial_indexes()
+    def update_resources(self):
+        self.resources.update(self.unit_table.ready(NEXUS), self.state.mineral_field, self.state.vespene_geyser, self.unit_table(ASSIMILATOR), self.workers)
+
+    # Update the influence map with our units and remembered enemy units that can fight (valued by health + shield).
+    # Must be called once per step, after remember_enemy_units()
+    def update_influence(self):
+        def fighters(units):
+            return [(unit, unit.health + unit.shield) for unit in units if unit.is_ready and unit.type_id not in self.units_to_ignore]
+        self.influence.update(fighters(self.units), fighters(self.remembered_enemy_units))
+
+    # Our (attack level, armor level) for ground units. Shields count as half an armor level each, since they only protect the shield
+    def upgrade_levels(self):
+        upgrades = self.state.upgrades
+        def level(levels):
+            return sum(1 for upgrade in levels if upgrade in upgrades)
+        weapons = level([PROTOSSGROUNDWEAPONSLEVEL1, PROTOSSGROUNDWEAPONSLEVEL2, PROTOSSGROUNDWEAPONSLEVEL3])
+        armor = level([PROTOSSGROUNDARMORSLEVEL1, PROTOSSGROUNDARMORSLEVEL2, PROTOSSGROUNDARMORSLEVEL3])
+        shields = level([PROTOSSSHIELDSLEVEL1, PROTOSSSHIELDSLEVEL2, PROTOSSSHIELDSLEVEL3])
+        return weapons, armor + shields / 2
+
+    # Predict a fight between our units and enemy units. Enemy upgrades are unknown, so they're assumed to be none.
+    # Returns (winner, our remaining health + shield, enemy remaining health + shield), winner being 1 if we win, -1 if we lose and 0 if nobody does
+    def predict_fight(self, own_units, enemy_units):
+        return self.combat.predict_units(own_units, enemy_units, self.upgrade_levels())
+
+    # Centers of pathable cells between min_distance and max_distance from center, as an (N, 2) array
+    def pathable_cells_within(self, center, min_distance, max_distance):
+        xs, ys = cells_within_band(self.pathable, center, min_distance, max_distance)
+        return np.stack([xs + 0.5, ys + 0.5], axis=1)
+
+    # Ask the game which of the positions (closest first) the building can be placed at, in a single query. Returns None if none of them work
+    async def confirm_placement(self, building, positions):
+        if not positions:
+            return None
+
+        ability = self._game_data.units[building.value].creation_ability
+        results = await self._client.query_building_placement(ability, positions)
+        for position, result in zip(positions, results):
+            if result == sc2.data.ActionResult.Success:
+                return position
+
+        return None
+
+    # Load this map's analysis from the cache, or analyze the map (one pathing request) and save it for the next game.
+    # Call once at game start, after start_location is known
+    async def analyze_map(self):
+        spawns = [self.start_location] + list(self.enemy_start_locations)
+        path = cache_path(self.map_cache_dir, self.game_info, spawns) if self.map_cache_dir else None
+        if path:
+            self.map_analysis = MapAnalysis.load(path)
+        if self.map_analysis is None:
+            self.map_analysis = await analyze_map(self.game_info, spawns, self.expansion_locations, self.pathing)
+            if path:
+                try:
+                    self.map_analysis.save(path)
+                except OSError as e:
+                    print("Could not save map analysis: " + str(e))
+
     # Find enemy natural expansion location
     async def find_enemy_natural(self):
-        closest = None
-        distance = math.inf
+        enemy_start_location = sc2.position.Point2(self.enemy_start_locations[0])
+        if self.map_analysis is not None:
+            return self.map_analysis.natural(enemy_start_location)
+
+        expansions = []
         for el in self.expansion_locations:
             def is_near_to_expansion(t):
                 return t.position.distance_to(el) < self.EXPANSION_GAP_THRESHOLD
 
-            if is_near_to_expansion(sc2.position.Point2(self.enemy_start_locations[0])):
+            if is_near_to_expansion(enemy_start_location):
                 continue
 
             #if any(map(is_near_to_expansion, )):
                 # already taken
             #    continue
 
-            d = await self._client.query_pathing(self.enemy_start_locations[0], el)
+            expansions.append(el)
+
+        if not expansions:
+            return None
+
+        # Query distances to all expansions at once
+        distances = await self.pathing.distances([(enemy_start_location, el) for el in expansions])
+
+        closest = None
+        distance = math.inf
+        for el, d in zip(expansions, distances):
             if d is None:
                 continue
 
@@ -98,16 +328,20 @@ class BaseBot(sc2.BotAI):
         if worker is None:
             return None
 
-        # Check if path is blocked
-        distance = await self._client.query_pathing(worker.position, pos)
+        # Check if path is blocked. Both ends reachable from our main means there's a path between them (no need to ask the game), as the
+        # flow fields block both our structures and the enemy structures we've seen
+        if self.flow_fields.distance("main", worker.position) is not None and self.flow_fields.distance("main", pos) is not None:
+            return worker
+        distance = await self.pathing.distance(worker.position, pos)
         if distance is None:
             # Path is blocked, so return random worker
-            return self.workers.random
+            return self.random.choice(self.workers)
         else:
             # Path not blocked
             return worker
     
-    # Custom overridden build() to use select_worker() instead, and also try a random alternative if failing
+    # Custom overridden build() to use select_worker() instead, and also try a random alternative if failing.
+    # Spots are found on the local placement grid, and only the best few candidates are confirmed with the game (in one query)
     async def build(self, building, near, max_distance=20, unit=None, random_alternative=False, placement_step=2):
         """Build a building."""
 
@@ -116,15 +350,17 @@ class BaseBot(sc2.BotAI):
         elif near is not None:
             near = near.to2
 
-        is_valid_location = False
-        p = None
-
-        p = await self.find_placement(building, near.rounded, max_distance, random_alternative, placement_step)
+        candidates = self.placement.find_placements(building, near.rounded, max_distance, placement_step, random_alternative, self.state.psionic_matrix.sources)
+        p = await self.confirm_placement(building, candidates[:4])
         if p is None:
+            # Local grid doesn't know everything (e.g. units standing in the way or unseen enemy buildings), so fall back to asking the game
             p = await self.find_placement(building, near.rounded, max_distance, True, placement_step)
             if p is None:
                 return sc2.data.ActionResult.CantFindPlacementLocation
 
+        # Don't plan other buildings on this spot while the worker is on its way
+        self.placement.reserve(building, p, self.state.game_loop + self.placement_reservation_time)
+
         unit = unit or await self.select_worker(p)
 
         if unit is None:
@@ -132,6 +368,24 @@ class BaseBot(sc2.BotAI):
 
         return await self.do(unit.build(building, p))
 
+    # Build a building exactly at position (e.g. a spot planned in advance). Checked on the local placement grid first, then confirmed
+    # with the game (one query), as the grid doesn't know about enemy buildings and units we haven't seen.
+    # Returns ActionResult.CantFindPlacementLocation if the spot is taken or not powered
+    async def build_at(self, building, position, unit=None):
+        footprint = self.placement.building_footprint(building, position)
+        if footprint not in self.placement.reservations and not self.placement.can_place(building, position, self.state.psionic_matrix.sources):
+            return sc2.data.ActionResult.CantFindPlacementLocation
+        if await self.confirm_placement(building, [position]) is None:
+            return sc2.data.ActionResult.CantFindPlacementLocation
+
+        self.placement.reserve(building, position, self.state.game_loop + self.placement_reservation_time)
+
+        unit = unit or await self.select_worker(position)
+        if unit is None:
+            return sc2.data.ActionResult.Error
+
+        return await self.do(unit.build(building, position))
+
     # Give an order to unit(s)
     async def order(self, units, order, target=None, silent=True):
         if type(units) != list:
@@ -154,33 +408,93 @@ class BaseBot(sc2.BotAI):
         #self.vespene -= cost.vespene
         #print("Custom do done")
 
-    # Warp-in a unit nearby location from warpgate
+    # Warp-in a unit nearby location from warpgate, at a powered spot no other warpgate got this step.
+    # The order goes through the order queue, so all of the step's warp-ins are sent together
     async def warp_in(self, unit, location, warpgate):
         if isinstance(location, sc2.unit.Unit):
             location = location.position.to2
         elif location is not None:
             location = location.to2
 
-        x = random.randrange(-8,8)
-        y = random.randrange(-8,8)
-
-        placement = sc2.position.Point2((location.x+x,location.y+y))
+        placement = self.warp_planner.take(location)
+        if placement is None:
+            return sc2.data.ActionResult.CantFindPlacementLocation
 
         action = warpgate.warp_in(unit, placement)
-        error = await self._client.actions(action, game_data=self._game_data)
-
-        if not error:
-            cost = self._game_data.calculate_ability_cost(action.ability)
-            self.minerals -= cost.minerals
-            self.vespene -= cost.vespene
-            return None
-        else:
-            return error
-
-    # Execute all orders in self.order_queue and reset it
+        await self.do(action)
+
+        # Keep affordability and supply checks right for the rest of the step
+        cost = self._game_data.calculate_ability_cost(action.ability)
+        self.minerals -= cost.minerals
+        self.vespene -= cost.vespene
+        food = self._game_data.units[unit.value]._proto.food_required
+        self.supply_used += food
+        self.supply_left -= food
+        return None
+
+    # Execute all orders in self.order_queue and reset it.
+    # Orders the unit is already carrying out (or that were given twice) are dropped, and identical orders for different units are sent as one command
     async def execute_order_queue(self):
-        await self._client.actions(self.order_queue, game_data=self._game_data)
+        queued = len(self.order_queue)
+        actions = [action for action in self.order_queue if not self.is_redundant_order(action)]
+        actions = self.coalesce_orders(actions)
+        commands = len(list(itertools.groupby(actions, key=lambda action: action.combining_tuple)))
+
+        self.order_queue_stats = {"queued": queued, "dropped": queued - len(actions), "sent": len(actions), "commands": commands}
+        self.profiler.record("order_queue", queued)
+        self.profiler.record("orders_dropped", queued - len(actions))
+        self.profiler.record("order_commands", commands)
+
+        if actions:
+            await self._client.actions(actions, game_data=self._game_data)
         self.order_queue = [] # Reset order queue
+        self.order_queue_keys = set()
+
+    # Check if an order is the same (ability and target) as what the unit is already doing, or was already queued this step.
+    # Only orders with a target are checked, as repeating e.g. a train order queues up another unit
+    def is_redundant_order(self, action):
+        if action.target is None or action.queue:
+            return False
+
+        key = (action.unit.tag, action.ability, self.order_target_key(action.target))
+        if key in self.order_queue_keys:
+            return True
+        self.order_queue_keys.add(key)
+
+        if not action.unit.orders:
+            return False
+        order = action.unit.orders[0]
+        if order.ability.id != action.ability:
+            return False
+        if isinstance(action.target, sc2.unit.Unit):
+            return order.target == action.target.tag
+        return not isinstance(order.target, int) and abs(order.target.x - action.target.x) < self.order_target_epsilon and abs(order.target.y - action.target.y) < self.order_target_epsilon
+
+    # Hashable target of an order
+    def order_target_key(self, target):
+        if isinstance(target, sc2.unit.Unit):
+            return target.tag
+        if target is not None:
+            return (target.x, target.y)
+        return None
+
+    # Reorder actions so identical orders (same ability, target and queue flag) are next to each other and get sent as one command.
+    # Orders for the same unit keep their relative order
+    def coalesce_orders(self, actions):
+        groups = [] # Lists of actions with the same order
+        group_by_key = {} # Order -> index in groups
+        unit_group = {} # Unit tag -> index in groups of the unit's latest action
+        for action in actions:
+            key = (action.ability, self.order_target_key(action.target), action.queue)
+            index = group_by_key.get(key)
+            if index is None or index < unit_group.get(action.unit.tag, -1):
+                index = len(groups)
+                groups.append([])
+                group_by_key[key] = index
+            groups[index].append(action)
+            unit_group[action.unit.tag] = index
+
+        return [action for group in groups for action in group]
         
 
     async def train(self, unit_type, building):
@@ -197,10 +511,26 @@ class BaseBot(sc2.BotAI):
     async def can_upgrade(self, upgrade_type, building):
         return await self.has_ability(upgrade_type, building)
 
+    # Fetch available abilities for all our units of self.ability_snapshot_types in a single query.
+    # Must be called once per step, before anything calls has_ability()
+    async def update_ability_snapshot(self):
+        self.ability_snapshot = {}
+
+        units = self.units.filter(lambda unit: unit.type_id in self.ability_snapshot_types and unit.is_ready)
+        if not units.exists:
+            return
+
+        abilities = await self.get_available_abilities(units)
+        for unit, unit_abilities in zip(units, abilities):
+            self.ability_snapshot[unit.tag] = set(unit_abilities)
+
     # Check if a unit has an ability available (also checks upgrade costs??)
     async def has_ability(self, ability, unit):
-        abilities = await self.get_available_abilities(unit)
-        if ability in abilities:
+        # Units missing from this step's snapshot are queried separately (and remembered for the rest of the step)
+        if unit.tag not in self.ability_snapshot:
+            self.ability_snapshot[unit.tag] = set(await self.get_available_abilities(unit))
+
+        if ability in self.ability_snapshot[unit.tag]:
             return True
         else:
             return False
@@ -245,106 +575,49 @@ class BaseBot(sc2.BotAI):
     async def distribute_workers(self):
         """Distributes workers across all the bases taken."""
 
-        expansion_locations = self.expansion_locations
-        owned_expansions = self.owned_expansions
-        worker_pool = []
-
-        for location, townhall in owned_expansions.items():
-            workers = self.workers.closer_than(20, location)
-            actual = townhall.assigned_harvesters
-            ideal = townhall.ideal_harvesters
-            excess = actual-ideal
-            if actual > ideal:
-                worker_pool.extend(workers.random_group_of(min(excess, len(workers))))
-                continue
-        for g in self.geysers:
-            workers = self.workers.closer_than(5, g)
-            actual = g.assigned_harvesters
-            ideal = g.ideal_harvesters
-            excess = actual - ideal
-            if actual > ideal:
-                worker_pool.extend(workers.random_group_of(min(excess, len(workers))))
-                continue
-
-        for g in self.geysers:
-            actual = g.assigned_harvesters
-            ideal = g.ideal_harvesters
-            deficit = ideal - actual
-
-            for x in range(0, deficit):
-                if worker_pool:
-                    w = worker_pool.pop()
-                    if len(w.orders) == 1 and w.orders[0].ability.id in [AbilityId.HARVEST_RETURN]:
-                        await self.do(w.move(g))
-                        await self.do(w.return_resource(queue=True))
-                    elif len(w.orders) == 1 and w.orders[0].ability.id in [AbilityId.HARVEST_GATHER]:
-                        await self.do(w.gather(g))
-
-        for location, townhall in owned_expansions.items():
-            actual = townhall.assigned_harvesters
-            ideal = townhall.ideal_harvesters
-
-            deficit = ideal - actual
-            for x in range(0, deficit):
-                if worker_pool:
-                    w = worker_pool.pop()
-                    mf = self.state.mineral_field.closest_to(townhall)
-                    if len(w.orders) == 1 and w.orders[0].ability.id in [AbilityId.HARVEST_RETURN]:
-                        await self.do(w.move(townhall))
-                        await self.do(w.return_resource(queue=True))
-                        await self.do(w.gather(mf, queue=True))
-                    elif len(w.orders) == 1 and w.orders[0].ability.id in [AbilityId.HARVEST_GATHER]:
-                        await self.do(w.gather(mf))
+        for worker, resource, townhall_tag in self.resources.transfers():
+            if len(worker.orders) == 1 and worker.orders[0].ability.id in [AbilityId.HARVEST_RETURN]:
+                # Drop off what we carry at the new base first
+                await self.do(worker.move(self.resources.bases[townhall_tag].position))
+                await self.do(worker.return_resource(queue=True))
+                await self.do(worker.gather(resource, queue=True))
+            else:
+                await self.do(worker.gather(resource))
+            self.resources.assign(worker.tag, resource.tag)
 
+    # Send each starting worker to its own mineral patch (two at most), matching workers to patches with the least total distance
     async def worker_split(self):
-        for worker in self.workers:
-            closest_mineral_patch = self.state.mineral_field.closest_to(worker)
-            await self.do(worker.gather(closest_mineral_patch))
-            #await self.order(worker, HARVEST_GATHER, closest_mineral_patch)
-
-
-    # Remember enemy units' last position, even though they're not seen anymore
+        townhall = self.townhalls.first
+        minerals = self.mineral_field_index.closer_than(10, townhall)
+        patches = assign_to_patches([(worker.position.x, worker.position.y) for worker in self.workers],
+                                    [(mineral.position.x, mineral.position.y) for mineral in minerals], (townhall.position.x, townhall.position.y))
+        for worker, patch in zip(self.workers, patches):
+            mineral = minerals[patch] if patch >= 0 else self.mineral_field_index.closest_to(worker)
+            await self.do(worker.gather(mineral))
+            #await self.order(worker, HARVEST_GATHER, mineral)
+
+
+    # Build spatial indexes for this step's own units, known enemy units and resources, and the table of our units by type.
+    # Must be called at the start of each step, before remember_enemy_units()
+    def build_spatial_indexes(self):
+        self.unit_table = UnitTable(self.units, self._game_data)
+        self.own_index = SpatialIndex(self.units, self._game_data)
+        self.known_enemy_index = SpatialIndex(self.known_enemy_units, self._game_data)
+        self.mineral_field_index = SpatialIndex(self.state.mineral_field, self._game_data)
+        self.vespene_geyser_index = SpatialIndex(self.state.vespene_geyser, self._game_data)
+
+    # Remember enemy units' last position, even though they're not seen anymore.
+    # Units are forgotten when they die, when we see their last position without seeing them, or when they haven't been seen for a while
     def remember_enemy_units(self):
-        # Every 60 seconds, clear all remembered units (to clear out killed units)
-        #if round(self.get_game_time() % 60) == 0:
-        #    self.remembered_enemy_units_by_tag = {}
-
-        # Look through all currently seen units and add them to list of remembered units (override existing)
-        for unit in self.known_enemy_units:
-            unit.is_known_this_step = True
-            self.remembered_enemy_units_by_tag[unit.tag] = unit
-
-        # Convert to an sc2 Units object and place it in self.remembered_enemy_units
-        self.remembered_enemy_units = sc2.units.Units([], self._game_data)
-        for tag, unit in list(self.remembered_enemy_units_by_tag.items()):
-            # Make unit.is_seen = unit.is_visible 
-            if unit.is_known_this_step:
-                unit.is_seen = unit.is_visible # There are known structures that are not visible
-                unit.is_known_this_step = False # Set to false for next step
-            else:
-                unit.is_seen = False
-
-            # Units that are not visible while we have friendly units nearby likely don't exist anymore, so delete them
-            if not unit.is_seen and self.units.closer_than(7, unit).exists:
-                del self.remembered_enemy_units_by_tag[tag]
-                continue
+        visible = pixel_map_to_array(self.state.visibility) == 2
+        self.enemy_memory.update(self.known_enemy_units, self.state.game_loop, visible, self.state.dead_units)
 
-            self.remembered_enemy_units.append(unit)
+        self.remembered_enemy_units = self.enemy_memory.units()
+        self.enemy_index = SpatialIndex(self.remembered_enemy_units, self._game_data)
 
-    # Remember friendly units' previous state, so we can see if they're taking damage
+    # Remember friendly units' recent health and shield, so we can see how fast they're taking damage
+    # (see self.unit_history.damage_per_second() and time_to_death()). Must be called once per step
     def remember_friendly_units(self):
-        for unit in self.units:
-            unit.is_taking_damage = False
-
-            # If we already remember this friendly unit
-            if unit.tag in self.remembered_friendly_units_by_tag:
-                health_old = self.remembered_friendly_units_by_tag[unit.tag].health
-                shield_old = self.remembered_friendly_units_by_tag[unit.tag].shield
-
-                # Compare its health/shield since last step, to find out if it has taken any damage
-                if unit.health < health_old or unit.shield < shield_old:
-                    unit.is_taking_damage = True
-                
-            self.remembered_friendly_units_by_tag[unit.tag] = unit
+        self.unit_history.update(self.units, self.state.game_loop, self.state.dead_units)
 
         
\ No newline at end of file
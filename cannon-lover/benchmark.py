@@ -0,0 +1,262 @@
+# Headless benchmarks, run without the game binary (see offline_client.py and synthetic_game.py).
+# Usage: python benchmark.py on_step [--steps 200] [--army 20] [--strategy late_game] [--allocations]
+#        python benchmark.py concurrent [--games 4] [--steps 200]
+#        python benchmark.py combat [--units 100] [--iterations 1000]
+#        python benchmark.py assignment [--workers 24] [--patches 8] [--iterations 1000]
+#        python benchmark.py flow_field [--map-size 200] [--iterations 20]
+import sys, math, time, json, random, asyncio, argparse, logging, statistics, tracemalloc
+
+from synthetic_game import synthetic_game, synthetic_game_data
+from offline_client import run_offline_game
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def summarize(values, scale=1):
+    return {
+        "mean": statistics.mean(values) * scale,
+        "p50": percentile(values, 50) * scale,
+        "p95": percentile(values, 95) * scale,
+        "max": max(values) * scale,
+    }
+
+
+# Drive CannonLoverBot through a synthetic game and measure wall-clock time (and optionally memory allocated) per on_step()
+def benchmark_on_step(steps=200, army_size=20, enemy_army_size=20, strategy=None, allocations=False, seed=0):
+    from cannon_lover_bot import CannonLoverBot
+
+    client = synthetic_game(steps=steps, army_size=army_size, enemy_army_size=enemy_army_size, seed=seed)
+    bot = CannonLoverBot()
+    bot.profiling = False
+
+    durations = []
+    allocated = []
+    on_step = bot.on_step
+    async def timed_on_step(iteration):
+        if iteration == 1 and strategy:
+            bot.strategy = strategy # Force strategy after on_game_start() has picked one
+
+        if allocations:
+            tracemalloc.start()
+        start = time.perf_counter()
+        await on_step(iteration)
+        durations.append(time.perf_counter() - start)
+        if allocations:
+            allocated.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    bot.on_step = timed_on_step
+
+    asyncio.get_event_loop().run_until_complete(run_offline_game(bot, client))
+
+    result = {
+        "steps": len(durations),
+        "step_ms": summarize(durations[1:], 1000), # First step includes game start logic
+        "first_step_ms": durations[0] * 1000,
+        "requests_per_step": sum(client.request_counts.values()) / len(durations),
+        "actions": len(client.actions_sent),
+    }
+    if allocations:
+        result["peak_allocated_kb"] = summarize(allocated[1:], 1 / 1024)
+    return result
+
+
+# Play several synthetic games at the same time in one event loop (one CannonLoverBot and client each), and compare with playing them one by one
+def benchmark_concurrent(games=4, steps=200, army_size=20, seed=0):
+    from cannon_lover_bot import CannonLoverBot
+
+    def play(concurrent):
+        clients = [synthetic_game(steps=steps, army_size=army_size, enemy_army_size=army_size, seed=seed + i) for i in range(games)]
+        bots = [CannonLoverBot() for i in range(games)]
+        for i, bot in enumerate(bots):
+            bot.profiling = False
+            bot.random.seed(seed + i) # Same random choices in both runs, so each game sends the same actions
+            bot.step_time_budget = math.inf # Never defer tasks: deferring depends on wall-clock time, which playing games side by side changes
+
+        loop = asyncio.get_event_loop()
+        start = time.perf_counter()
+        if concurrent:
+            loop.run_until_complete(asyncio.gather(*[run_offline_game(bot, client) for bot, client in zip(bots, clients)]))
+        else:
+            for bot, client in zip(bots, clients):
+                loop.run_until_complete(run_offline_game(bot, client))
+        duration = time.perf_counter() - start
+
+        assert all(client.step_index == len(client.observations) - 1 for client in clients), "Not all games finished"
+        return duration, [[(game_loop, action.SerializeToString()) for game_loop, action in client.actions_sent] for client in clients]
+
+    sequential_time, sequential_actions = play(False)
+    concurrent_time, concurrent_actions = play(True)
+    assert sequential_actions == concurrent_actions, "Games played side by side sent different actions than when played one by one"
+    return {
+        "games": games,
+        "sequential_s": sequential_time,
+        "concurrent_s": concurrent_time,
+        "steps_per_second": games * steps / concurrent_time,
+        "actions": sum(len(actions) for actions in concurrent_actions),
+    }
+
+
+# CombatSimulator.predict() latency for units vs units fights of random army compositions
+def benchmark_combat(units=100, iterations=1000, seed=0):
+    import sc2
+    from sc2.constants import ZEALOT, STALKER, SENTRY, IMMORTAL, COLOSSUS, MARINE, MARAUDER
+    from combat_sim import CombatSimulator
+
+    simulator = CombatSimulator(sc2.game_data.GameData(synthetic_game_data()))
+    rng = random.Random(seed)
+    def army(types):
+        unit_types = [rng.choice(types).value for i in range(units)]
+        return unit_types, [rng.uniform(20, 200) for i in range(units)], [False] * units
+
+    fights = [(army([ZEALOT, STALKER, SENTRY, IMMORTAL, COLOSSUS]), army([MARINE, MARAUDER])) for i in range(iterations)]
+    simulator.predict(*fights[0][0], *fights[0][1]) # Load the unit type tables
+
+    durations = []
+    wins = 0
+    for own, enemy in fights:
+        start = time.perf_counter()
+        winner, own_remaining, enemy_remaining = simulator.predict(*own, *enemy, own_upgrades=(1, 1))
+        durations.append(time.perf_counter() - start)
+        wins += winner > 0
+
+    return {
+        "units": units,
+        "iterations": iterations,
+        "predict_ms": summarize(durations, 1000),
+        "win_rate": wins / iterations,
+    }
+
+
+# assign_to_patches() latency for workers around a base with a mineral line of patches
+def benchmark_assignment(workers=24, patches=8, iterations=1000, seed=0):
+    import numpy as np
+    from assignment import assign_to_patches
+
+    rng = np.random.default_rng(seed)
+    townhall = (50.0, 50.0)
+    angles = np.linspace(-0.8, 0.8, patches)
+    patch_positions = np.stack([townhall[0] + 7 * np.cos(angles), townhall[1] + 7 * np.sin(angles)], axis=1)
+
+    durations = []
+    for i in range(iterations):
+        worker_positions = rng.uniform(40, 60, (workers, 2))
+        start = time.perf_counter()
+        assigned = assign_to_patches(worker_positions, patch_positions, townhall)
+        durations.append(time.perf_counter() - start)
+
+    return {
+        "workers": workers,
+        "patches": patches,
+        "iterations": iterations,
+        "assign_ms": summarize(durations, 1000),
+        "assigned": int((assigned >= 0).sum()),
+    }
+
+
+# FlowField computation and query latency on a map about as large as the largest ladder maps, with cliffs and walls
+# (with gaps) in the way so paths wind around them
+def benchmark_flow_field(map_size=200, iterations=20, queries=10000, seed=0):
+    import numpy as np
+    from flow_field import FlowField
+
+    rng = np.random.default_rng(seed)
+    pathable = np.zeros((map_size, map_size), dtype=bool)
+    pathable[4:-4, 4:-4] = True
+    for i in range(map_size // 5):
+        x, y = rng.integers(10, map_size - 10, 2)
+        width, height = rng.integers(3, 20, 2)
+        pathable[x:x + width, y:y + height] = False
+    for wall in range(1, 4):
+        x = wall * map_size // 4
+        pathable[x:x + 2, :] = False
+        for gap in rng.integers(10, map_size - 10, 2):
+            pathable[x:x + 2, gap:gap + 6] = True
+
+    target = (8.5, 8.5)
+    durations = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        field = FlowField(pathable, target)
+        durations.append(time.perf_counter() - start)
+
+    positions = rng.uniform(4, map_size - 4, (queries, 2)).tolist()
+    start = time.perf_counter()
+    for position in positions:
+        field.distance(position)
+        field.towards(position, 4)
+    query_time = time.perf_counter() - start
+
+    return {
+        "map_size": map_size,
+        "iterations": iterations,
+        "compute_ms": summarize(durations, 1000),
+        "query_us": query_time / queries * 1e6,
+        "reachable": int(np.isfinite(field.distances).sum()),
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+
+    parser = argparse.ArgumentParser(description="Headless benchmarks")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    subparsers = parser.add_subparsers(dest="benchmark")
+
+    on_step_parser = subparsers.add_parser("on_step", help="CannonLoverBot.on_step() latency on a synthetic game")
+    on_step_parser.add_argument("--steps", type=int, default=200)
+    on_step_parser.add_argument("--army", type=int, default=20, help="Army size for both sides")
+    on_step_parser.add_argument("--strategy", choices=["early_game", "late_game", "panic"], help="Force a strategy")
+    on_step_parser.add_argument("--allocations", action="store_true", help="Also measure peak allocated memory per step (slower)")
+    on_step_parser.add_argument("--seed", type=int, default=0)
+
+    concurrent_parser = subparsers.add_parser("concurrent", help="Several CannonLoverBot games in one event loop")
+    concurrent_parser.add_argument("--games", type=int, default=4)
+    concurrent_parser.add_argument("--steps", type=int, default=200)
+    concurrent_parser.add_argument("--army", type=int, default=20, help="Army size for both sides")
+    concurrent_parser.add_argument("--seed", type=int, default=0)
+
+    combat_parser = subparsers.add_parser("combat", help="CombatSimulator.predict() latency for random fights")
+    combat_parser.add_argument("--units", type=int, default=100, help="Units per side")
+    combat_parser.add_argument("--iterations", type=int, default=1000)
+    combat_parser.add_argument("--seed", type=int, default=0)
+
+    assignment_parser = subparsers.add_parser("assignment", help="Worker to mineral patch assignment latency")
+    assignment_parser.add_argument("--workers", type=int, default=24)
+    assignment_parser.add_argument("--patches", type=int, default=8)
+    assignment_parser.add_argument("--iterations", type=int, default=1000)
+    assignment_parser.add_argument("--seed", type=int, default=0)
+
+    flow_field_parser = subparsers.add_parser("flow_field", help="Flow field computation and query latency")
+    flow_field_parser.add_argument("--map-size", type=int, default=200)
+    flow_field_parser.add_argument("--iterations", type=int, default=20)
+    flow_field_parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.benchmark == "on_step":
+        result = benchmark_on_step(args.steps, args.army, args.army, args.strategy, args.allocations, args.seed)
+    elif args.benchmark == "concurrent":
+        result = benchmark_concurrent(args.games, args.steps, args.army, args.seed)
+    elif args.benchmark == "combat":
+        result = benchmark_combat(args.units, args.iterations, args.seed)
+    elif args.benchmark == "assignment":
+        result = benchmark_assignment(args.workers, args.patches, args.iterations, args.seed)
+    elif args.benchmark == "flow_field":
+        result = benchmark_flow_field(args.map_size, args.iterations, seed=args.seed)
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        for key, value in result.items():
+            if isinstance(value, dict):
+                value = "  ".join("%s %.3f" % item for item in value.items())
+            print("%-20s %s" % (key, value))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 # Inspired by: https://github.com/Dentosal/python-sc2/blob/master/examples/cannon_rush.py
-import random, math, asyncio
+import math, asyncio
+
+import numpy as np
 
 import sc2
 from sc2 import Race, Difficulty
@@ -7,6 +9,9 @@ from sc2.constants import *
 from sc2.player import Bot, Computer
 
 from base_bot import BaseBot
+from scheduler import PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH
+from cannon_planner import CannonPlanner
+from army_value import values_within, unit_values
 
 # TODO: Better micro for first cannon builder
 # TODO: Bug, workers hunt enemies too far out
@@ -19,39 +24,77 @@ class CannonLoverBot(BaseBot):
     cannons_to_pylons_ratio = 2 # How many cannons to build per pylon at cannon_location
     sentry_ratio = 0.15 # Sentry ratio
     stalker_ratio = 0.6 #0.7 # Stalker/Zealot ratio (1 = only stalkers)
-    units_to_ignore = [DRONE, SCV, PROBE, EGG, LARVA, OVERLORD, OVERSEER, OBSERVER, BROODLING, INTERCEPTOR, MEDIVAC, CREEPTUMOR, CREEPTUMORBURROWED, CREEPTUMORQUEEN, CREEPTUMORMISSILE]
+    static_defense_types = [PHOTONCANNON, BUNKER, SPINECRAWLER] # Static defense that counts in fights and army value (health only)
+    ability_snapshot_types = [NEXUS, GATEWAY, WARPGATE, CYBERNETICSCORE, TWILIGHTCOUNCIL, FORGE, ROBOTICSFACILITY, STALKER, SENTRY] # Units we check abilities for
+    # Subsystems run by the scheduler: name -> (cadence in steps, priority, expected time in seconds).
+    # Micro and defense always run, while scouting, upgrades and chronoboost are deferred when a step runs long (e.g. big fights)
+    scheduled_tasks = {
+        "find_cannon_location": (1, PRIORITY_NORMAL, 0.001),
+        "manage_bases": (1, PRIORITY_HIGH, 0.005),
+        "cancel_buildings": (1, PRIORITY_HIGH, 0.001),
+        "chronoboost": (1, PRIORITY_LOW, 0.001),
+        "strategy": (1, PRIORITY_NORMAL, 0.01),
+        "distribute_workers": (10, PRIORITY_NORMAL, 0.005),
+        "scout": (1, PRIORITY_LOW, 0.002),
+        "upgrades": (1, PRIORITY_LOW, 0.002),
+        "move_workers": (1, PRIORITY_HIGH, 0.002),
+        "move_army": (1, PRIORITY_HIGH, 0.01),
+    }
+    units_to_ignore = {DRONE, SCV, PROBE, EGG, LARVA, OVERLORD, OVERSEER, OBSERVER, BROODLING, INTERCEPTOR, MEDIVAC, CREEPTUMOR, CREEPTUMORBURROWED, CREEPTUMORQUEEN, CREEPTUMORMISSILE}
+    army_types = (STALKER, ZEALOT, OBSERVER, COLOSSUS, IMMORTAL, SENTRY) # Our unit types controlled by move_army()
     army_size_minimum = 20 # Minimum number of army units before attacking.
     enemy_threat_distance = 50 # Enemy min distance from base before going into panic mode.
+    engage_margin = 0.2 # Fraction of health + shield we must be predicted to keep to start a fight (fights already started go on as long as we're predicted to win)
+    cheese_location_weight = 3 # How many times more likely buildable cells (where proxy buildings can be) are picked when scouting for cheese
+    escape_time_to_death = 8 # Army units with low shield escape when they would die in less than this many seconds at the rate they're taking damage
     max_worker_count = 70 # Max number of workers to build
     max_cannon_count = 15 # Max number of cannons
     gateways_per_nexus = 2 # Number of gateways per nexus
 
-    strategy = "early_game" # Set to "late_game" to skip cannon rush
-    cannon_location = None
-    start_location = None
-    enemy_start_location = None
-    #attack_target = None
-    has_sent_workers = False
-    iteration = 0
+    start_location = None # Overrides BotAI.start_location, so it can be set in on_game_start()
+
+    def __init__(self):
+        super().__init__()
+        self.strategy = "early_game" # Set to "late_game" to skip cannon rush
+        self.cannon_location = None
+        self.cannon_planner = None # CannonPlanner with the pylon and cannon spots of the rush, planned once the enemy start location is known
+        self.enemy_start_location = None
+        self.enemy_natural = None
+        #self.attack_target = None
+        self.has_sent_workers = False
+        self.cheese_locations = {} # (min distance, max distance) -> positions to scout for cheese (see find_random_cheese_location())
+        self.iteration = 0
 
 
     # This is run each game step
     async def on_step(self, iteration):
         # Store iteration
         self.iteration = iteration
+        self.begin_step(iteration)
+
+        # Index units by type and for fast radius and nearest lookups, and remember seen enemy units and previous state of friendly units
+        self.build_spatial_indexes()
+        self.remember_enemy_units()
+        self.remember_friendly_units()
 
         # On first game step, run start logic
         if iteration == 0:
-            await self.on_game_start()
+            await self.measure("on_game_start", self.on_game_start)
 
-        # Remember seen enemy units and previous state of friendly units
-        self.remember_enemy_units()
-        self.remember_friendly_units()
+        # Forget remembered ground distances if structures have changed, sync building spots with known structures, update threat map and worker assignments
+        self.update_pathing()
+        self.update_placement()
+        self.update_influence()
+        self.update_resources()
+
+        # Fetch available abilities (blink, chronoboost, warp-ins, research...) for all relevant units in one query
+        await self.measure("ability_snapshot", self.update_ability_snapshot)
 
         # Basic logic
-        await self.find_cannon_location() # Find next build location for cannons (and pylons)
-        await self.manage_bases() # Manage bases (train workers etc, but also base defense)
-        await self.cancel_buildings() # Make sure to cancel buildings under construction that are under attack
+        await self.run_task("find_cannon_location", self.find_cannon_location) # Find next build location for cannons (and pylons)
+        await self.run_task("manage_bases", self.manage_bases) # Manage bases (train workers etc, but also base defense)
+        await self.run_task("cancel_buildings", self.cancel_buildings) # Make sure to cancel buildings under construction that are under attack
+        await self.run_task("chronoboost", self.handle_chronoboosts) # Chronoboost with all nexuses
 
         # Change strategy to late game if above 3 minutes or if banking minerals
         if self.strategy == "early_game" and (self.get_game_time() / 60 > 3 or self.minerals > 800):
@@ -60,18 +103,20 @@ class CannonLoverBot(BaseBot):
 
         # Run strategy 
         if self.strategy == "early_game":
-            await self.early_game_strategy()
+            await self.run_task("strategy", self.early_game_strategy)
         elif self.strategy == "late_game":
-            await self.late_game_strategy()
+            await self.run_task("strategy", self.late_game_strategy)
         elif self.strategy == "panic":
-            await self.panic_strategy()
+            await self.run_task("strategy", self.panic_strategy)
         
         # Worker and stalker micro and movement
-        await self.move_workers()
-        await self.move_army()
+        await self.run_task("move_workers", self.move_workers)
+        await self.run_task("move_army", self.move_army)
 
         # Execute queued commands
-        await self.execute_order_queue()
+        await self.measure("execute_order_queue", self.execute_order_queue)
+
+        self.end_step()
 
     # Only run once at game start
     async def on_game_start(self):
@@ -79,9 +124,18 @@ class CannonLoverBot(BaseBot):
         await self.chat_send("(probe)(pylon)(cannon)(cannon)(gg)")
 
         # Save base locations for later
-        self.start_location = self.units(NEXUS).first.position
+        self.start_location = self.unit_table(NEXUS).first.position
+        await self.analyze_map()
         self.enemy_natural = await self.find_enemy_natural()
 
+        # Key locations to keep flow fields toward (computed when first used)
+        self.flow_fields.set_target("main", self.start_location)
+        natural = self.map_analysis.natural(self.start_location)
+        if natural:
+            self.flow_fields.set_target("natural", natural)
+        if len(self.enemy_start_locations) == 1:
+            self.flow_fields.set_target("enemy_start", self.enemy_start_locations[0])
+
         # Perform worker split
         await self.worker_split()
 
@@ -98,11 +152,11 @@ class CannonLoverBot(BaseBot):
 
     # Find next location for cannons/pylons
     async def find_cannon_location(self):
-        if self.units(PHOTONCANNON).amount > self.max_cannon_count:
+        if self.unit_table(PHOTONCANNON).amount > self.max_cannon_count:
             # Stop making cannons after we reached self.max_cannon_count
             self.cannon_location = None
             return
-        elif self.strategy == "late_game" and (not self.enemy_start_location or not self.units(PYLON).closer_than(self.cannon_start_distance+5, self.enemy_start_location).exists):
+        elif self.strategy == "late_game" and (not self.enemy_start_location or not self.own_index.any_closer_than(self.cannon_start_distance+5, self.enemy_start_location, PYLON)):
             # Also stop making cannons if we're in late-game and still have no pylon near enemy base
             self.cannon_location = None
             return
@@ -115,33 +169,63 @@ class CannonLoverBot(BaseBot):
             self.cannon_location = None
             return
 
-        # Find a good distance from enemy base (start further out and slowly close in)
-        distance = self.cannon_start_distance-(self.units(PYLON).closer_than(self.cannon_start_distance+5, target).amount*self.cannon_advancement_rate)
+        # Follow the rush plan: next pylon spot along the ground path to the enemy main
+        if self.cannon_planner is None:
+            self.plan_cannon_rush()
+        self.cannon_planner.update(self.unit_table(PYLON), self.unit_table(PHOTONCANNON))
+        if self.cannon_planner.location():
+            self.cannon_location = self.cannon_planner.location()
+            return
+
+        # No plan (no room for pylons along the path). Find a good distance from enemy base (start further out and slowly close in)
+        distance = self.cannon_start_distance-(self.own_index.closer_than(self.cannon_start_distance+5, target, PYLON).amount*self.cannon_advancement_rate)
         if distance < 0:
             distance = 0
 
         self.cannon_location = target.towards(approach_from, distance) #random.randrange(distance, distance+5)   #random.randrange(20, 30)
 
 
+    # Plan the cannon rush once: pylon spots every cannon_advancement_rate along the ground path from the enemy natural to the enemy main
+    # (from cannon_start_distance in), each with cannons_to_pylons_ratio cannon spots, out of sight of enemy structures we know about where possible
+    def plan_cannon_rush(self):
+        target = self.enemy_start_location
+        start = self.enemy_natural or self.game_info.map_center
+        field = self.flow_fields.field("enemy_start")
+        path, path_distances = field.path(start) if field else (np.zeros((0, 2)), np.zeros(0))
+        if len(path) == 0:
+            # No ground path known, use a straight line
+            path = np.linspace((start.x, start.y), (target.x, target.y), int(start.distance_to(target)) + 2)
+            path_distances = np.hypot(path[:, 0] - target.x, path[:, 1] - target.y)
+
+        # Free building spots, without the enemy's town hall (which we might not have seen yet)
+        free = self.placement.placeable & (self.placement.occupied == 0) & ~self.placement.creep
+        x, y, width, height, is_resource = self.placement.building_footprint(NEXUS, target)
+        free[max(x, 0):x + width, max(y, 0):y + height] = False
+
+        townhall_sight = self._game_data.units[NEXUS.value]._proto.sight_range
+        sight_sources = [(target, townhall_sight)] + [(unit.position, unit.sight_range) for unit in self.remembered_enemy_units.structure]
+
+        self.cannon_planner = CannonPlanner()
+        self.cannon_planner.plan(free, path, path_distances, target, self.cannon_start_distance, self.cannon_advancement_rate, self.cannons_to_pylons_ratio, sight_sources)
+
+
     async def manage_bases(self):
         # Do some logic for each nexus
-        for nexus in self.units(NEXUS).ready:
+        for nexus in self.unit_table.ready(NEXUS):
             # Train workers until at nexus max (+4)
             if self.workers.amount < self.max_worker_count and nexus.noqueue: # and nexus.assigned_harvesters < nexus.ideal_harvesters+2 :
                 if self.can_afford(PROBE) and self.supply_used < 198:
                     await self.do(nexus.train(PROBE))
 
-            # Always chronoboost when possible
-            await self.handle_chronoboost(nexus)
-
             # Idle workers near nexus should always be mining (we want to allow idle workers near cannons in enemy base)
-            if self.workers.idle.closer_than(50, nexus).exists:
-                worker = self.workers.idle.closer_than(50, nexus).first
-                await self.do(worker.gather(self.state.mineral_field.closest_to(nexus)))
+            idle_workers = self.own_index.closer_than(50, nexus, PROBE).idle
+            if idle_workers.exists:
+                worker = idle_workers.first
+                await self.gather_minerals(worker, nexus)
 
             # Worker defense: If enemy unit is near nexus, attack with a nearby workers
             # TODO: If up to 3 enemies, just attack with workers. If more, escape with workers from home and change mode to defense.
-            nearby_enemies = self.known_enemy_units.not_structure.filter(lambda unit: not unit.is_flying).closer_than(30, nexus).prefer_close_to(nexus)
+            nearby_enemies = self.known_enemy_index.closer_than(30, nexus).not_structure.not_flying.prefer_close_to(nexus)
             if nearby_enemies.amount >= 1 and nearby_enemies.amount <= 10 and self.workers.exists:
                 #if nearby_enemies.amount <= 4:
                 # TODO: Escape if too many enemies
@@ -151,26 +235,27 @@ class CannonLoverBot(BaseBot):
 
                 for worker in workers:
                     #if not self.has_order(ATTACK, worker):
-                    await self.do(worker.attack(nearby_enemies.closer_than(30, nexus).closest_to(worker)))
+                    await self.do(worker.attack(nearby_enemies.closest_to(worker))) # Already limited to enemies near nexus
 
                 #worker = self.workers.closest_to(nearby_enemies.first)
                 #if worker:
                 #    await self.do(worker.attack(nearby_enemies.first))
             else:
                 # No nearby enemies, so make sure to return all workers to base
-                for worker in self.workers.closer_than(50, nexus):
+                for worker in self.own_index.closer_than(50, nexus, PROBE):
                     if len(worker.orders) == 1 and worker.orders[0].ability.id in [ATTACK]:
-                        await self.do(worker.gather(self.state.mineral_field.closest_to(nexus)))
+                        await self.gather_minerals(worker, nexus)
 
 
             # Panic mode: Change cannon_location to nexus if we see many enemy units nearby
             if self.strategy == "early_game":
                 # TODO: Actually count enemies in early game and detect rush
-                num_nearby_enemy_structures = self.remembered_enemy_units.structure.closer_than(self.enemy_threat_distance, nexus).amount
-                num_nearby_enemy_units = self.remembered_enemy_units.not_structure.closer_than(self.enemy_threat_distance, nexus).amount
+                nearby_enemy_units = self.enemy_index.closer_than(self.enemy_threat_distance, nexus)
+                num_nearby_enemy_structures = nearby_enemy_units.structure.amount
+                num_nearby_enemy_units = nearby_enemy_units.amount - num_nearby_enemy_structures
                 min_defensive_cannons = num_nearby_enemy_structures + max(num_nearby_enemy_units-1, 0)
-                if (num_nearby_enemy_structures > 0 or num_nearby_enemy_units > 2) and self.units(PHOTONCANNON).closer_than(20, nexus).amount < min_defensive_cannons:
-                    self.cannon_location = nexus.position.towards(self.get_game_center_random(), random.randrange(5, 15)) #random.randrange(20, 30)
+                if (num_nearby_enemy_structures > 0 or num_nearby_enemy_units > 2) and self.own_index.closer_than(20, nexus, PHOTONCANNON).amount < min_defensive_cannons:
+                    self.cannon_location = nexus.position.towards(self.get_game_center_random(), self.random.randrange(5, 15)) #random.randrange(20, 30)
                     self.strategy = "panic"
                     await self.chat_send("That was scary! I'm going into panic mode...")
 
@@ -179,32 +264,38 @@ class CannonLoverBot(BaseBot):
                     await self.chat_send("Everything should be fine now. Let's macro!")
 
 
+    # Chronoboost with all nexuses
+    async def handle_chronoboosts(self):
+        for nexus in self.unit_table.ready(NEXUS):
+            # Always chronoboost when possible
+            await self.handle_chronoboost(nexus)
+
     # Chronoboost (CB) management
     async def handle_chronoboost(self, nexus):
         if await self.has_ability(EFFECT_CHRONOBOOSTENERGYCOST, nexus) and nexus.energy >= 50:
             # Always CB Warpgate research first
-            if self.units(CYBERNETICSCORE).ready.exists:
-                cybernetics = self.units(CYBERNETICSCORE).first
+            if self.unit_table.ready(CYBERNETICSCORE).exists:
+                cybernetics = self.unit_table(CYBERNETICSCORE).first
                 if not cybernetics.noqueue and not cybernetics.has_buff(CHRONOBOOSTENERGYCOST):
                     await self.do(nexus(EFFECT_CHRONOBOOSTENERGYCOST, cybernetics))
                     return # Don't CB anything else this step
 
             # Blink is also important
-            if self.units(TWILIGHTCOUNCIL).ready.exists:
-                twilight = self.units(TWILIGHTCOUNCIL).first
+            if self.unit_table.ready(TWILIGHTCOUNCIL).exists:
+                twilight = self.unit_table(TWILIGHTCOUNCIL).first
                 if not twilight.noqueue and not twilight.has_buff(CHRONOBOOSTENERGYCOST):
                     await self.do(nexus(EFFECT_CHRONOBOOSTENERGYCOST, twilight))
                     return # Don't CB anything else this step
 
             # Next, focus on Forge
-            if self.units(FORGE).ready.exists:
-                forge = self.units(FORGE).first
+            if self.unit_table.ready(FORGE).exists:
+                forge = self.unit_table(FORGE).first
                 if not forge.noqueue and not forge.has_buff(CHRONOBOOSTENERGYCOST):
                     await self.do(nexus(EFFECT_CHRONOBOOSTENERGYCOST, forge))
                     return # Don't CB anything else this step
 
             # Next, prioritize CB on gates
-            for gateway in (self.units(GATEWAY).ready | self.units(WARPGATE).ready):
+            for gateway in self.unit_table.ready(GATEWAY, WARPGATE):
                 if not gateway.has_buff(CHRONOBOOSTENERGYCOST):
                     await self.do(nexus(EFFECT_CHRONOBOOSTENERGYCOST, gateway))
                     return # Don't CB anything else this step
@@ -223,14 +314,31 @@ class CannonLoverBot(BaseBot):
         if self.has_order([PROTOSSBUILD_PHOTONCANNON, PROTOSSBUILD_PYLON], self.workers): #.closer_than(50, self.cannon_location)
             return
 
-        num_cannons = self.units(PHOTONCANNON).ready.closer_than(15, self.cannon_location).amount + self.already_pending(PHOTONCANNON)
-        num_pylons = self.units(PYLON).ready.filter(lambda unit: unit.shield > 0).closer_than(15, self.cannon_location).amount + self.already_pending(PYLON)
+        # Follow the rush plan (see find_cannon_location()): fill the cannon spots of the pylons we have, then build the next pylon
+        if self.cannon_planner and self.cannon_location == self.cannon_planner.location():
+            cannon = self.cannon_planner.next_cannon()
+            if cannon:
+                pylon_tag, position = cannon
+                pylon = self.unit_table(PYLON).find_by_tag(pylon_tag)
+                if pylon and pylon.is_ready and self.can_afford(PHOTONCANNON) and self.unit_table.ready(FORGE).exists:
+                    if await self.build_at(PHOTONCANNON, position) == sc2.data.ActionResult.CantFindPlacementLocation:
+                        self.cannon_planner.skip(position)
+                return
+
+            position = self.cannon_planner.next_pylon()
+            if position and self.can_afford(PYLON):
+                if await self.build_at(PYLON, position) == sc2.data.ActionResult.CantFindPlacementLocation:
+                    self.cannon_planner.skip(position)
+            return
+
+        num_cannons = self.own_index.closer_than(15, self.cannon_location, PHOTONCANNON).ready.amount + self.already_pending(PHOTONCANNON)
+        num_pylons = self.own_index.closer_than(15, self.cannon_location, PYLON).ready.filter(lambda unit: unit.shield > 0).amount + self.already_pending(PYLON)
 
         # Keep the ratio between cannons as pylons
         if num_cannons < num_pylons * self.cannons_to_pylons_ratio:
-            if self.can_afford(PHOTONCANNON) and self.units(FORGE).ready.exists:
+            if self.can_afford(PHOTONCANNON) and self.unit_table.ready(FORGE).exists:
                 #await self.build(PHOTONCANNON, near=self.cannon_location)
-                pylon = self.units(PYLON).closer_than(10, self.cannon_location).ready.prefer_close_to(self.cannon_location)
+                pylon = self.own_index.closer_than(10, self.cannon_location, PYLON).ready.prefer_close_to(self.cannon_location)
                 if pylon.exists:
                     await self.build(PHOTONCANNON, near=pylon.first) #, unit=self.select_builder()
         else:
@@ -240,24 +348,24 @@ class CannonLoverBot(BaseBot):
 
     # Opening strategy for early game
     async def early_game_strategy(self):
-        nexus = self.units(NEXUS).first # We only have one nexus in early game
+        nexus = self.unit_table(NEXUS).first # We only have one nexus in early game
 
         # Send a worker to enemy base early on (just once)
         if not self.has_sent_workers:
-            await self.do(self.workers.random.move(self.cannon_location))
+            await self.do(self.random.choice(self.workers).move(self.cannon_location))
             self.has_sent_workers = True
 
         # Build one pylon at home
-        elif not self.units(PYLON).closer_than(20, nexus).exists and not self.already_pending(PYLON):
+        elif not self.own_index.any_closer_than(20, nexus, PYLON) and not self.already_pending(PYLON):
             if self.can_afford(PYLON):
                 await self.build(PYLON, near=nexus.position.towards(self.game_info.map_center, 10)) #self.get_game_center_random()
 
         # Build forge at home
-        elif not self.units(FORGE).exists and not self.already_pending(FORGE):
-            pylon = self.units(PYLON).ready
-            if pylon.exists:
+        elif not self.unit_table(FORGE).exists and not self.already_pending(FORGE):
+            pylon = self.own_index.closest_to(nexus, PYLON, lambda unit: unit.is_ready)
+            if pylon:
                 if self.can_afford(FORGE):
-                    await self.build(FORGE, near=pylon.closest_to(nexus))
+                    await self.build(FORGE, near=pylon)
 
         # Send an extra worker to front-line
         #elif self.workers.closer_than(50, self.cannon_location).amount < 2 and not self.has_order(MOVE, self.workers):
@@ -266,26 +374,26 @@ class CannonLoverBot(BaseBot):
 
         # Start building cannons in enemy base (and more pylons)
         else:
-            await self.scout_cheese()
+            await self.run_task("scout", self.scout_cheese)
 
             await self.build_cannons()
 
 
     # Panic strategy for all-in defense
     async def panic_strategy(self):
-        nexus = self.units(NEXUS).first # We likely only have one nexus in early game
+        nexus = self.unit_table(NEXUS).first # We likely only have one nexus in early game
 
         # Make sure we have at least one pylon
-        if not self.units(PYLON).exists and not self.already_pending(PYLON):
+        if not self.unit_table(PYLON).exists and not self.already_pending(PYLON):
             if self.can_afford(PYLON):
                 await self.build(PYLON, near=self.get_base_build_location(nexus))
 
         # Make sure forge still exists...
-        if not self.units(FORGE).exists and not self.already_pending(FORGE):
-            pylon = self.units(PYLON).ready
-            if pylon.exists:
+        if not self.unit_table(FORGE).exists and not self.already_pending(FORGE):
+            pylon = self.own_index.closest_to(nexus, PYLON, lambda unit: unit.is_ready)
+            if pylon:
                 if self.can_afford(FORGE):
-                    await self.build(FORGE, near=pylon.closest_to(nexus))
+                    await self.build(FORGE, near=pylon)
 
         # Send an extra worker to front-line
         #elif self.workers.closer_than(50, self.cannon_location).amount < 2 and not self.has_order(MOVE, self.workers):
@@ -298,44 +406,43 @@ class CannonLoverBot(BaseBot):
 
     # Strategy for late game, which prioritizes unit production and upgrades rather than cannons
     async def late_game_strategy(self):
-        nexus = self.units(NEXUS).random
+        nexus = self.random.choice(self.unit_table(NEXUS))
         if not nexus:
             return
 
-        gateways = self.units(GATEWAY) | self.units(WARPGATE)
+        gateways = self.unit_table(GATEWAY, WARPGATE)
 
-        # We might have multiple bases, so distribute workers between them (not every game step)
-        if self.iteration % 10 == 0:
-            await self.distribute_workers()
+        # We might have multiple bases, so distribute workers between them (not every game step, see scheduled_tasks)
+        await self.run_task("distribute_workers", self.distribute_workers)
 
         # If game time is greater than 2 min, make sure to always scout with one worker
         if self.get_game_time() > 120:
-            await self.scout()
+            await self.run_task("scout", self.scout)
 
         # Make sure to expand in late game (every 2.5 minutes)
         expand_every = 2.5 * 60 # Seconds
         prefered_base_count = 1 + int(math.floor(self.get_game_time() / expand_every))
         prefered_base_count = max(prefered_base_count, 2) # Take natural ASAP (i.e. minimum 2 bases)
-        current_base_count = self.units(NEXUS).ready.filter(lambda unit: unit.ideal_harvesters >= 10).amount # Only count bases as active if they have at least 10 ideal harvesters (will decrease as it's mined out)
+        current_base_count = self.unit_table.ready(NEXUS).filter(lambda unit: unit.ideal_harvesters >= 10).amount # Only count bases as active if they have at least 10 ideal harvesters (will decrease as it's mined out)
 
         # Vespene gases per nexus
         if self.enemy_start_location:
             # 2-player map. Just build 1 gas per nexus, as we start with cannon rush so need more minerals.
-            prefered_gas_count = round(1 * self.units(NEXUS).amount)
+            prefered_gas_count = round(1 * self.unit_table(NEXUS).amount)
         else:
             # 4-player map. Build 1.5 gas per nexus.
-            prefered_gas_count = round(1.5 * self.units(NEXUS).amount)
+            prefered_gas_count = round(1.5 * self.unit_table(NEXUS).amount)
 
         # Also add an extra expansion if minerals get too high
         #if self.minerals > 800:
         #    prefered_base_count += 1
         
         # Make sure we have at least one pylon near nexus before expanding
-        if not self.units(PYLON).exists and not self.already_pending(PYLON):
+        if not self.unit_table(PYLON).exists and not self.already_pending(PYLON):
             if self.can_afford(PYLON):
                 await self.build(PYLON, near=nexus)
 
-        #print(str(self.units(NEXUS).ready.filter(lambda unit: unit.ideal_harvesters >= 10).amount) + " / " + str(prefered_base_count))
+        #print(str(self.unit_table.ready(NEXUS).filter(lambda unit: unit.ideal_harvesters >= 10).amount) + " / " + str(prefered_base_count))
         elif current_base_count < prefered_base_count and not self.already_pending(NEXUS) and await self.can_take_expansion():
             if self.can_afford(NEXUS):
                 await self.expand_now()
@@ -346,50 +453,50 @@ class CannonLoverBot(BaseBot):
                 await self.build(PYLON, near=self.get_base_build_location(nexus, min_distance=5))
 
         # Make sure forge still exists...
-        elif not self.units(FORGE).exists and not self.already_pending(FORGE):
+        elif not self.unit_table(FORGE).exists and not self.already_pending(FORGE):
             if self.can_afford(FORGE):
-                await self.build(FORGE, near=self.get_base_build_location(self.units(NEXUS).random))
+                await self.build(FORGE, near=self.get_base_build_location(self.random.choice(self.unit_table(NEXUS))))
 
         # Always build a cannon in mineral line for defense
-        elif self.units(PHOTONCANNON).closer_than(10, nexus).amount < 1:
-            if self.units(PYLON).ready.closer_than(5, nexus).amount < 1:
+        elif not self.own_index.any_closer_than(10, nexus, PHOTONCANNON):
+            if not self.own_index.any_closer_than(5, nexus, PYLON, lambda unit: unit.is_ready):
                 if self.can_afford(PYLON) and not self.already_pending(PYLON):
                     await self.build(PYLON, near=nexus)
             else:
                 if self.can_afford(PHOTONCANNON) and not self.already_pending(PHOTONCANNON):
-                    await self.build(PHOTONCANNON, near=nexus.position.towards(self.game_info.map_center, random.randrange(-10,-1)))
+                    await self.build(PHOTONCANNON, near=nexus.position.towards(self.game_info.map_center, self.random.randrange(-10,-1)))
 
         # Take gases (1 per nexus)
-        elif self.units(ASSIMILATOR).amount < prefered_gas_count and not self.already_pending(ASSIMILATOR):
+        elif self.unit_table(ASSIMILATOR).amount < prefered_gas_count and not self.already_pending(ASSIMILATOR):
             if self.can_afford(ASSIMILATOR):
-                for gas in self.state.vespene_geyser.closer_than(20.0, nexus):
-                    if not self.units(ASSIMILATOR).closer_than(1.0, gas).exists and self.can_afford(ASSIMILATOR):
+                for gas in self.resources.free_geysers(nexus.tag):
+                    if self.can_afford(ASSIMILATOR):
                         worker = self.select_build_worker(gas.position, force=True)
                         await self.do(worker.build(ASSIMILATOR, gas))
 
         # Build 1 gateway to start with
         elif gateways.ready.amount < 1 and not self.already_pending(GATEWAY):
             if self.can_afford(GATEWAY):
-                await self.build(GATEWAY, near=self.get_base_build_location(self.units(NEXUS).first))
+                await self.build(GATEWAY, near=self.get_base_build_location(self.unit_table(NEXUS).first))
         
         # Build a Cybernetics Core (requires Gateway)
-        elif not self.units(CYBERNETICSCORE).exists and self.units(GATEWAY).ready.exists and not self.already_pending(CYBERNETICSCORE):
+        elif not self.unit_table(CYBERNETICSCORE).exists and self.unit_table.ready(GATEWAY).exists and not self.already_pending(CYBERNETICSCORE):
             if self.can_afford(CYBERNETICSCORE):
-                await self.build(CYBERNETICSCORE, near=self.get_base_build_location(self.units(NEXUS).first))
+                await self.build(CYBERNETICSCORE, near=self.get_base_build_location(self.unit_table(NEXUS).first))
 
         # Keep making more gateways
-        elif gateways.amount < self.units(NEXUS).amount * self.gateways_per_nexus and self.already_pending(GATEWAY) < 2:
+        elif gateways.amount < self.unit_table(NEXUS).amount * self.gateways_per_nexus and self.already_pending(GATEWAY) < 2:
             if self.can_afford(GATEWAY):
                 await self.build(GATEWAY, near=self.get_base_build_location(nexus))
 
         # For late game, also build Robotics Facility
-        elif self.units(CYBERNETICSCORE).ready.exists and not self.units(ROBOTICSFACILITY).exists and not self.already_pending(ROBOTICSFACILITY):
+        elif self.unit_table.ready(CYBERNETICSCORE).exists and not self.unit_table(ROBOTICSFACILITY).exists and not self.already_pending(ROBOTICSFACILITY):
             if self.can_afford(ROBOTICSFACILITY):
                 await self.build(ROBOTICSFACILITY, near=self.get_base_build_location(nexus))
             return
 
         # For even later game, also build Robotics Bay
-        elif self.units(ROBOTICSFACILITY).ready.exists and not self.units(ROBOTICSBAY).exists and not self.already_pending(ROBOTICSBAY):
+        elif self.unit_table.ready(ROBOTICSFACILITY).exists and not self.unit_table(ROBOTICSBAY).exists and not self.already_pending(ROBOTICSBAY):
             if self.can_afford(ROBOTICSBAY):
                 await self.build(ROBOTICSBAY, near=self.get_base_build_location(nexus))
             return
@@ -399,7 +506,7 @@ class CannonLoverBot(BaseBot):
             await self.train_army()
 
             # With the remaining money, go for upgrades
-            await self.handle_upgrades()
+            await self.run_task("upgrades", self.handle_upgrades)
 
             # And keep building cannons :)
             await self.build_cannons()
@@ -410,14 +517,13 @@ class CannonLoverBot(BaseBot):
         if not location:
             return False
 
-        # Must not have enemies nearby
-        if self.remembered_enemy_units.closer_than(10, location).exists:
+        # Must not be taken or threatened by enemies (structures and workers add no threat, so check for any enemy nearby too)
+        if self.enemy_index.any_closer_than(10, location) or self.influence.threat_at(location) > 0:
             return False
 
-        # Must be able to find a valid building position
+        # Must be able to find a valid building position (checked on the local placement grid, expand_now() asks the game anyway)
         if self.can_afford(NEXUS):
-            position = await self.find_placement(NEXUS, location.rounded, max_distance=10, random_alternative=False, placement_step=1)
-            if not position:
+            if not self.placement.find_placements(NEXUS, location, max_distance=10, placement_step=1):
                 return False
 
         return True
@@ -425,7 +531,7 @@ class CannonLoverBot(BaseBot):
 
     async def scout_cheese(self):
         scout = None
-        nexus = self.units(NEXUS).first
+        nexus = self.unit_table(NEXUS).first
 
         # Check if we already have a scout (a worker with PATROL order)
         for worker in self.workers:
@@ -434,13 +540,15 @@ class CannonLoverBot(BaseBot):
 
         # If we don't have a scout, select one
         if not scout:
-            scout = self.workers.closest_to(nexus)
+            scout = self.own_index.closest_to(nexus, PROBE)
+            if not scout:
+                return
+
             await self.order(scout, PATROL, self.find_random_cheese_location())
             return
 
         # Basic avoidance: If enemy is too close, go back to nexus
-        nearby_enemy_units = self.known_enemy_units.filter(lambda unit: unit.type_id not in self.units_to_ignore).closer_than(10, scout)
-        if nearby_enemy_units.exists:
+        if self.influence.threat_at(scout) > 0:
             await self.order(scout, PATROL, nexus)
             return
 
@@ -450,14 +558,20 @@ class CannonLoverBot(BaseBot):
             await self.order(scout, PATROL, self.find_random_cheese_location())
             return
 
+    # Random pathable location between min_distance and max_distance from our start location, buildable locations being more likely.
+    # The candidates are found once, so picking one is just a random index
     def find_random_cheese_location(self, max_distance=40, min_distance=20):
-        location = None
-        while not location or location.distance_to(self.start_location) > max_distance or location.distance_to(self.start_location) < min_distance:
-            x = random.randrange(0, self.game_info.pathing_grid.width)
-            y = random.randrange(0, self.game_info.pathing_grid.height)
-
-            location = sc2.position.Point2((x,y))
-        return location
+        key = (min_distance, max_distance)
+        if key not in self.cheese_locations:
+            cells = self.pathable_cells_within(self.start_location, min_distance, max_distance)
+            buildable = cells[self.placement.placeable[cells[:, 0].astype(int), cells[:, 1].astype(int)]]
+            self.cheese_locations[key] = np.concatenate([cells] + [buildable] * (self.cheese_location_weight - 1))
+
+        candidates = self.cheese_locations[key]
+        if len(candidates) == 0:
+            return self.start_location
+        x, y = candidates[self.random.randrange(len(candidates))]
+        return sc2.position.Point2((float(x), float(y)))
 
     async def scout(self):
         scout = None
@@ -469,8 +583,8 @@ class CannonLoverBot(BaseBot):
 
         # If we don't have a scout, select one, and order it to move to random exp
         if not scout:
-            random_exp_location = random.choice(list(self.expansion_locations.keys()))
-            scout = self.workers.closest_to(self.start_location)
+            random_exp_location = self.random.choice(list(self.expansion_locations.keys()))
+            scout = self.own_index.closest_to(self.start_location, PROBE)
 
             if not scout:
                 return
@@ -479,15 +593,14 @@ class CannonLoverBot(BaseBot):
             return
 
         # Basic avoidance: If enemy is too close, go to map center
-        nearby_enemy_units = self.known_enemy_units.filter(lambda unit: unit.type_id not in self.units_to_ignore).closer_than(10, scout)
-        if nearby_enemy_units.exists:
+        if self.influence.threat_at(scout) > 0:
             await self.order(scout, PATROL, self.game_info.map_center)
             return
 
         # We're close enough, so change target
         target = sc2.position.Point2((scout.orders[0].target.x, scout.orders[0].target.y))
         if scout.distance_to(target) < 10:
-            random_exp_location = random.choice(list(self.expansion_locations.keys()))
+            random_exp_location = self.random.choice(list(self.expansion_locations.keys()))
             await self.order(scout, PATROL, random_exp_location)
             return
 
@@ -496,25 +609,25 @@ class CannonLoverBot(BaseBot):
     # Train/warp-in army units
     async def train_army(self):
         # Start building colossus whenever possible
-        for robotics in self.units(ROBOTICSFACILITY).ready.noqueue:
+        for robotics in self.unit_table.idle(ROBOTICSFACILITY):
             # Always have one observer out (mainly to gain high ground vision)
-            if self.units(OBSERVER).ready.amount < 1:
+            if self.unit_table.ready(OBSERVER).amount < 1:
                 await self.train(OBSERVER, robotics)
                 return
 
             # If we can research extended thermal lance, and already have a colossus out, do it
-            elif await self.can_upgrade(RESEARCH_EXTENDEDTHERMALLANCE, robotics) and self.units(COLOSSUS).ready.amount >= 1:
+            elif await self.can_upgrade(RESEARCH_EXTENDEDTHERMALLANCE, robotics) and self.unit_table.ready(COLOSSUS).amount >= 1:
                 await self.upgrade(RESEARCH_EXTENDEDTHERMALLANCE, robotics)
                 return
             
             # Else, just train colossus/immortals
-            elif self.units(ROBOTICSBAY).ready.exists:
-                enemy_units = self.remembered_enemy_units
-                has_mostly_marauders = enemy_units(MARAUDER).amount > 0 and enemy_units(MARAUDER).amount > enemy_units(MARINE).amount
-                has_mostly_mech = enemy_units(HELLION).amount > 0 and enemy_units(HELLION).amount > enemy_units(MARINE).amount
-                has_mostly_stalkers = enemy_units(STALKER).amount > 0 and enemy_units(STALKER).amount * 1.5 > enemy_units(ZEALOT).amount 
-                has_mostly_roaches = enemy_units(ROACH).amount > 0 and enemy_units(ROACH).amount > enemy_units(HYDRALISK).amount and enemy_units(ROACH).amount * 2 > enemy_units(ZERGLING).amount
-                has_too_many_flying = enemy_units(VIKINGFIGHTER).amount > 3 or enemy_units(MUTALISK).amount > 3 or enemy_units(VOIDRAY).amount > 3 or enemy_units(PHOENIX).amount > 3
+            elif self.unit_table.ready(ROBOTICSBAY).exists:
+                enemy_units = self.enemy_memory.composition
+                has_mostly_marauders = enemy_units.amount(MARAUDER) > 0 and enemy_units.amount(MARAUDER) > enemy_units.amount(MARINE)
+                has_mostly_mech = enemy_units.amount(HELLION) > 0 and enemy_units.amount(HELLION) > enemy_units.amount(MARINE)
+                has_mostly_stalkers = enemy_units.amount(STALKER) > 0 and enemy_units.amount(STALKER) * 1.5 > enemy_units.amount(ZEALOT) 
+                has_mostly_roaches = enemy_units.amount(ROACH) > 0 and enemy_units.amount(ROACH) > enemy_units.amount(HYDRALISK) and enemy_units.amount(ROACH) * 2 > enemy_units.amount(ZERGLING)
+                has_too_many_flying = enemy_units.amount(VIKINGFIGHTER) > 3 or enemy_units.amount(MUTALISK) > 3 or enemy_units.amount(VOIDRAY) > 3 or enemy_units.amount(PHOENIX) > 3
 
                 # Depending on enemy's unit composition, build either immortal or colossus
                 if has_mostly_marauders or has_mostly_mech or has_mostly_stalkers or has_mostly_roaches or has_too_many_flying:
@@ -529,7 +642,7 @@ class CannonLoverBot(BaseBot):
         rally_location = self.get_rally_location()
 
         # Train at Gateways
-        for gateway in self.units(GATEWAY).ready:
+        for gateway in self.unit_table.ready(GATEWAY):
             # Set gateway rally
             #await self.do(gateway(RALLY_BUILDING, rally_location))
 
@@ -541,19 +654,19 @@ class CannonLoverBot(BaseBot):
                 elif self.supply_used < 198 and self.supply_left >= 2:
                     # Train 75% Stalkers and 25% Zealots
                     if self.can_afford(STALKER) and self.can_afford(ZEALOT) and self.can_afford(SENTRY):
-                        rand = random.random()
-                        if rand < self.sentry_ratio and self.units(CYBERNETICSCORE).ready.exists:
+                        rand = self.random.random()
+                        if rand < self.sentry_ratio and self.unit_table.ready(CYBERNETICSCORE).exists:
                             await self.do(gateway.train(SENTRY))
                             return
-                        elif rand <= self.stalker_ratio and self.units(CYBERNETICSCORE).ready.exists:
+                        elif rand <= self.stalker_ratio and self.unit_table.ready(CYBERNETICSCORE).exists:
                             await self.do(gateway.train(STALKER))
                             return
                         else:
                             await self.do(gateway.train(ZEALOT))
                             return
 
-        # Warp-in from Warpgates
-        for warpgate in self.units(WARPGATE).ready:
+        # Warp-in from all ready warpgates (each gets its own spot, and all warp-ins are sent together at the end of the step)
+        for warpgate in self.unit_table.ready(WARPGATE):
             # We check for WARPGATETRAIN_ZEALOT to see if warpgate is ready to warp in
             if await self.has_ability(WARPGATETRAIN_ZEALOT, warpgate) and self.supply_used < 198 and self.supply_left >= 2:
                 # Always warp in zealots if banking minerals
@@ -561,37 +674,34 @@ class CannonLoverBot(BaseBot):
                     await self.warp_in(ZEALOT, rally_location, warpgate)
                 # Otherwise, train units depending on the ratio
                 elif self.can_afford(STALKER) and self.can_afford(ZEALOT) and self.can_afford(SENTRY):
-                    rand = random.random()
-                    if rand <= self.sentry_ratio and self.units(CYBERNETICSCORE).ready.exists:
+                    rand = self.random.random()
+                    if rand <= self.sentry_ratio and self.unit_table.ready(CYBERNETICSCORE).exists:
                         await self.warp_in(SENTRY, rally_location, warpgate)
-                        return
-                    elif rand <= self.stalker_ratio and self.units(CYBERNETICSCORE).ready.exists:
+                    elif rand <= self.stalker_ratio and self.unit_table.ready(CYBERNETICSCORE).exists:
                         await self.warp_in(STALKER, rally_location, warpgate)
-                        return
                     else:
                         await self.warp_in(ZEALOT, rally_location, warpgate)
-                        return
 
 
     # Handle upgrades.
     async def handle_upgrades(self):
         # Prioritize warp-gate research
-        if self.units(CYBERNETICSCORE).ready.exists:
-            cybernetics = self.units(CYBERNETICSCORE).first
+        if self.unit_table.ready(CYBERNETICSCORE).exists:
+            cybernetics = self.unit_table(CYBERNETICSCORE).first
             if cybernetics.noqueue and await self.has_ability(RESEARCH_WARPGATE, cybernetics):
                 if self.can_afford(RESEARCH_WARPGATE):
                     await self.do(cybernetics(RESEARCH_WARPGATE))
                 return
 
         # Build Twilight Council (requires Cybernetics Core)
-        if not self.units(TWILIGHTCOUNCIL).exists and not self.already_pending(TWILIGHTCOUNCIL):
-            if self.can_afford(TWILIGHTCOUNCIL) and self.units(CYBERNETICSCORE).ready.exists:
-                await self.build(TWILIGHTCOUNCIL, near=self.get_base_build_location(self.units(NEXUS).first))
+        if not self.unit_table(TWILIGHTCOUNCIL).exists and not self.already_pending(TWILIGHTCOUNCIL):
+            if self.can_afford(TWILIGHTCOUNCIL) and self.unit_table.ready(CYBERNETICSCORE).exists:
+                await self.build(TWILIGHTCOUNCIL, near=self.get_base_build_location(self.unit_table(NEXUS).first))
             return
 
-        if not self.units(TWILIGHTCOUNCIL).ready.exists:
+        if not self.unit_table.ready(TWILIGHTCOUNCIL).exists:
             return
-        twilight = self.units(TWILIGHTCOUNCIL).first
+        twilight = self.unit_table(TWILIGHTCOUNCIL).first
 
         # Research Blink and Charge at Twilight
         # Temporary bug workaround: Don't go further unless we can afford blink
@@ -609,9 +719,9 @@ class CannonLoverBot(BaseBot):
                 return
             
         # Must have a forge to continue upgrades
-        if not self.units(FORGE).ready.exists:
+        if not self.unit_table.ready(FORGE).exists:
             return
-        forge = self.units(FORGE).first
+        forge = self.unit_table(FORGE).first
 
         # Only if we're not upgrading anything yet
         if forge.noqueue:
@@ -638,24 +748,37 @@ class CannonLoverBot(BaseBot):
     async def move_workers(self):
         # Make workers flee from enemy cannon
         for worker in self.workers:
-            if self.known_enemy_units.structure.ready.filter(lambda unit: unit.type_id in [PHOTONCANNON]).closer_than(9, worker):
+            if self.known_enemy_index.any_closer_than(9, worker, PHOTONCANNON, lambda unit: unit.is_ready):
                 if not self.has_order(MOVE, worker):
-                    await self.do(worker.move(worker.position.towards(self.start_location, 4)))
+                    await self.do(worker.move(self.flee_position(worker)))
 
         # Make low health cannon builders flee from melee enemies
         if self.cannon_location:
-            for worker in self.workers.closer_than(40, self.cannon_location):
-                if worker.shield < 10 and self.known_enemy_units.closer_than(4, worker).not_structure.filter(lambda unit: not unit.is_flying).exists:
+            for worker in self.own_index.closer_than(40, self.cannon_location, PROBE):
+                if worker.shield < 10 and self.known_enemy_index.any_closer_than(4, worker, predicate=lambda unit: not unit.is_structure and not unit.is_flying):
                     if not self.has_order(MOVE, worker):
                         # We have nearby enemy. Run home!
-                        #await self.do(worker.gather(self.state.mineral_field.closest_to(self.units(NEXUS).first))) #Do mineral walk at home base to escape.
-                        await self.do(worker.move(worker.position.towards(self.start_location, 4)))
+                        #await self.do(worker.gather(self.state.mineral_field.closest_to(self.unit_table(NEXUS).first))) #Do mineral walk at home base to escape.
+                        await self.do(worker.move(self.flee_position(worker)))
+
+
 
+    # Position a little way along the ground path home (around walls and cliffs), for units running away
+    def flee_position(self, unit, distance=4):
+        return self.flow_fields.towards("main", unit.position, distance) or unit.position.towards(self.start_location, distance)
+
+
+    # Send worker to the least saturated mineral field of nexus's base
+    async def gather_minerals(self, worker, nexus):
+        mineral = self.resources.mineral_for(nexus.tag) or self.mineral_field_index.closest_to(nexus)
+        if mineral:
+            await self.do(worker.gather(mineral))
+            self.resources.assign(worker.tag, mineral.tag)
 
 
     # Movement and micro for army
     async def move_army(self):
-        army_units = self.units(STALKER).ready | self.units(ZEALOT).ready | self.units(OBSERVER).ready | self.units(COLOSSUS).ready | self.units(IMMORTAL).ready | self.units(SENTRY).ready
+        army_units = self.unit_table.ready(*self.army_types)
         army_count = army_units.amount
         home_location = self.start_location
         focus_fire_target = None
@@ -663,12 +786,13 @@ class CannonLoverBot(BaseBot):
         attack_location = None
 
         # Determine attack location
+        closest_enemy_to_home = self.enemy_index.closest_to(home_location, predicate=lambda unit: unit.type_id not in self.units_to_ignore)
         if army_count < self.army_size_minimum:
             # We have less than self.army_size_minimum army in total. Just gather at rally point
             attack_location = self.get_rally_location()
-        elif self.remembered_enemy_units.filter(lambda unit: unit.type_id not in self.units_to_ignore).exists:
+        elif closest_enemy_to_home:
             # We have large enough army and have seen an enemy. Attack closest enemy to home
-            attack_location = self.remembered_enemy_units.filter(lambda unit: unit.type_id not in self.units_to_ignore).closest_to(home_location).position
+            attack_location = closest_enemy_to_home.position
         else:
             # We have not seen an enemy
             #if random.random() < 0.8:
@@ -679,25 +803,20 @@ class CannonLoverBot(BaseBot):
             attack_random_exp = True
 
 
-        # Micro for each individual army unit
+        # Find nearby enemies for each army unit
+        engaged_units = []
+        closest_enemy_units = []
         for unit in army_units:
-            has_blink = False
-            has_guardianshield = False
-            if unit.type_id == STALKER:
-                has_blink = await self.has_ability(EFFECT_BLINK_STALKER, unit) # Do we have blink?
-            elif unit.type_id == SENTRY:
-                has_guardianshield = await self.has_ability(GUARDIANSHIELD_GUARDIANSHIELD, unit)
-
-            # Find nearby enemy units
-            nearby_enemy_units = self.remembered_enemy_units.not_structure.filter(lambda unit: unit.type_id not in self.units_to_ignore).closer_than(15, unit)
+            # Find closest nearby enemy unit
+            closest_enemy_unit = self.enemy_index.closest_to(unit, predicate=lambda enemy: not enemy.is_structure and enemy.type_id not in self.units_to_ignore, max_distance=15)
 
             # If we don't have any nearby enemies
-            if not nearby_enemy_units.exists:
+            if not closest_enemy_unit:
                 # If we don't have an attack order, cast one now
                 if not self.has_order(ATTACK, unit) or (self.known_enemy_units.exists and not self.has_target(attack_location, unit)):
                     if attack_random_exp:
                         # If we're attacking a random exp, find one now
-                        random_exp_location = random.choice(list(self.expansion_locations.keys()))
+                        random_exp_location = self.random.choice(list(self.expansion_locations.keys()))
                         await self.do(unit.attack(random_exp_location))
                         #print("Attack random exp")
                     elif unit.distance_to(attack_location) > 10:
@@ -710,15 +829,37 @@ class CannonLoverBot(BaseBot):
 
                 continue # Do no further micro
 
-            # Calculate friendly vs enemy army value
-            friendly_army_value = self.friendly_army_value(unit, 10) #20
-            enemy_army_value = self.enemy_army_value(nearby_enemy_units.closest_to(unit), 10) #30
-            army_advantage = friendly_army_value - enemy_army_value
-            #army_advantage = 0
+            engaged_units.append(unit)
+            closest_enemy_units.append(closest_enemy_unit)
+
+        # Enemy army value around each enemy our units are engaging, for all engaged units at once (decides when sentries cast guardian shield)
+        enemy_army_values = self.army_values([], closest_enemy_units, 10)[1]
+
+        # Predict the fight around each enemy that our units are engaging (once per enemy, units engaging the same enemy share it)
+        fights = {}
+        for closest_enemy_unit in closest_enemy_units:
+            if closest_enemy_unit.tag not in fights:
+                fights[closest_enemy_unit.tag] = self.fight_around(closest_enemy_unit)
+
+        # Micro for each individual army unit with nearby enemies
+        for unit, closest_enemy_unit, enemy_army_value in zip(engaged_units, closest_enemy_units, enemy_army_values):
+            has_blink = False
+            has_guardianshield = False
+            if unit.type_id == STALKER:
+                has_blink = await self.has_ability(EFFECT_BLINK_STALKER, unit) # Do we have blink?
+            elif unit.type_id == SENTRY:
+                has_guardianshield = await self.has_ability(GUARDIANSHIELD_GUARDIANSHIELD, unit)
+
+            winner, remaining_fraction = fights[closest_enemy_unit.tag]
+            # Keep fighting while we're predicted to win, but only start a fight we're predicted to win by a margin (so units don't flip between attacking and retreating)
+            if self.has_order(ATTACK, unit):
+                engage = winner > 0
+            else:
+                engage = winner > 0 and remaining_fraction >= self.engage_margin
 
-            # If our shield is low, escape a little backwards
-            if unit.is_taking_damage and unit.shield < 20 and unit.type_id not in [ZEALOT]:
-                escape_location = unit.position.towards(home_location, 4)
+            # If our shield is low and we would die soon at the rate we're taking damage, escape a little (in the safest direction)
+            if unit.shield < 20 and self.unit_history.time_to_death(unit) < self.escape_time_to_death and unit.type_id not in [ZEALOT]:
+                escape_location = self.influence.safest_position(unit.position, 4, towards=self.flee_position(unit, 8))
                 if has_blink:
                     # Stalkers can blink
                     await self.order(unit, EFFECT_BLINK_STALKER, escape_location)
@@ -729,10 +870,10 @@ class CannonLoverBot(BaseBot):
 
                 continue
 
-            # Do we have an army advantage?
-            if army_advantage > 0:
-                # We have a larger army. Engage enemy
-                attack_position = nearby_enemy_units.closest_to(unit).position
+            # Do we win the fight?
+            if engage:
+                # We're predicted to win. Engage enemy
+                attack_position = closest_enemy_unit.position
 
                 # If not already attacking, attack
                 if not self.has_order(ATTACK, unit) or not self.has_target(attack_position, unit):
@@ -742,10 +883,10 @@ class CannonLoverBot(BaseBot):
                 if has_guardianshield and enemy_army_value > 200:
                     await self.order(unit, GUARDIANSHIELD_GUARDIANSHIELD)
             else:
-                # We have a smaller army, so run back home!
+                # We're predicted to lose, so run back home!
                 if has_blink:
-                    # Stalkers can blink
-                    await self.order(unit, EFFECT_BLINK_STALKER, home_location)
+                    # Stalkers can blink (along the path home, so they don't blink into a cliff)
+                    await self.order(unit, EFFECT_BLINK_STALKER, self.flee_position(unit, 8))
                 else:
                     # Others can move normally
                     if not self.has_order(MOVE, unit):
@@ -753,67 +894,87 @@ class CannonLoverBot(BaseBot):
                 
 
 
-    def get_rally_location(self):
-        if self.units(PYLON).ready.exists:
-            if self.cannon_location:
-                rally_location = self.units(PYLON).ready.closest_to(self.cannon_location).position
+    # Predict the fight around an enemy unit: our army within 15 of it (the distance army units engage from) against enemy army within 10 of it.
+    # Static defense counts on both sides. Returns (winner, fraction of our health + shield left)
+    def fight_around(self, enemy_unit):
+        def is_fighter(unit):
+            if unit.is_structure:
+                return unit.type_id in self.static_defense_types and unit.is_ready
+            return unit.is_ready and unit.type_id not in self.units_to_ignore
+
+        own_units = self.own_index.closer_than(15, enemy_unit, predicate=is_fighter)
+        enemy_units = self.enemy_index.closer_than(10, enemy_unit, predicate=is_fighter)
+        winner, own_remaining, enemy_remaining = self.predict_fight(own_units, enemy_units)
+
+        own_value = sum(unit.health + unit.shield for unit in own_units)
+        return winner, own_remaining / own_value if own_value > 0 else 0
+
+    # Approximate friendly and enemy army value around many positions at once (positions can be units or points).
+    # Returns two arrays, with friendly army value around each of friendly_positions and enemy army value around each of enemy_positions.
+    def army_values(self, friendly_positions, enemy_positions, distance=10):
+        friendly_positions = [(p.position.x, p.position.y) for p in friendly_positions]
+        enemy_positions = [(p.position.x, p.position.y) for p in enemy_positions]
+
+        friendly_values = np.zeros(0)
+        if friendly_positions:
+            friendly_values = values_within(friendly_positions, *self.army_value_arrays(self.units, distance, is_enemy=False))
+
+        enemy_values = np.zeros(0)
+        if enemy_positions:
+            enemy_values = values_within(enemy_positions, *self.army_value_arrays(self.remembered_enemy_units, distance, is_enemy=True))
+
+        return friendly_values, enemy_values
+
+    # Positions, values and counting radius of all units that add to army value.
+    # Army units count health+shield within distance, static defense only counts health within 10.
+    def army_value_arrays(self, units, distance, is_enemy):
+        positions = []
+        health = []
+        shield = []
+        shield_weight = []
+        bonus = []
+        radii = []
+
+        for unit in units:
+            type_id = unit.type_id
+            if type_id in self.static_defense_types:
+                # Our own cannons count even while under construction
+                if not unit.is_ready and (is_enemy or type_id != PHOTONCANNON):
+                    continue
+                unit_shield_weight = 0 # Skip shield, to not overestimate
+                unit_bonus = 0
+                radius = 10
+            elif unit.is_structure or type_id in self.units_to_ignore or (is_enemy and not unit.is_ready):
+                continue
             else:
-                rally_location = self.units(PYLON).ready.closest_to(self.game_info.map_center).position
-        else:
-            rally_location = self.start_location
-        return rally_location
-
-    # Approximate army value by adding unit health+shield
-    def friendly_army_value(self, position, distance=10):
-        value = 0
-
-        for unit in self.units.not_structure.filter(lambda unit: unit.type_id not in self.units_to_ignore).closer_than(distance, position):
-            value += unit.health + unit.shield
-
-        # Count nearby cannons
-        for unit in self.units(PHOTONCANNON).closer_than(10, position):
-            value += unit.health # Skip shield, to not overestimate
-
-        # Count nearby bunkers
-        for unit in self.units(BUNKER).ready.closer_than(10, position):
-            value += unit.health
-
-        # Count nearby spine crawlers
-        for unit in self.units(SPINECRAWLER).ready.closer_than(10, position):
-            value += unit.health
+                unit_shield_weight = 1
+                unit_bonus = 20 if is_enemy and type_id in [MARINE, MARAUDER] else 0 # Add extra army value for marine/marauder, to not under-estimate
+                radius = distance
 
-        return value
+            position = unit.position
+            positions.append((position.x, position.y))
+            health.append(unit.health)
+            shield.append(unit.shield)
+            shield_weight.append(unit_shield_weight)
+            bonus.append(unit_bonus)
+            radii.append(radius)
 
-    # Approximate army value by adding unit health+shield
-    def enemy_army_value(self, position, distance=10):
-        value = 0
+        return np.array(positions, dtype=np.float64).reshape(-1, 2), unit_values(health, shield, shield_weight, bonus), np.array(radii, dtype=np.float64)
 
-        for unit in self.remembered_enemy_units.ready.not_structure.filter(lambda unit: unit.type_id not in self.units_to_ignore).closer_than(distance, position):
-            value += unit.health + unit.shield
-
-            # Add extra army value for marine/marauder, to not under-estimate
-            if unit.type_id in [MARINE, MARAUDER]:
-                value += 20
-
-        # Count nearby cannons
-        for unit in self.remembered_enemy_units(PHOTONCANNON).ready.closer_than(10, position):
-            value += unit.health # Skip shield, to not overestimate
-
-        # Count nearby bunkers
-        for unit in self.remembered_enemy_units(BUNKER).ready.closer_than(10, position):
-            value += unit.health
-
-        # Count nearby spine crawlers
-        for unit in self.remembered_enemy_units(SPINECRAWLER).ready.closer_than(10, position):
-            value += unit.health
-
-        return value
+    def get_rally_location(self):
+        rally_pylon = self.own_index.closest_to(self.cannon_location or self.game_info.map_center, PYLON, lambda unit: unit.is_ready)
+        if rally_pylon:
+            rally_location = rally_pylon.position
+        else:
+            rally_location = self.start_location
+        self.flow_fields.set_target("rally", rally_location)
+        return rally_location
 
     def get_game_center_random(self, offset_x=50, offset_y=50):
         x = self.game_info.map_center.x
         y = self.game_info.map_center.y
 
-        rand = random.random()
+        rand = self.random.random()
         if rand < 0.2:
             x += offset_x
         elif rand < 0.4:
@@ -826,5 +987,5 @@ class CannonLoverBot(BaseBot):
         return sc2.position.Point2((x,y))
 
     def get_base_build_location(self, base, min_distance=10, max_distance=20):
-        return base.position.towards(self.get_game_center_random(), random.randrange(min_distance, max_distance))
+        return base.position.towards(self.get_game_center_random(), self.random.randrange(min_distance, max_distance))
 
@@ -0,0 +1,169 @@
+import numpy as np
+
+import sc2
+
+
+PYLON_POWER_RADIUS = 6.5
+SPOT_SEARCH_RADIUS = 6 # How far from a point on the path we look for a pylon spot
+SIGHT_PENALTY = 8 # Extra cost (distance units) of a spot the enemy can see, so hidden spots are picked when there are any
+
+
+# One pylon of the rush and the cannon spots it powers
+class CannonStep:
+    def __init__(self, pylon, cannons):
+        self.pylon = pylon # Point2
+        self.cannons = cannons # Point2s, closest to the enemy first
+        self.pylon_tag = None # Our pylon on the spot (built or being built)
+        self.cannon_tags = [None] * len(cannons) # Our cannon on each spot
+        self.skipped = False # The pylon spot turned out to be taken (e.g. by an enemy building we didn't know about)
+        self.skipped_cannons = [False] * len(cannons)
+
+
+def spot_key(position):
+    return (round(position[0] * 2), round(position[1] * 2))
+
+
+# Plan of a cannon rush: a chain of pylon spots along the ground path to the enemy main, getting closer by a fixed distance each,
+# and the cannon spots each one powers. Planned once on the local placement grid (see plan()), then update() moves the cursor to the
+# first pylon we don't have as pylons get built or destroyed, so each step of the rush is a lookup instead of a placement search.
+class CannonPlanner:
+    def __init__(self):
+        self.steps = []
+        self.spots = {} # Spot key -> (step index, cannon index or None for the pylon)
+        self.cursor = 0 # First step without a pylon
+
+    # Plan pylon spots at start_distance, start_distance - advancement, ... ground distance from the target along path (cell centers
+    # and the ground distance left at each, see FlowField.path()), with up to cannons_per_pylon cannon spots each.
+    # placeable is a boolean grid of free cells. sight_sources are (position, sight range) of enemy structures we know about
+    def plan(self, placeable, path, path_distances, target, start_distance, advancement, cannons_per_pylon, sight_sources=()):
+        self.steps = []
+        self.spots = {}
+        self.cursor = 0
+        if len(path) == 0:
+            return
+
+        free = placeable.copy()
+        width, height = free.shape
+        sight_positions = np.array([position for position, sight_range in sight_sources], dtype=np.float64).reshape(-1, 2)
+        sight_ranges = np.array([sight_range for position, sight_range in sight_sources], dtype=np.float64)
+
+        def seen(xs, ys):
+            if not len(sight_ranges):
+                return np.zeros(len(xs), dtype=bool)
+            return (np.hypot(xs[:, np.newaxis] - sight_positions[:, 0], ys[:, np.newaxis] - sight_positions[:, 1]) <= sight_ranges).any(axis=1)
+
+        def fits(xs, ys):
+            # Centers of 2x2 buildings are on cell corners, so the footprint is the 2x2 cells around them
+            corner_xs, corner_ys = xs.astype(np.int64) - 1, ys.astype(np.int64) - 1
+            inside = (corner_xs >= 0) & (corner_ys >= 0) & (corner_xs + 1 < width) & (corner_ys + 1 < height)
+            result = np.zeros(len(xs), dtype=bool)
+            cx, cy = corner_xs[inside], corner_ys[inside]
+            result[inside] = free[cx, cy] & free[cx + 1, cy] & free[cx, cy + 1] & free[cx + 1, cy + 1]
+            return result
+
+        def take(x, y):
+            free[int(x) - 1:int(x) + 1, int(y) - 1:int(y) + 1] = False
+
+        distance = start_distance
+        while distance >= 0:
+            # Point on the path with about that much ground distance left (the end of the path if it's closer)
+            point = path[min(int(np.searchsorted(-path_distances, -distance)), len(path) - 1)]
+            distance -= advancement
+
+            # Candidate pylon spots around the point, cheapest first: distance to the point, more if the enemy can see it
+            offsets = np.arange(-SPOT_SEARCH_RADIUS, SPOT_SEARCH_RADIUS + 1)
+            xs, ys = np.meshgrid(np.round(point[0]) + offsets, np.round(point[1]) + offsets, indexing="ij")
+            xs, ys = xs.ravel().astype(np.float64), ys.ravel().astype(np.float64)
+            distances = np.hypot(xs - point[0], ys - point[1])
+            valid = (distances <= SPOT_SEARCH_RADIUS) & fits(xs, ys)
+            xs, ys, costs = xs[valid], ys[valid], distances[valid] + SIGHT_PENALTY * seen(xs[valid], ys[valid])
+
+            for candidate in np.argsort(costs, kind="stable"):
+                pylon_x, pylon_y = xs[candidate], ys[candidate]
+                take(pylon_x, pylon_y)
+                cannons = self.cannon_spots(pylon_x, pylon_y, target, cannons_per_pylon, fits, take)
+                if len(cannons) == cannons_per_pylon:
+                    break
+                # Not enough room for the cannons, give back the spots and try the next one
+                for x, y in cannons + [(pylon_x, pylon_y)]:
+                    free[int(x) - 1:int(x) + 1, int(y) - 1:int(y) + 1] = placeable[int(x) - 1:int(x) + 1, int(y) - 1:int(y) + 1]
+            else:
+                continue
+
+            step = CannonStep(sc2.position.Point2((float(pylon_x), float(pylon_y))), [sc2.position.Point2((float(x), float(y))) for x, y in cannons])
+            self.spots[spot_key(step.pylon)] = (len(self.steps), None)
+            for i, cannon in enumerate(step.cannons):
+                self.spots[spot_key(cannon)] = (len(self.steps), i)
+            self.steps.append(step)
+
+    # Up to count cannon spots powered by a pylon at (x, y), closest to the target first. Spots are taken as they're picked
+    @staticmethod
+    def cannon_spots(pylon_x, pylon_y, target, count, fits, take):
+        radius = int(PYLON_POWER_RADIUS)
+        offsets = np.arange(-radius, radius + 1)
+        xs, ys = np.meshgrid(pylon_x + offsets, pylon_y + offsets, indexing="ij")
+        xs, ys = xs.ravel().astype(np.float64), ys.ravel().astype(np.float64)
+        valid = np.hypot(xs - pylon_x, ys - pylon_y) <= PYLON_POWER_RADIUS
+        xs, ys = xs[valid], ys[valid]
+
+        spots = []
+        for i in np.argsort(np.hypot(xs - target[0], ys - target[1]), kind="stable"):
+            if len(spots) == count:
+                break
+            if fits(xs[i:i + 1], ys[i:i + 1])[0]:
+                take(xs[i], ys[i])
+                spots.append((xs[i], ys[i]))
+        return spots
+
+    # Sync with our pylons and cannons (built or being built) and move the cursor to the first step without a pylon. Must be called once per step
+    def update(self, pylons, cannons):
+        for step in self.steps:
+            step.pylon_tag = None
+            step.cannon_tags = [None] * len(step.cannons)
+        for units, is_pylon in [(pylons, True), (cannons, False)]:
+            for unit in units:
+                spot = self.spots.get(spot_key(unit.position))
+                if spot is None or (spot[1] is None) != is_pylon:
+                    continue
+                step = self.steps[spot[0]]
+                if is_pylon:
+                    step.pylon_tag = unit.tag
+                else:
+                    step.cannon_tags[spot[1]] = unit.tag
+
+        self.move_cursor()
+
+    def move_cursor(self):
+        self.cursor = next((i for i, step in enumerate(self.steps) if step.pylon_tag is None and not step.skipped), len(self.steps))
+
+    # Where the rush is at: the next pylon spot (the last one when all are built), or None without a plan
+    def location(self):
+        if not self.steps:
+            return None
+        return self.steps[min(self.cursor, len(self.steps) - 1)].pylon
+
+    # Spot for the next pylon, or None when all are built
+    def next_pylon(self):
+        return self.steps[self.cursor].pylon if self.cursor < len(self.steps) else None
+
+    # Spot for the next cannon as (pylon tag, position): the first free spot of a pylon we have, or None if they're all taken
+    def next_cannon(self):
+        for step in self.steps:
+            if step.pylon_tag is None:
+                continue
+            for cannon, tag, skipped in zip(step.cannons, step.cannon_tags, step.skipped_cannons):
+                if tag is None and not skipped:
+                    return step.pylon_tag, cannon
+        return None
+
+    # Don't use a spot anymore (e.g. an enemy building is on it)
+    def skip(self, position):
+        spot = self.spots.get(spot_key(position))
+        if spot is None:
+            return
+        step_index, cannon = spot
+        if cannon is None:
+            self.steps[step_index].skipped = True
+            self.move_cursor()
+        else:
+            self.steps[step_index].skipped_cannons[cannon] = True
@@ -0,0 +1,117 @@
+import numpy as np
+
+
+WEAPON_GROUND, WEAPON_AIR, WEAPON_ANY = 1, 2, 3 # Weapon target types (sc2 Weapon.TargetType)
+MAX_FREE_FIRE_TIME = 5 # Seconds the side with more range can shoot before the other side is in range (at most)
+
+
+# Predicts the outcome of a fight between two groups of units with Lanchester's square law, using per-type DPS
+# (including attribute bonuses, armor and upgrades), range and armor loaded once per type from game data.
+# Everything past the per-type tables is NumPy, so the cost hardly depends on the number of units.
+class CombatSimulator:
+    def __init__(self, game_data):
+        self.game_data = game_data
+        self.rows = {} # Unit type value -> row in the tables
+        self.weapon_rows = [] # Per row: [ground weapon, air weapon], each (damage, attacks, cooldown, range, bonus attribute bit, bonus damage)
+        self.type_rows = [] # Per row: (armor, attribute bits, movement speed)
+        self.weapons = None # Array (rows, 2, 6) of weapon_rows, rebuilt when a type is added
+        self.types = None # Array (rows, 3) of type_rows
+
+    # Row of a unit type, added to the tables the first time it's seen
+    def row(self, type_value):
+        row = self.rows.get(type_value)
+        if row is None:
+            row = len(self.rows)
+            self.rows[type_value] = row
+            self.weapons = self.types = None
+
+            unit_data = self.game_data.units[type_value]._proto
+            weapons = []
+            for target in [WEAPON_GROUND, WEAPON_AIR]:
+                weapon = next((weapon for weapon in unit_data.weapons if weapon.type in (target, WEAPON_ANY)), None)
+                if weapon is None or weapon.speed <= 0:
+                    weapons.append((0, 0, 1, 0, 0, 0))
+                    continue
+                bonus = weapon.damage_bonus[0] if weapon.damage_bonus else None
+                weapons.append((weapon.damage, weapon.attacks, weapon.speed, weapon.range, 1 << bonus.attribute if bonus else 0, bonus.bonus if bonus else 0))
+            self.weapon_rows.append(weapons)
+            self.type_rows.append((unit_data.armor, sum(1 << attribute for attribute in unit_data.attributes), unit_data.movement_speed))
+        return row
+
+    def tables(self):
+        if self.weapons is None:
+            self.weapons = np.array(self.weapon_rows, dtype=np.float64).reshape(-1, 2, 6)
+            self.types = np.array(self.type_rows, dtype=np.float64).reshape(-1, 3)
+        return self.weapons, self.types
+
+    # DPS and range of each attacker group against each target group. Returns two (attackers, targets) arrays
+    def dps_matrix(self, attacker_rows, target_rows, target_flying, attack_upgrade, armor_upgrade):
+        weapons, types = self.tables()
+        weapon = weapons[attacker_rows[:, np.newaxis], target_flying.astype(np.int64)[np.newaxis, :]] # (attackers, targets, 6)
+        damage, attacks, cooldown, weapon_range, bonus_attribute, bonus = np.moveaxis(weapon, 2, 0)
+
+        target_armor = types[target_rows, 0] + armor_upgrade
+        target_attributes = types[target_rows, 1].astype(np.int64)
+        has_bonus = (bonus_attribute.astype(np.int64) & target_attributes[np.newaxis, :]) != 0
+        per_hit = np.maximum(damage + attack_upgrade + bonus * has_bonus - target_armor[np.newaxis, :], 0.5)
+        return np.where(attacks > 0, per_hit * attacks / cooldown, 0), weapon_range
+
+    # Total DPS of one side against the other side's composition (targets hit in proportion to their health),
+    # and the average range of the weapons used
+    def side_dps(self, attacker_rows, attacker_counts, target_rows, target_flying, target_health, attack_upgrade, armor_upgrade):
+        dps, weapon_range = self.dps_matrix(attacker_rows, target_rows, target_flying, attack_upgrade, armor_upgrade)
+        weights = attacker_counts[:, np.newaxis] * (target_health / target_health.sum())[np.newaxis, :]
+        total = float((dps * weights).sum())
+        weights = weights * (dps > 0)
+        weight = weights.sum()
+        return total, float((weapon_range * weights).sum() / weight) if weight > 0 else 0.0
+
+    # Group units by (type, is flying). Returns table rows, flying, counts and total health of each group
+    def groups(self, types, health, flying):
+        keys = np.asarray(types, dtype=np.int64) * 2 + np.asarray(flying, dtype=np.int64)
+        unique, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse).astype(np.float64)
+        group_health = np.bincount(inverse, weights=np.asarray(health, dtype=np.float64))
+        rows = np.array([self.row(int(key) // 2) for key in unique], dtype=np.int64)
+        return rows, (unique % 2).astype(bool), counts, group_health
+
+    # Predict a fight between our units and enemy units, given their type ids (values), health + shield and whether they fly.
+    # Upgrades are (attack level, armor level) for each side. Returns (winner, our remaining health, enemy remaining health)
+    # where winner is 1 if we win, -1 if the enemy wins and 0 if nobody does
+    def predict(self, own_types, own_health, own_flying, enemy_types, enemy_health, enemy_flying, own_upgrades=(0, 0), enemy_upgrades=(0, 0)):
+        if len(own_types) == 0 or len(enemy_types) == 0:
+            own_total, enemy_total = float(np.sum(own_health)), float(np.sum(enemy_health))
+            return (1 if own_total > 0 else -1 if enemy_total > 0 else 0), own_total, enemy_total
+
+        own_rows, own_air, own_counts, own_group_health = self.groups(own_types, own_health, own_flying)
+        enemy_rows, enemy_air, enemy_counts, enemy_group_health = self.groups(enemy_types, enemy_health, enemy_flying)
+        own_hp, enemy_hp = float(own_group_health.sum()), float(enemy_group_health.sum())
+
+        own_dps, own_range = self.side_dps(own_rows, own_counts, enemy_rows, enemy_air, enemy_group_health, own_upgrades[0], enemy_upgrades[1])
+        enemy_dps, enemy_range = self.side_dps(enemy_rows, enemy_counts, own_rows, own_air, own_group_health, enemy_upgrades[0], own_upgrades[1])
+
+        # The side with more range gets to shoot while the other side closes in
+        types = self.tables()[1]
+        own_speed = float(types[own_rows, 2] @ own_counts / own_counts.sum())
+        enemy_speed = float(types[enemy_rows, 2] @ enemy_counts / enemy_counts.sum())
+        if own_range > enemy_range:
+            enemy_hp -= own_dps * min((own_range - enemy_range) / max(enemy_speed, 0.1), MAX_FREE_FIRE_TIME)
+        elif enemy_range > own_range:
+            own_hp -= enemy_dps * min((enemy_range - own_range) / max(own_speed, 0.1), MAX_FREE_FIRE_TIME)
+        if own_hp <= 0 or enemy_hp <= 0:
+            return (1 if own_hp > 0 else -1 if enemy_hp > 0 else 0), max(own_hp, 0.0), max(enemy_hp, 0.0)
+
+        # Square law: each side's fighting strength is its damage output times its health
+        own_strength, enemy_strength = own_dps * own_hp, enemy_dps * enemy_hp
+        if own_strength > enemy_strength:
+            return 1, own_hp * float(np.sqrt(1 - enemy_strength / own_strength)), 0.0
+        if enemy_strength > own_strength:
+            return -1, 0.0, enemy_hp * float(np.sqrt(1 - own_strength / enemy_strength))
+        return 0, 0.0, 0.0
+
+    # Same as predict(), for two lists of sc2 units
+    def predict_units(self, own_units, enemy_units, own_upgrades=(0, 0), enemy_upgrades=(0, 0)):
+        return self.predict(
+            [unit.type_id.value for unit in own_units], [unit.health + unit.shield for unit in own_units], [unit.is_flying for unit in own_units],
+            [unit.type_id.value for unit in enemy_units], [unit.health + unit.shield for unit in enemy_units], [unit.is_flying for unit in enemy_units],
+            own_upgrades, enemy_upgrades)
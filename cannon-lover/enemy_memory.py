@@ -0,0 +1,174 @@
+import numpy as np
+
+import sc2
+
+
+# Count, supply and resource value per unit type of remembered enemy units (not structures), with totals.
+# Kept up to date by EnemyMemory as units are first seen, morph or are forgotten, so reading it costs nothing.
+class Composition:
+    def __init__(self, game_data):
+        self.game_data = game_data
+        self.counts = {} # Type -> number of units
+        self.supplies = {} # Type -> supply of units
+        self.values = {} # Type -> minerals + vespene of units
+        self.total_count = 0
+        self.total_supply = 0
+        self.total_value = 0
+        self.unit_costs = {} # Type -> (supply, minerals + vespene) of one unit
+
+    def add(self, unit_type, sign=1):
+        if unit_type not in self.unit_costs:
+            unit_data = self.game_data.units[unit_type.value]
+            self.unit_costs[unit_type] = (unit_data._proto.food_required, unit_data.cost.minerals + unit_data.cost.vespene)
+        supply, value = self.unit_costs[unit_type]
+
+        count = self.counts.get(unit_type, 0) + sign
+        if count:
+            self.counts[unit_type] = count
+            self.supplies[unit_type] = self.supplies.get(unit_type, 0) + sign * supply
+            self.values[unit_type] = self.values.get(unit_type, 0) + sign * value
+        else:
+            del self.counts[unit_type], self.supplies[unit_type], self.values[unit_type]
+        self.total_count += sign
+        self.total_supply += sign * supply
+        self.total_value += sign * value
+
+    def remove(self, unit_type):
+        self.add(unit_type, -1)
+
+    # Number of units of the types
+    def amount(self, *types):
+        return sum(self.counts.get(unit_type, 0) for unit_type in types)
+
+    def supply(self, *types):
+        return sum(self.supplies.get(unit_type, 0) for unit_type in types)
+
+    def value(self, *types):
+        return sum(self.values.get(unit_type, 0) for unit_type in types)
+
+    # Share (0 to 1) of units that are of the types. by="supply" or by="value" weighs units by their supply or cost instead
+    def ratio(self, *types, by="count"):
+        if by == "supply":
+            return self.supply(*types) / self.total_supply if self.total_supply else 0
+        if by == "value":
+            return self.value(*types) / self.total_value if self.total_value else 0
+        return self.amount(*types) / self.total_count if self.total_count else 0
+
+
+# Remembers enemy units after they go out of sight, as a struct of arrays keyed by tag.
+# Slots of forgotten units are reused, so memory use only depends on how many enemies are remembered at the same time.
+# Units are forgotten when they die, when we see their last known position without seeing them,
+# or when they haven't been seen for max_unit_age (max_structure_age for structures) game loops.
+class EnemyMemory:
+    def __init__(self, game_data, max_unit_age=1344, max_structure_age=None, capacity=64):
+        self.game_data = game_data
+        self.max_unit_age = max_unit_age
+        self.max_structure_age = max_structure_age # None to never forget structures by age
+
+        self.slots = {} # Tag -> slot
+        self.free_slots = list(range(capacity - 1, -1, -1))
+        self.tags = np.zeros(capacity, dtype=np.uint64)
+        self.types = np.zeros(capacity, dtype=np.int32)
+        self.positions = np.zeros((capacity, 2), dtype=np.float64)
+        self.health = np.zeros(capacity, dtype=np.float64)
+        self.shield = np.zeros(capacity, dtype=np.float64)
+        self.last_seen = np.zeros(capacity, dtype=np.int64) # Game loop the unit was last seen
+        self.is_snapshot = np.zeros(capacity, dtype=bool) # Known but not visible (e.g. structures in the fog of war)
+        self.is_structure = np.zeros(capacity, dtype=bool)
+        self.is_ready = np.zeros(capacity, dtype=bool)
+        self.is_flying = np.zeros(capacity, dtype=bool)
+        self.is_used = np.zeros(capacity, dtype=bool)
+        self.unit_objects = [None] * capacity # Unit as it was last seen
+        self.composition = Composition(game_data) # Remembered units by type (see Composition)
+
+    def __len__(self):
+        return len(self.slots)
+
+    @property
+    def capacity(self):
+        return len(self.tags)
+
+    # Double the size of all arrays
+    def grow(self):
+        capacity = self.capacity
+        for name in ["tags", "types", "positions", "health", "shield", "last_seen", "is_snapshot", "is_structure", "is_ready", "is_flying", "is_used"]:
+            array = getattr(self, name)
+            grown = np.zeros((capacity * 2,) + array.shape[1:], dtype=array.dtype)
+            grown[:capacity] = array
+            setattr(self, name, grown)
+        self.unit_objects.extend([None] * capacity)
+        self.free_slots.extend(range(capacity * 2 - 1, capacity - 1, -1))
+
+    def allocate(self, tag):
+        if not self.free_slots:
+            self.grow()
+        slot = self.free_slots.pop()
+        self.slots[tag] = slot
+        self.tags[slot] = tag
+        self.is_used[slot] = True
+        return slot
+
+    def forget(self, slot):
+        if not self.is_structure[slot]:
+            self.composition.remove(self.unit_objects[slot].type_id)
+        del self.slots[int(self.tags[slot])]
+        self.is_used[slot] = False
+        self.unit_objects[slot] = None
+        self.free_slots.append(slot)
+
+    # Update memory with this step's known enemy units. visible is a boolean grid [x, y] of what we currently see,
+    # dead_tags are the units that died this step. Must be called once per step
+    def update(self, known_enemy_units, game_loop, visible=None, dead_tags=()):
+        seen = []
+        for unit in known_enemy_units:
+            unit_type = unit.type_id
+            slot = self.slots.get(unit.tag)
+            if slot is None or self.types[slot] != unit_type.value:
+                if slot is None:
+                    slot = self.allocate(unit.tag)
+                elif not self.is_structure[slot]:
+                    # Morphed (e.g. roach to ravager, or drone to a building), count it as its new type
+                    self.composition.remove(self.unit_objects[slot].type_id)
+                self.types[slot] = unit_type.value
+                self.is_structure[slot] = unit.is_structure
+                if not self.is_structure[slot]:
+                    self.composition.add(unit_type)
+
+            position = unit.position
+            self.positions[slot] = (position.x, position.y)
+            self.health[slot] = unit.health
+            self.shield[slot] = unit.shield
+            self.last_seen[slot] = game_loop
+            self.is_snapshot[slot] = not unit.is_visible
+            self.is_ready[slot] = unit.is_ready
+            self.is_flying[slot] = unit.is_flying
+            self.unit_objects[slot] = unit
+            seen.append(slot)
+
+        for tag in dead_tags:
+            if tag in self.slots:
+                self.forget(self.slots[tag])
+
+        # Units we didn't see this step
+        stale = self.is_used.copy()
+        stale[seen] = False
+
+        # We see where the unit was, but it's not there anymore
+        forgotten = np.zeros_like(stale)
+        if visible is not None:
+            cells = np.clip(self.positions.astype(np.int64), 0, np.array(visible.shape) - 1)
+            forgotten |= stale & visible[cells[:, 0], cells[:, 1]]
+
+        # Not seen for too long
+        age = game_loop - self.last_seen
+        if self.max_unit_age is not None:
+            forgotten |= stale & ~self.is_structure & (age > self.max_unit_age)
+        if self.max_structure_age is not None:
+            forgotten |= stale & self.is_structure & (age > self.max_structure_age)
+
+        for slot in np.flatnonzero(forgotten):
+            self.forget(slot)
+
+    # All remembered units (as they were last seen) as an sc2 Units object
+    def units(self):
+        return sc2.units.Units([self.unit_objects[slot] for slot in np.flatnonzero(self.is_used)], self.game_data)
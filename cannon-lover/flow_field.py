@@ -0,0 +1,209 @@
+import math
+
+import numpy as np
+
+import sc2
+
+from map_grid import pixel_map_to_array, cells_within_band
+
+
+# Neighbour offsets (x, y) and the cost of each step: straight steps first, then diagonal ones
+OFFSETS = np.array([(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)], dtype=np.int64)
+COSTS = np.array([1, 1, 1, 1, math.sqrt(2), math.sqrt(2), math.sqrt(2), math.sqrt(2)], dtype=np.float32)
+MAX_TARGET_DISTANCE = 8 # How far from an unpathable target (e.g. the middle of a nexus) we look for a pathable cell to start from
+
+
+# Ground distance to a target from every cell, and the neighbour to step to from each cell to get closer.
+# Computed on a grid with a wavefront: each round takes the cells first reached in the previous round and reaches their
+# unreached neighbours, all at once with NumPy. A cell's distance is the shortest (straight steps 1, diagonal sqrt(2),
+# no cutting corners) among the paths with the fewest steps, which is the true shortest path except around some obstacles.
+class FlowField:
+    def __init__(self, pathable, target):
+        self.target = target
+        width, height = pathable.shape
+        stride = height + 2
+
+        # Pad with unpathable cells, so neighbours of flat indices never wrap around an edge
+        padded = np.zeros((width + 2, height + 2), dtype=bool)
+        padded[1:-1, 1:-1] = pathable
+
+        # Steps allowed from each cell, as bits: the neighbour must be pathable, and for diagonal steps both straight cells next to it too (no cutting corners)
+        steps = self.allowed_steps(padded)
+        flat_steps = steps.ravel()
+        flat_offsets = OFFSETS[:, 0] * stride + OFFSETS[:, 1]
+        bits = (1 << np.arange(8)).astype(np.uint8)
+
+        start_x, start_y, start_distance = self.start_cell(pathable, target)
+        distances = np.full(padded.size, np.inf, dtype=np.float32)
+        reached = ~padded.ravel()
+        slots = np.zeros(padded.size, dtype=np.int64) # Scratch space for removing duplicate candidates
+        frontier = np.array([(start_x + 1) * stride + start_y + 1], dtype=np.int64)
+        distances[frontier] = start_distance
+        reached[frontier] = True
+        while len(frontier):
+            neighbours = frontier[:, np.newaxis] + flat_offsets[np.newaxis, :]
+            allowed = ((flat_steps[frontier][:, np.newaxis] & bits[np.newaxis, :]) != 0) & ~reached[neighbours]
+            candidates = neighbours[allowed]
+            if not len(candidates):
+                break
+            np.minimum.at(distances, candidates, (distances[frontier][:, np.newaxis] + COSTS[np.newaxis, :])[allowed])
+            # Next frontier: each candidate once (cheaper than np.unique, the last write to a cell wins)
+            order = np.arange(len(candidates))
+            slots[candidates] = order
+            frontier = candidates[slots[candidates] == order]
+            reached[frontier] = True
+
+        # Direction of each cell: the neighbour that's closest to the target through it (-1 at the target and where it can't be reached)
+        grid = distances.reshape(width + 2, height + 2)
+        inner_steps = steps[1:-1, 1:-1]
+        through = np.empty((8, width, height), dtype=np.float32)
+        for direction, (dx, dy) in enumerate(OFFSETS):
+            neighbour = grid[1 + dx:width + 1 + dx, 1 + dy:height + 1 + dy]
+            through[direction] = np.where(inner_steps & (1 << direction), neighbour + COSTS[direction], np.inf)
+        self.distances = grid[1:-1, 1:-1].copy() # Inf where the target can't be reached
+        best = through.argmin(axis=0)
+        best_distance = np.take_along_axis(through, best[np.newaxis], axis=0)[0]
+        self.directions = np.where(np.isfinite(self.distances) & (best_distance <= self.distances + 1e-3), best, -1).astype(np.int8)
+
+    # Bits of the steps (see OFFSETS) allowed from each cell of a padded pathable grid (0 on the padding)
+    @staticmethod
+    def allowed_steps(padded):
+        width, height = padded.shape[0] - 2, padded.shape[1] - 2
+        def shifted(dx, dy):
+            return padded[1 + dx:width + 1 + dx, 1 + dy:height + 1 + dy]
+        steps = np.zeros(padded.shape, dtype=np.uint8)
+        inner = steps[1:-1, 1:-1]
+        for direction, (dx, dy) in enumerate(OFFSETS):
+            allowed = shifted(dx, dy)
+            if dx and dy:
+                allowed = allowed & shifted(dx, 0) & shifted(0, dy)
+            inner |= (allowed << direction).astype(np.uint8)
+        return steps
+
+    # Cell to start the wavefront from: the target's cell, or if that's unpathable the closest pathable cell near it
+    @staticmethod
+    def start_cell(pathable, target):
+        x = min(max(int(target[0]), 0), pathable.shape[0] - 1)
+        y = min(max(int(target[1]), 0), pathable.shape[1] - 1)
+        if pathable[x, y]:
+            return x, y, 0.0
+        xs, ys = cells_within_band(pathable, target, 0, MAX_TARGET_DISTANCE)
+        if not len(xs):
+            return x, y, 0.0
+        distances = np.hypot(xs + 0.5 - target[0], ys + 0.5 - target[1])
+        closest = int(distances.argmin())
+        return int(xs[closest]), int(ys[closest]), float(distances[closest])
+
+    def cell(self, position):
+        width, height = self.distances.shape
+        return min(max(int(position[0]), 0), width - 1), min(max(int(position[1]), 0), height - 1)
+
+    # Ground distance from position to the target, or None if there's no path
+    def distance(self, position):
+        distance = self.distances[self.cell(position)]
+        return float(distance) if np.isfinite(distance) else None
+
+    # Point about distance along the path from position toward the target (the target itself if it's closer),
+    # or None if there's no path
+    def towards(self, position, distance=1):
+        x, y = self.cell(position)
+        if not np.isfinite(self.distances[x, y]):
+            return None
+        walked = 0.0
+        while walked < distance:
+            direction = self.directions[x, y]
+            if direction < 0:
+                if self.distances[x, y] < distance - walked:
+                    return sc2.position.Point2(self.target)
+                break
+            x, y = x + int(OFFSETS[direction, 0]), y + int(OFFSETS[direction, 1])
+            walked += float(COSTS[direction])
+        return sc2.position.Point2((x + 0.5, y + 0.5))
+
+    # Cells along the path from position to the target, as (N, 2) cell centers, and the ground distance left at each.
+    # Empty if there's no path
+    def path(self, position):
+        x, y = self.cell(position)
+        if not np.isfinite(self.distances[x, y]):
+            return np.zeros((0, 2)), np.zeros(0)
+        cells = [(x, y)]
+        while self.directions[x, y] >= 0:
+            direction = self.directions[x, y]
+            x, y = x + int(OFFSETS[direction, 0]), y + int(OFFSETS[direction, 1])
+            cells.append((x, y))
+        cells = np.array(cells, dtype=np.int64)
+        return cells + 0.5, self.distances[cells[:, 0], cells[:, 1]].astype(np.float64)
+
+
+# Flow fields toward a few named locations (e.g. our main, our natural, the enemy start and the rally point), on the pathing
+# grid from game start minus structures (ours and the enemy structures we remember). Fields are computed when first asked for,
+# and again after the target or the structures change, so queries never contact the game. Structures change often (e.g. while
+# we build up or the enemy spreads buildings), so a field they outdated is recomputed at most every recompute_interval game
+# loops, and at most one field per step. Until then the old field is used.
+class FlowFields:
+    def __init__(self, game_info, recompute_interval=22):
+        self.base_pathable = pixel_map_to_array(game_info.pathing_grid) > 0
+        self.pathable = self.base_pathable.copy()
+        self.targets = {} # Name -> target position
+        self.fields = {} # Name -> FlowField (for the current targets, maybe for older structures)
+        self.field_versions = {} # Name -> version of the grid the field was computed on
+        self.computed_loops = {} # Name -> game loop the field was computed on
+        self.footprints = set() # (x, y, width, height) of the structures that block the grid
+        self.version = 0 # Increased whenever the blocked cells change
+        self.recompute_interval = recompute_interval
+        self.game_loop = 0
+        self.last_compute_loop = None
+        self.compute_count = 0
+
+    # Set (or move) a named target. The field is recomputed only if the target moved to another cell
+    def set_target(self, name, position):
+        position = (float(position[0]), float(position[1]))
+        old_position = self.targets.get(name)
+        if old_position is not None and (int(old_position[0]), int(old_position[1])) == (int(position[0]), int(position[1])):
+            return
+        self.targets[name] = position
+        self.fields.pop(name, None)
+
+    # Current game loop, for how old fields are. Must be called once per step
+    def set_game_loop(self, game_loop):
+        self.game_loop = game_loop
+
+    # Block the cells under structures, given as (x, y, width, height) footprints. Fields are recomputed only if they changed
+    def update(self, footprints):
+        footprints = set(footprints)
+        if footprints == self.footprints:
+            return
+        self.footprints = footprints
+        self.pathable = self.base_pathable.copy()
+        width, height = self.pathable.shape
+        for x, y, footprint_width, footprint_height in footprints:
+            self.pathable[max(x, 0):min(x + footprint_width, width), max(y, 0):min(y + footprint_height, height)] = False
+        self.version += 1
+
+    # Flow field toward a named target, or None if there's no such target
+    def field(self, name):
+        if name not in self.targets:
+            return None
+        field = self.fields.get(name)
+        if field is not None and self.field_versions[name] != self.version:
+            # Outdated by structure changes: recompute if no field was computed this step and this one is old enough
+            if self.last_compute_loop != self.game_loop and self.game_loop - self.computed_loops[name] >= self.recompute_interval:
+                field = None
+        if field is None:
+            field = FlowField(self.pathable, self.targets[name])
+            self.fields[name] = field
+            self.field_versions[name] = self.version
+            self.computed_loops[name] = self.game_loop
+            self.last_compute_loop = self.game_loop
+            self.compute_count += 1
+        return field
+
+    # Ground distance from position to a named target, or None if there's no path (or no such target)
+    def distance(self, name, position):
+        field = self.field(name)
+        return field.distance(position) if field else None
+
+    # Point about distance along the path from position toward a named target, or None if there's no path (or no such target)
+    def towards(self, name, position, distance=1):
+        field = self.field(name)
+        return field.towards(position, distance) if field else None
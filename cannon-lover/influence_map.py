@@ -0,0 +1,133 @@
+import math
+
+import numpy as np
+
+import sc2
+
+from map_grid import pixel_map_to_array
+
+
+# Downsampled grids of enemy threat and our own strength. Each unit adds its value (e.g. health + shield) to every cell
+# within its weapon range (plus margin) of it. Contributions are kept per unit, and only units that moved to another cell
+# or whose value changed are taken off and put back on the grid each step, so a mostly still army costs next to nothing.
+class InfluenceMap:
+    def __init__(self, game_info, cell_size=2, margin=4, value_step=10):
+        self.cell_size = cell_size
+        self.margin = margin # Added to weapon range (distance units)
+        self.value_step = value_step # Values are rounded to this, so small health changes don't count as a change
+
+        pathable = pixel_map_to_array(game_info.pathing_grid) > 0
+        width, height = math.ceil(pathable.shape[0] / cell_size), math.ceil(pathable.shape[1] / cell_size)
+        padded = np.zeros((width * cell_size, height * cell_size), dtype=bool)
+        padded[:pathable.shape[0], :pathable.shape[1]] = pathable
+        self.pathable = padded.reshape(width, cell_size, height, cell_size).any(axis=(1, 3)) # Cells with any pathable ground
+
+        self.threat = np.zeros((width, height), dtype=np.float64) # Enemy
+        self.strength = np.zeros((width, height), dtype=np.float64) # Ours
+        self.contributions = {} # Unit tag -> (is_enemy, cell x, cell y, radius in cells, value)
+        self.kernels = {} # Radius in cells -> disk of cells within radius
+        self.ranges = {} # Unit type -> max weapon range
+        self.integral = None # Summed-area table of threat, built when first needed after a change
+
+    def kernel(self, radius):
+        if radius not in self.kernels:
+            offsets = np.arange(-radius, radius + 1)
+            xs, ys = np.meshgrid(offsets, offsets, indexing="ij")
+            self.kernels[radius] = (xs * xs + ys * ys <= radius * radius).astype(np.float64)
+        return self.kernels[radius]
+
+    def weapon_range(self, unit):
+        unit_type = unit.type_id
+        if unit_type not in self.ranges:
+            weapons = unit._type_data._proto.weapons
+            self.ranges[unit_type] = max((weapon.range for weapon in weapons), default=None)
+        return self.ranges[unit_type]
+
+    def stamp(self, contribution, sign):
+        is_enemy, x, y, radius, value = contribution
+        grid = self.threat if is_enemy else self.strength
+        kernel = self.kernel(radius)
+        width, height = grid.shape
+        x0, y0 = max(x - radius, 0), max(y - radius, 0)
+        x1, y1 = min(x + radius + 1, width), min(y + radius + 1, height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        grid[x0:x1, y0:y1] += sign * value * kernel[x0 - (x - radius):x1 - (x - radius), y0 - (y - radius):y1 - (y - radius)]
+
+    # Sync the grids with this step's units, given as (unit, value) pairs. Units that are gone are taken off. Must be called once per step
+    def update(self, own_units, enemy_units):
+        seen = set()
+        changed = False
+        for units, is_enemy in [(own_units, False), (enemy_units, True)]:
+            for unit, value in units:
+                weapon_range = self.weapon_range(unit)
+                if weapon_range is None or value <= 0:
+                    continue
+
+                position = unit.position
+                radius = int(math.ceil((weapon_range + unit.radius + self.margin) / self.cell_size))
+                value = round(value / self.value_step) * self.value_step
+                contribution = (is_enemy, int(position.x // self.cell_size), int(position.y // self.cell_size), radius, value)
+
+                tag = unit.tag
+                seen.add(tag)
+                old_contribution = self.contributions.get(tag)
+                if old_contribution == contribution:
+                    continue
+                if old_contribution:
+                    self.stamp(old_contribution, -1)
+                self.stamp(contribution, 1)
+                self.contributions[tag] = contribution
+                changed = changed or is_enemy
+
+        for tag in [tag for tag in self.contributions if tag not in seen]:
+            contribution = self.contributions.pop(tag)
+            self.stamp(contribution, -1)
+            changed = changed or contribution[0]
+
+        if changed:
+            self.integral = None
+
+    def cell(self, position):
+        x = min(max(int(position.x // self.cell_size), 0), self.threat.shape[0] - 1)
+        y = min(max(int(position.y // self.cell_size), 0), self.threat.shape[1] - 1)
+        return x, y
+
+    # Enemy threat at a position
+    def threat_at(self, position):
+        return self.threat[self.cell(position)]
+
+    # Our strength at a position
+    def strength_at(self, position):
+        return self.strength[self.cell(position)]
+
+    # Total enemy threat in the square of cells around position (half side distance), from a summed-area table
+    def threat_within(self, position, distance):
+        if self.integral is None:
+            self.integral = np.zeros((self.threat.shape[0] + 1, self.threat.shape[1] + 1))
+            self.integral[1:, 1:] = self.threat.cumsum(axis=0).cumsum(axis=1)
+
+        x, y = self.cell(position)
+        radius = int(math.ceil(distance / self.cell_size))
+        x0, y0 = max(x - radius, 0), max(y - radius, 0)
+        x1, y1 = min(x + radius + 1, self.threat.shape[0]), min(y + radius + 1, self.threat.shape[1])
+        return self.integral[x1, y1] - self.integral[x0, y1] - self.integral[x1, y0] + self.integral[x0, y0]
+
+    # Position distance away from origin (in one of `directions` directions) with the least enemy threat minus our strength.
+    # Unpathable positions are skipped. Ties go to the direction closest to towards, if given
+    def safest_position(self, origin, distance, towards=None, directions=16):
+        angles = np.arange(directions) * (2 * math.pi / directions)
+        xs = origin.x + distance * np.cos(angles)
+        ys = origin.y + distance * np.sin(angles)
+        cells_x = np.clip((xs // self.cell_size).astype(np.int64), 0, self.threat.shape[0] - 1)
+        cells_y = np.clip((ys // self.cell_size).astype(np.int64), 0, self.threat.shape[1] - 1)
+
+        danger = self.threat[cells_x, cells_y] - self.strength[cells_x, cells_y]
+        danger[~self.pathable[cells_x, cells_y]] = np.inf
+        if towards is not None:
+            # Values are whole value steps, so adding less than half a step only breaks ties
+            distances = np.hypot(xs - towards.x, ys - towards.y)
+            danger = danger + distances / (distances.max() + 1) * self.value_step * 0.5
+
+        best = int(np.argmin(danger))
+        return sc2.position.Point2((float(xs[best]), float(ys[best])))
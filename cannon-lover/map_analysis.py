@@ -0,0 +1,194 @@
+import hashlib
+import os
+import re
+import tempfile
+
+import numpy as np
+
+import sc2
+
+from map_grid import pixel_map_to_array, label_components, run_lengths
+
+
+MAP_ANALYSIS_VERSION = 1 # Increase when the analysis changes, so old cache files are recomputed
+EXPANSION_GAP_THRESHOLD = 15 # A spawn and an expansion this close are the same base (same as BotAI.EXPANSION_GAP_THRESHOLD)
+EXPANSION_RESOURCE_DISTANCE = 15 # Resources this close to a cached expansion belong to it
+MIN_RAMP_SIZE = 8 # Cells
+MIN_RAMP_HEIGHT = 8 # Difference between the highest and lowest cell of a ramp (in terrain_height units, one cliff level is about 16)
+MAX_CHOKE_WIDTH = 8 # Cells
+MIN_CHOKE_SIZE = 6 # Cells
+CHOKE_EXPANSION_DISTANCE = 12 # Narrow gaps this close to an expansion (e.g. behind mineral lines) aren't chokes
+
+
+def point(row):
+    return sc2.position.Point2((float(row[0]), float(row[1])))
+
+
+# Things about a map that never change during a game: expansions, the natural of each spawn, ground distances between
+# expansions, ramps and chokes. Computed once per map by analyze_map() and saved to a small file (see cache_path()),
+# so later games on the same map just load it.
+class MapAnalysis:
+    def __init__(self, expansions, spawns, naturals, distances, ramp_centers, ramp_tops, ramp_bottoms, ramp_sizes, choke_centers, choke_widths):
+        self.expansions = expansions # (E, 2) expansion locations
+        self.spawns = spawns # (S, 2) start locations, ours included
+        self.naturals = naturals # (S,) expansion index of each spawn's natural (-1 if none)
+        self.distances = distances # (S + E, S + E) ground distances between spawns and expansions (spawns first), NaN if there's no path
+        self.ramp_centers = ramp_centers # (R, 2)
+        self.ramp_tops = ramp_tops # (R, 2) center of a ramp's highest cells
+        self.ramp_bottoms = ramp_bottoms # (R, 2) center of a ramp's lowest cells
+        self.ramp_sizes = ramp_sizes # (R,) cells
+        self.choke_centers = choke_centers # (C, 2)
+        self.choke_widths = choke_widths # (C,) cells across at the narrowest point
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Write to a temporary file first, so a game that's killed while saving doesn't leave half a file behind.
+        # Each save gets its own file, so games saving the same map at the same time don't write over each other's
+        handle, temporary_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path) or ".")
+        try:
+            with os.fdopen(handle, "wb") as file:
+                np.savez_compressed(file, version=MAP_ANALYSIS_VERSION, **vars(self))
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+    # Load a saved analysis, or None if there is none (or it's from an older version)
+    @classmethod
+    def load(cls, path):
+        if not os.path.isfile(path):
+            return None
+        try:
+            with np.load(path) as data:
+                if int(data["version"]) != MAP_ANALYSIS_VERSION:
+                    return None
+                return cls(**{name: data[name] for name in data.files if name != "version"})
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    # Index of the closest spawn (or expansion) to a position
+    def closest_spawn(self, position):
+        return int(np.argmin(np.hypot(self.spawns[:, 0] - position[0], self.spawns[:, 1] - position[1])))
+
+    def closest_expansion(self, position):
+        return int(np.argmin(np.hypot(self.expansions[:, 0] - position[0], self.expansions[:, 1] - position[1])))
+
+    # Natural expansion of the spawn closest to a position, or None
+    def natural(self, spawn_position):
+        natural = self.naturals[self.closest_spawn(spawn_position)]
+        return point(self.expansions[natural]) if natural >= 0 else None
+
+    # Ground distance between two expansions (by index), or None if there's no path
+    def expansion_distance(self, start, end):
+        distance = self.distances[len(self.spawns) + start, len(self.spawns) + end]
+        return None if np.isnan(distance) else float(distance)
+
+    # Ramp closest to a position as (center, top, bottom), or None if the map has no ramps
+    def closest_ramp(self, position):
+        if len(self.ramp_centers) == 0:
+            return None
+        ramp = int(np.argmin(np.hypot(self.ramp_centers[:, 0] - position[0], self.ramp_centers[:, 1] - position[1])))
+        return point(self.ramp_centers[ramp]), point(self.ramp_tops[ramp]), point(self.ramp_bottoms[ramp])
+
+    # Expansion locations -> resources, like BotAI.expansion_locations, by giving each resource to the closest cached expansion
+    def expansion_resources(self, resources):
+        groups = {point(row): [] for row in self.expansions}
+        if not resources:
+            return groups
+        locations = list(groups)
+        positions = np.array([(resource.position.x, resource.position.y) for resource in resources])
+        delta = positions[:, np.newaxis, :] - self.expansions[np.newaxis, :, :]
+        distances = np.hypot(delta[:, :, 0], delta[:, :, 1])
+        closest = distances.argmin(axis=1)
+        for resource, expansion, distance in zip(resources, closest, distances[np.arange(len(resources)), closest]):
+            if distance < EXPANSION_RESOURCE_DISTANCE:
+                groups[locations[expansion]].append(resource)
+        return groups
+
+
+# Cache file for a map: map name (made safe for file names) plus a hash of the grids and start locations,
+# so a changed map with the same name gets its own file
+def cache_path(cache_dir, game_info, spawns):
+    digest = hashlib.sha1()
+    for pixel_map in [game_info.pathing_grid, game_info.terrain_height, game_info.placement_grid]:
+        digest.update(pixel_map.data)
+    digest.update(np.array(sorted((round(x, 1), round(y, 1)) for x, y in spawns), dtype=np.float64).tobytes())
+    name = re.sub(r"[^A-Za-z0-9_-]+", "_", game_info._proto.map_name).strip("_") or "map"
+    return os.path.join(cache_dir, "{}-{}.npz".format(name, digest.hexdigest()[:16]))
+
+
+# Ramps: groups of pathable cells that can't be built on and go up or down a cliff level.
+# Returns centers, tops, bottoms and sizes
+def find_ramps(pathable, placeable, height):
+    labels, count = label_components(pathable & ~placeable)
+    all_xs, all_ys = np.nonzero(labels)
+    order = np.argsort(labels[all_xs, all_ys], kind="stable")
+    groups = np.split(order, np.cumsum(np.bincount(labels[all_xs, all_ys], minlength=count + 1)[1:])[:-1])
+    centers, tops, bottoms, sizes = [], [], [], []
+    for group in groups:
+        xs, ys = all_xs[group], all_ys[group]
+        if len(xs) < MIN_RAMP_SIZE:
+            continue
+        heights = height[xs, ys]
+        if heights.max() - heights.min() < MIN_RAMP_HEIGHT:
+            continue
+        top, bottom = heights == heights.max(), heights == heights.min()
+        centers.append((xs.mean() + 0.5, ys.mean() + 0.5))
+        tops.append((xs[top].mean() + 0.5, ys[top].mean() + 0.5))
+        bottoms.append((xs[bottom].mean() + 0.5, ys[bottom].mean() + 0.5))
+        sizes.append(len(xs))
+    return (np.array(centers, dtype=np.float64).reshape(-1, 2), np.array(tops, dtype=np.float64).reshape(-1, 2),
+            np.array(bottoms, dtype=np.float64).reshape(-1, 2), np.array(sizes, dtype=np.int64))
+
+
+# Chokes: groups of pathable cells with walls on both sides at most MAX_CHOKE_WIDTH cells apart (across x or y), away from expansions.
+# Returns centers and widths
+def find_chokes(pathable, expansions):
+    widths = np.minimum(run_lengths(pathable, 0), run_lengths(pathable, 1))
+    narrow = pathable & (widths <= MAX_CHOKE_WIDTH)
+    xs, ys = np.nonzero(narrow)
+    for x, y in expansions:
+        close = np.hypot(xs + 0.5 - x, ys + 0.5 - y) < CHOKE_EXPANSION_DISTANCE
+        narrow[xs[close], ys[close]] = False
+
+    labels, count = label_components(narrow)
+    xs, ys = np.nonzero(labels)
+    cell_labels = labels[xs, ys]
+    sizes = np.bincount(cell_labels, minlength=count + 1)
+    narrowest = np.full(count + 1, MAX_CHOKE_WIDTH + 1)
+    np.minimum.at(narrowest, cell_labels, widths[xs, ys])
+    keep = np.flatnonzero(sizes >= MIN_CHOKE_SIZE)
+    keep = keep[keep > 0]
+    centers = np.stack([np.bincount(cell_labels, weights=xs + 0.5, minlength=count + 1), np.bincount(cell_labels, weights=ys + 0.5, minlength=count + 1)], axis=1)
+    return centers[keep] / sizes[keep, np.newaxis], narrowest[keep].astype(np.float64)
+
+
+# Analyze a map: ground distances between spawns and expansions (one pathing request), each spawn's natural (the closest
+# expansion by ground), ramps and chokes. expansion_locations are the map's expansion locations (e.g. BotAI.expansion_locations)
+async def analyze_map(game_info, spawns, expansion_locations, pathing):
+    spawns = np.array(sorted((float(x), float(y)) for x, y in spawns), dtype=np.float64).reshape(-1, 2)
+    expansions = np.array(sorted((float(location.x), float(location.y)) for location in expansion_locations), dtype=np.float64).reshape(-1, 2)
+    points = [point(row) for row in np.concatenate([spawns, expansions])]
+
+    pairs = [(i, j) for i in range(len(points)) for j in range(i + 1, len(points))]
+    distances = np.full((len(points), len(points)), np.nan)
+    np.fill_diagonal(distances, 0)
+    if pairs:
+        for (i, j), distance in zip(pairs, await pathing.distances([(points[i], points[j]) for i, j in pairs])):
+            if distance is not None:
+                distances[i, j] = distances[j, i] = distance
+
+    naturals = np.full(len(spawns), -1, dtype=np.int64)
+    for spawn, (x, y) in enumerate(spawns):
+        candidates = distances[spawn, len(spawns):].copy()
+        candidates[np.hypot(expansions[:, 0] - x, expansions[:, 1] - y) < EXPANSION_GAP_THRESHOLD] = np.nan
+        if not np.all(np.isnan(candidates)):
+            naturals[spawn] = int(np.nanargmin(candidates))
+
+    pathable = pixel_map_to_array(game_info.pathing_grid) > 0
+    placeable = pixel_map_to_array(game_info.placement_grid) > 0
+    height = pixel_map_to_array(game_info.terrain_height, dtype=np.int16)
+    ramp_centers, ramp_tops, ramp_bottoms, ramp_sizes = find_ramps(pathable, placeable, height)
+    choke_centers, choke_widths = find_chokes(pathable, expansions)
+
+    return MapAnalysis(expansions, spawns, naturals, distances, ramp_centers, ramp_tops, ramp_bottoms, ramp_sizes, choke_centers, choke_widths)
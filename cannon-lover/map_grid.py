@@ -0,0 +1,94 @@
+import numpy as np
+
+
+# Convert a sc2 PixelMap (e.g. game_info.pathing_grid or state.visibility) to a NumPy array indexed as [x, y].
+# Reads the data the same way PixelMap.__getitem__() does (which flips rows), so the result matches pixel_map[(x, y)].
+def pixel_map_to_array(pixel_map, dtype=np.uint8):
+    width, height = pixel_map.width, pixel_map.height
+    if pixel_map.bytes_per_pixel != 1:
+        return np.array([[pixel_map[(x, y)] for y in range(height)] for x in range(width)], dtype=dtype)
+
+    data = np.frombuffer(pixel_map.data, dtype=np.uint8)
+    xs, ys = np.meshgrid(np.arange(width), np.arange(height), indexing="ij")
+    return data[(xs - width * ys) % (width * height)].astype(dtype)
+
+
+# Sum of grid values in every size_x * size_y window, indexed by the window's lower-left corner. Shape is (W-size_x+1, H-size_y+1).
+def window_sums(grid, size_x, size_y):
+    integral = np.zeros((grid.shape[0] + 1, grid.shape[1] + 1), dtype=np.int32)
+    integral[1:, 1:] = grid.astype(np.int32).cumsum(axis=0).cumsum(axis=1)
+    return integral[size_x:, size_y:] - integral[:-size_x, size_y:] - integral[size_x:, :-size_y] + integral[:-size_x, :-size_y]
+
+
+# Grow all set cells of a boolean grid by distance cells in every direction (square neighbourhood)
+def dilate(grid, distance):
+    if distance <= 0:
+        return grid.copy()
+    padded = np.pad(grid, distance, mode="constant")
+    return window_sums(padded, 2 * distance + 1, 2 * distance + 1) > 0
+
+
+# Set cells of a boolean grid whose centers are between min_distance and max_distance from center (e.g. pathable cells
+# in a ring around a base). Only the square around the ring is looked at. Returns two arrays, the cells' x and y
+def cells_within_band(grid, center, min_distance, max_distance):
+    x0, x1 = max(int(center[0] - max_distance), 0), min(int(center[0] + max_distance) + 1, grid.shape[0])
+    y0, y1 = max(int(center[1] - max_distance), 0), min(int(center[1] + max_distance) + 1, grid.shape[1])
+    if x0 >= x1 or y0 >= y1:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    xs, ys = np.nonzero(grid[x0:x1, y0:y1])
+    xs, ys = xs + x0, ys + y0
+    distances_squared = (xs + 0.5 - center[0]) ** 2 + (ys + 0.5 - center[1]) ** 2
+    within = (distances_squared >= min_distance ** 2) & (distances_squared <= max_distance ** 2)
+    return xs[within], ys[within]
+
+
+# Label the 8-connected groups of set cells in a boolean grid. Runs of set cells along y are joined with union-find wherever they
+# touch a run in the next column (diagonals included), so the work grows with the number of runs, not with how winding a group is.
+# Returns an int grid (0 where not set, groups numbered from 1 in the order of their first cell) and the number of groups
+def label_components(grid):
+    width, height = grid.shape
+    if not grid.any():
+        return np.zeros(grid.shape, dtype=np.int32), 0
+
+    # Runs along y: each set cell gets the index of its run, numbered in the order of their first cells
+    starts = grid & ~np.pad(grid, ((0, 0), (1, 0)), mode="constant")[:, :-1]
+    runs = np.cumsum(starts.ravel()).reshape(grid.shape) - 1
+
+    # Runs that touch: a set cell and the set cells next to it in the next column (diagonals included)
+    pairs = []
+    for dy in (-1, 0, 1):
+        here = grid[:-1, max(-dy, 0):height - max(dy, 0)]
+        there = grid[1:, max(dy, 0):height - max(-dy, 0)]
+        both = here & there
+        pairs.append(np.stack([runs[:-1, max(-dy, 0):height - max(dy, 0)][both], runs[1:, max(dy, 0):height - max(-dy, 0)][both]], axis=1))
+    pairs = np.unique(np.concatenate(pairs), axis=0)
+
+    # Union-find over runs, the smaller index becomes the root so groups keep the order of their first cell
+    parent = list(range(int(runs.max()) + 1))
+    def find(run):
+        while parent[run] != run:
+            parent[run] = parent[parent[run]]
+            run = parent[run]
+        return run
+    for a, b in pairs.tolist():
+        a, b = find(a), find(b)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+    roots = np.array([find(run) for run in range(len(parent))], dtype=np.int64)
+
+    unique, inverse = np.unique(roots, return_inverse=True)
+    result = np.zeros(grid.shape, dtype=np.int32)
+    result[grid] = inverse[runs[grid]] + 1
+    return result, len(unique)
+
+
+# Length of the run of set cells (along axis 0 for x, 1 for y) each cell of a boolean grid is in, 0 for cells that aren't set.
+# E.g. across axis 0, a pathable cell's run length is how far apart the walls left and right of it are
+def run_lengths(grid, axis):
+    grid = np.moveaxis(grid, axis, 0)
+    length = grid.shape[0]
+    indices = np.arange(length)[:, np.newaxis]
+    previous_unset = np.maximum.accumulate(np.where(grid, -1, indices), axis=0)
+    next_unset = np.minimum.accumulate(np.where(grid, length, indices)[::-1], axis=0)[::-1]
+    return np.moveaxis(np.where(grid, next_unset - previous_unset - 1, 0), 0, axis)
@@ -0,0 +1,2 @@
+# Ladder maps for local games (run.py) and the tournament runner (tournament.py)
+MAP_POOL = ["(2)16-BitLE", "(2)AcidPlantLE", "(2)CatalystLE", "(2)DreamcatcherLE", "(2)LostandFoundLE", "(2)RedshiftLE", "(4)DarknessSanctuaryLE"]
@@ -0,0 +1,190 @@
+import math, asyncio
+
+import sc2
+from sc2.data import Race, Result, Status, ActionResult
+from sc2.player import Bot
+from sc2.pixel_map import PixelMap
+from sc2.protocol import ProtocolError
+
+from s2clientprotocol import sc2api_pb2 as sc_pb
+
+from recorder import RecordingReader
+
+
+# Stand-in for sc2.client.Client that serves recorded or synthetic observations instead of talking to a running game,
+# so on_step() can be driven (and benchmarked) without the game binary. See synthetic_game.py for generated games.
+#
+# game_info, game_data and observations are the protobuf responses the game would send (ResponseGameInfo, ResponseData and
+# one ResponseObservation per step). Queries are answered from the recorded tables when possible:
+#  - pathing: (start x, start y, end x, end y) rounded -> distance (0 when there's no path)
+#  - placements: (ability id, x, y) rounded -> ActionResult value
+#  - abilities: unit tag -> available ability ids, and type_abilities: unit type -> available ability ids
+# and otherwise estimated from the map (straight line distances and the placement grid).
+class OfflineClient(sc2.client.Client):
+    def __init__(self, game_info, game_data, observations, pathing=None, placements=None, abilities=None, type_abilities=None, result=Result.Tie, player_id=1):
+        super().__init__(ws=self) # Requests never go over a connection (see _execute())
+        self.game_info = game_info
+        self.game_data = game_data
+        self.observations = observations
+        self.pathing = pathing or {}
+        self.placements = placements or {}
+        self.abilities = abilities or {}
+        self.type_abilities = type_abilities or {}
+        self.result = result # Game result reported after the last observation
+        self.player_id = player_id
+
+        self.step_index = 0
+        self.actions_sent = [] # (game loop, raw action) for every unit command sent
+        self.chat_sent = [] # (game loop, message)
+        self.request_counts = {} # Request type -> number of requests
+
+        self.pathing_grid = PixelMap(game_info.start_raw.pathing_grid)
+        self.placement_grid = PixelMap(game_info.start_raw.placement_grid)
+
+    # Replay a game recorded with recorder.ObservationRecorder. Observations are read from the log as they're needed,
+    # and recorded query responses are used to answer the same queries
+    @classmethod
+    def from_recording(cls, path):
+        reader = RecordingReader(path)
+        pathing, placements, abilities = {}, {}, {}
+
+        for request, response in reader.queries():
+            for query, result in zip(request.pathing, response.pathing):
+                if query.HasField("start_pos"):
+                    pathing[(round(query.start_pos.x), round(query.start_pos.y), round(query.end_pos.x), round(query.end_pos.y))] = result.distance
+            for query, result in zip(request.placements, response.placements):
+                placements[(query.ability_id, round(query.target_pos.x), round(query.target_pos.y))] = result.result
+            for result in response.abilities:
+                abilities[result.unit_tag] = [ability.ability_id for ability in result.abilities]
+
+        observations = reader.observations()
+        last_observation = observations[len(observations) - 1]
+        result = Result(last_observation.player_result[0].result) if last_observation.player_result else Result.Tie
+        player_id = last_observation.observation.player_common.player_id or 1
+
+        return cls(reader.game_info(), reader.game_data(), observations, pathing, placements, abilities, result=result, player_id=player_id)
+
+    @property
+    def current_observation(self):
+        return self.observations[min(self.step_index, len(self.observations) - 1)]
+
+    @property
+    def game_loop(self):
+        return self.current_observation.observation.game_loop
+
+    # Answer a request the same way the game would, without leaving the process
+    async def _execute(self, **kwargs):
+        assert len(kwargs) == 1, "Only one request allowed"
+        request_type, request = next(iter(kwargs.items()))
+
+        handler = getattr(self, "_handle_" + request_type, None)
+        if handler is None:
+            raise ProtocolError(f"Offline client can't handle '{request_type}' requests")
+
+        self.request_counts[request_type] = self.request_counts.get(request_type, 0) + 1
+
+        response = sc_pb.Response()
+        handler(request, response)
+        response.status = self._status.value
+
+        # The game answers these over the connection, which lets other games (and timeouts) run in the meantime. Do the same
+        if request_type in ("observation", "step"):
+            await asyncio.sleep(0)
+        return response
+
+    def _handle_ping(self, request, response):
+        response.ping.SetInParent()
+
+    def _handle_join_game(self, request, response):
+        self._status = Status.in_game
+        response.join_game.player_id = self.player_id
+
+    def _handle_game_info(self, request, response):
+        response.game_info.CopyFrom(self.game_info)
+
+    def _handle_data(self, request, response):
+        response.data.CopyFrom(self.game_data)
+
+    def _handle_observation(self, request, response):
+        response.observation.CopyFrom(self.current_observation)
+        del response.observation.player_result[:] # Only report the result after the last observation (recorded ones may already have it)
+
+        # Game ends after the last observation
+        if self.step_index >= len(self.observations) - 1:
+            response.observation.player_result.add(player_id=self.player_id, result=self.result.value)
+            self._status = Status.ended
+
+    def _handle_step(self, request, response):
+        self.step_index += 1
+        response.step.SetInParent()
+
+    def _handle_action(self, request, response):
+        for action in request.actions:
+            if action.HasField("action_chat"):
+                self.chat_sent.append((self.game_loop, action.action_chat.message))
+            else:
+                self.actions_sent.append((self.game_loop, action.action_raw))
+            response.action.result.append(ActionResult.Success.value)
+
+    def _handle_query(self, request, response):
+        positions = None
+        if any(query.HasField("unit_tag") for query in request.pathing):
+            positions = {unit.tag: unit.pos for unit in self.current_observation.observation.raw_data.units}
+
+        for query in request.pathing:
+            start = positions[query.unit_tag] if query.HasField("unit_tag") else query.start_pos
+            response.query.pathing.add(distance=self.query_distance(start, query.end_pos))
+
+        for query in request.placements:
+            response.query.placements.add(result=self.query_placement(query.ability_id, query.target_pos))
+
+        if request.abilities:
+            unit_types = {unit.tag: unit.unit_type for unit in self.current_observation.observation.raw_data.units}
+            for query in request.abilities:
+                abilities = response.query.abilities.add(unit_tag=query.unit_tag, unit_type_id=unit_types.get(query.unit_tag, 0))
+                ability_ids = self.abilities.get(query.unit_tag, self.type_abilities.get(unit_types.get(query.unit_tag), []))
+                for ability_id in ability_ids:
+                    abilities.abilities.add(ability_id=ability_id)
+
+    def _handle_debug(self, request, response):
+        response.debug.SetInParent()
+
+    def _handle_save_replay(self, request, response):
+        response.save_replay.SetInParent()
+
+    def _handle_leave_game(self, request, response):
+        self._status = Status.launched
+        response.leave_game.SetInParent()
+
+    def _handle_quit(self, request, response):
+        self._status = Status.quit
+        response.quit.SetInParent()
+
+    def is_pathable(self, position):
+        x, y = int(position.x), int(position.y)
+        return 0 <= x < self.pathing_grid.width and 0 <= y < self.pathing_grid.height and self.pathing_grid[(x, y)] != 0
+
+    def query_distance(self, start, end):
+        key = (round(start.x), round(start.y), round(end.x), round(end.y))
+        if key in self.pathing:
+            return self.pathing[key]
+
+        if not self.is_pathable(start) or not self.is_pathable(end):
+            return 0.0
+        return math.hypot(end.x - start.x, end.y - start.y)
+
+    def query_placement(self, ability_id, position):
+        key = (ability_id, round(position.x), round(position.y))
+        if key in self.placements:
+            return self.placements[key]
+
+        x, y = int(position.x), int(position.y)
+        if 0 <= x < self.placement_grid.width and 0 <= y < self.placement_grid.height and self.placement_grid[(x, y)] != 0:
+            return ActionResult.Success.value
+        return ActionResult.CantBuildLocationInvalid.value
+
+
+# Play a whole game against an OfflineClient, the same way sc2.run_game() would. Returns the game result
+async def run_offline_game(ai, client):
+    race = Race(client.game_info.player_info[client.player_id - 1].race_requested)
+    return await sc2.main._play_game(Bot(race, ai), client, realtime=False, portconfig=None)
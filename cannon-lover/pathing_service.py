@@ -0,0 +1,54 @@
+# Ground distance queries against the game, batched into single requests and memoized.
+# Endpoints are quantized (rounded to multiples of quantization), so queries between nearby points share a memo entry.
+# The memo must be invalidated whenever the pathing on the map changes (e.g. our own structures are placed or destroyed).
+class PathingService:
+    def __init__(self, client, quantization=1, max_memo_size=10000):
+        self.client = client
+        self.quantization = quantization
+        self.max_memo_size = max_memo_size
+        self.memo = {}
+        self.request_count = 0 # Number of pathing requests sent to the game
+
+    def key(self, start, end):
+        q = self.quantization
+        return (round(start.x / q), round(start.y / q), round(end.x / q), round(end.y / q))
+
+    # Pairs whose keys aren't in the memo, as key -> pair (each key once)
+    def missing(self, keys, pairs):
+        missing = {}
+        for key, pair in zip(keys, pairs):
+            if key not in self.memo and key not in missing:
+                missing[key] = pair
+        return missing
+
+    # Get ground distance for each (start, end) pair, or None if there is no path. Makes at most one request to the game.
+    async def distances(self, pairs):
+        pairs = [(start.position.to2, end.position.to2) for start, end in pairs]
+        keys = [self.key(start, end) for start, end in pairs]
+
+        # Find the pairs we don't remember yet (each only once)
+        missing = self.missing(keys, pairs)
+
+        if missing:
+            # Don't let the memo grow forever (e.g. with moving workers as start points). After a reset, the whole batch is missing
+            if len(self.memo) + len(missing) > self.max_memo_size:
+                self.memo = {}
+                missing = self.missing(keys, pairs)
+
+            results = await self.client.query_pathings([[start, end] for start, end in missing.values()])
+            self.request_count += 1
+
+            for key, distance in zip(missing, results):
+                # Distance is 0 when no path is found
+                self.memo[key] = distance if distance > 0.0 else None
+
+        return [self.memo[key] for key in keys]
+
+    # Get ground distance between two points, or None if there is no path
+    async def distance(self, start, end):
+        distances = await self.distances([(start, end)])
+        return distances[0]
+
+    # Forget all remembered distances
+    def invalidate(self):
+        self.memo = {}
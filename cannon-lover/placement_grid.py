@@ -0,0 +1,169 @@
+import math
+import random
+
+import numpy as np
+
+import sc2
+from sc2.constants import *
+
+from map_grid import pixel_map_to_array, window_sums, dilate
+
+
+# Footprint size (in cells) of buildings. Other structures fall back to their radius
+FOOTPRINT_SIZES = {
+    NEXUS: 5,
+    GATEWAY: 3, WARPGATE: 3, FORGE: 3, CYBERNETICSCORE: 3, TWILIGHTCOUNCIL: 3, ROBOTICSFACILITY: 3, ROBOTICSBAY: 3,
+    STARGATE: 3, FLEETBEACON: 3, TEMPLARARCHIVE: 3, ASSIMILATOR: 3,
+    PYLON: 2, PHOTONCANNON: 2, SHIELDBATTERY: 2, DARKSHRINE: 2,
+}
+
+UNPOWERED_BUILDINGS = [NEXUS, PYLON, ASSIMILATOR] # Buildings that don't need to be placed in a pylon's power field
+TOWNHALL_RESOURCE_DISTANCE = 3 # Town halls can't be placed this close (in cells) to minerals and geysers
+
+
+# Local copy of the placement grid with a live occupancy bitmap, so we can find building spots without asking the game.
+# The bitmap is updated each step from our structures, known enemy structures and resources (see update()).
+class PlacementGrid:
+    def __init__(self, game_info, rng=None):
+        self.placeable = pixel_map_to_array(game_info.placement_grid) > 0
+        self.occupied = np.zeros(self.placeable.shape, dtype=np.int16) # Number of footprints covering each cell
+        self.resources = np.zeros(self.placeable.shape, dtype=np.int16) # Number of resource footprints covering each cell
+        self.creep = np.zeros(self.placeable.shape, dtype=bool) # We can't build on creep
+        self.footprints = {} # Unit tag -> (x, y, width, height, is_resource)
+        self.reservations = {} # Footprint -> game loop when reservation expires
+        self.version = 0 # Increased whenever occupancy changes
+        self.fits_cache = {}
+        self.random = rng or random.Random() # For picking among equally close spots (see find_placements())
+
+    # Footprint (lower-left cell x, y, width, height, is_resource) of a structure or resource
+    def unit_footprint(self, unit):
+        if unit.is_mineral_field:
+            width, height, is_resource = 2, 1, True
+        elif unit.is_vespene_geyser:
+            width, height, is_resource = 3, 3, True
+        else:
+            width = height = FOOTPRINT_SIZES.get(unit.type_id) or max(1, int(unit.radius * 2))
+            is_resource = False
+
+        position = unit.position
+        return (math.floor(position.x - width / 2 + 0.5), math.floor(position.y - height / 2 + 0.5), width, height, is_resource)
+
+    # Footprint of a building placed at position
+    def building_footprint(self, building, position):
+        size = FOOTPRINT_SIZES.get(building, 2)
+        return (math.floor(position.x - size / 2 + 0.5), math.floor(position.y - size / 2 + 0.5), size, size, False)
+
+    def stamp(self, footprint, value):
+        x, y, width, height, is_resource = footprint
+        x0, y0 = max(x, 0), max(y, 0)
+        self.occupied[x0:x + width, y0:y + height] += value
+        if is_resource:
+            self.resources[x0:x + width, y0:y + height] += value
+
+    # Sync occupancy with the structures and resources currently known, and with creep (boolean grid, if given). Must be called once per step
+    def update(self, units, game_loop, creep=None):
+        changed = False
+        if creep is not None and not np.array_equal(creep, self.creep):
+            self.creep = creep
+            changed = True
+
+        seen = set()
+        for unit in units:
+            tag = unit.tag
+            seen.add(tag)
+
+            footprint = self.unit_footprint(unit)
+            old_footprint = self.footprints.get(tag)
+            if old_footprint == footprint:
+                continue
+
+            if old_footprint:
+                self.stamp(old_footprint, -1)
+            self.stamp(footprint, 1)
+            self.footprints[tag] = footprint
+            changed = True
+
+        # Free the cells of destroyed (or forgotten) structures and mined out resources
+        for tag in [tag for tag in self.footprints if tag not in seen]:
+            self.stamp(self.footprints.pop(tag), -1)
+            changed = True
+
+        # Reservations expire if no building shows up in time
+        for footprint, expires in list(self.reservations.items()):
+            if expires <= game_loop:
+                self.stamp(footprint, -1)
+                del self.reservations[footprint]
+                changed = True
+
+        if changed:
+            self.version += 1
+            self.fits_cache = {}
+
+    # Mark a spot as taken until expires (game loop), so other buildings won't be planned on top of it before construction starts
+    def reserve(self, building, position, expires):
+        footprint = self.building_footprint(building, position)
+        if footprint not in self.reservations:
+            self.stamp(footprint, 1)
+            self.version += 1
+            self.fits_cache = {}
+        self.reservations[footprint] = expires
+
+    # Boolean grid of all lower-left corners where a size * size building fits
+    def fits(self, size, is_townhall=False):
+        key = (size, is_townhall)
+        if key not in self.fits_cache:
+            blocked = ~self.placeable | (self.occupied > 0) | self.creep
+            if is_townhall:
+                blocked |= dilate(self.resources > 0, TOWNHALL_RESOURCE_DISTANCE)
+            self.fits_cache[key] = window_sums(blocked, size, size) == 0
+        return self.fits_cache[key]
+
+    # Check if building can be placed with its center at position
+    def can_place(self, building, position, power_sources=()):
+        return len(self.find_placements(building, position, max_distance=0, power_sources=power_sources)) > 0
+
+    # Find all spots within max_distance of near where building fits, closest first (same search pattern as BotAI.find_placement()).
+    # Buildings that need power must have their center inside one of power_sources (e.g. self.state.psionic_matrix.sources).
+    def find_placements(self, building, near, max_distance=20, placement_step=2, random_alternative=False, power_sources=()):
+        size = FOOTPRINT_SIZES.get(building, 2)
+
+        # Building centers are on whole cells for even sizes, and in the middle of a cell for odd sizes
+        if size % 2 == 0:
+            base_x, base_y = round(near.x), round(near.y)
+        else:
+            base_x, base_y = math.floor(near.x) + 0.5, math.floor(near.y) + 0.5
+
+        # Candidate centers, placement_step apart
+        steps = int(max_distance // placement_step)
+        offsets = np.arange(-steps, steps + 1) * placement_step
+        centers_x, centers_y = np.meshgrid(base_x + offsets, base_y + offsets, indexing="ij")
+        centers_x = centers_x.ravel().astype(np.float64)
+        centers_y = centers_y.ravel().astype(np.float64)
+
+        fits = self.fits(size, building == NEXUS)
+        corners_x = np.round(centers_x - size / 2).astype(np.int64)
+        corners_y = np.round(centers_y - size / 2).astype(np.int64)
+        valid = (corners_x >= 0) & (corners_y >= 0) & (corners_x < fits.shape[0]) & (corners_y < fits.shape[1])
+        valid[valid] = fits[corners_x[valid], corners_y[valid]]
+
+        distances = np.hypot(centers_x - near.x, centers_y - near.y)
+        valid &= np.hypot(centers_x - base_x, centers_y - base_y) <= max_distance
+
+        if building not in UNPOWERED_BUILDINGS:
+            powered = np.zeros(len(centers_x), dtype=bool)
+            for source in power_sources:
+                powered |= np.hypot(centers_x - source.position.x, centers_y - source.position.y) <= source.radius
+            valid &= powered
+
+        order = np.argsort(distances[valid], kind="stable")
+        positions = [sc2.position.Point2((float(x), float(y))) for x, y in zip(centers_x[valid][order], centers_y[valid][order])]
+
+        # Pick randomly among the closest spots, rather than always the closest one
+        if random_alternative and positions:
+            closest_distance = distances[valid][order][0]
+            closest_count = int(np.sum(distances[valid] < closest_distance + placement_step))
+            closest = positions[:closest_count]
+            self.random.shuffle(closest)
+            positions[:closest_count] = closest
+
+        return positions
@@ -0,0 +1,148 @@
+import os, time, json
+
+
+TIME_BUCKETS = [0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000] # Bucket upper bounds in milliseconds
+COUNT_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000] # Bucket upper bounds for counts (e.g. order queue length)
+
+
+# Path of the profile summary saved next to a replay (e.g. Example.SC2Replay -> Example.profile.json)
+def profile_path_for_replay(replay_path):
+    return os.path.splitext(replay_path)[0] + ".profile.json"
+
+
+# Fixed-size histogram. Values above the last bound go into an extra overflow bucket
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        bucket = 0
+        for bound in self.bounds:
+            if value <= bound:
+                break
+            bucket += 1
+
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    # Upper bound of the bucket the percentile falls in (or max for the overflow bucket)
+    def percentile(self, percent):
+        if not self.count:
+            return 0.0
+
+        threshold = self.count * percent / 100
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= threshold:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "bounds": self.bounds,
+            "counts": self.counts,
+        }
+
+
+# Records how long each awaited subsystem takes, split into local compute and time waiting on the game (client round trips).
+# When disabled, measure() just awaits the function and the client is never wrapped, so it can be left on in ladder games.
+class Profiler:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.client_time = 0.0 # Total time spent waiting on the client (seconds)
+        self.request_count = 0 # Total number of client requests
+        self.subsystems = {} # Name -> (total, local, client) histograms in milliseconds
+        self.steps = {"total": Histogram(TIME_BUCKETS), "local": Histogram(TIME_BUCKETS), "client": Histogram(TIME_BUCKETS)}
+        self.values = {} # Name -> count histogram (see record())
+        self.step_start = None
+        self.step_client_time = 0.0
+
+    # Wrap the client's request method so we know how much time is spent waiting on the game
+    def attach(self, client):
+        if not self.enabled:
+            return
+
+        execute = client._execute
+        async def timed_execute(**kwargs):
+            start = time.perf_counter()
+            try:
+                return await execute(**kwargs)
+            finally:
+                self.client_time += time.perf_counter() - start
+                self.request_count += 1
+        client._execute = timed_execute
+
+    def begin_step(self):
+        if not self.enabled:
+            return
+        self.step_start = time.perf_counter()
+        self.step_client_time = self.client_time
+
+    def end_step(self):
+        if not self.enabled or self.step_start is None:
+            return
+        total = (time.perf_counter() - self.step_start) * 1000
+        client = (self.client_time - self.step_client_time) * 1000
+        self.steps["total"].add(total)
+        self.steps["local"].add(total - client)
+        self.steps["client"].add(client)
+
+    # Await function(*args) and record its duration under name
+    async def measure(self, name, function, *args):
+        if not self.enabled:
+            return await function(*args)
+
+        start = time.perf_counter()
+        client_start = self.client_time
+        try:
+            return await function(*args)
+        finally:
+            total = (time.perf_counter() - start) * 1000
+            client = (self.client_time - client_start) * 1000
+
+            if name not in self.subsystems:
+                self.subsystems[name] = (Histogram(TIME_BUCKETS), Histogram(TIME_BUCKETS), Histogram(TIME_BUCKETS))
+            histograms = self.subsystems[name]
+            histograms[0].add(total)
+            histograms[1].add(total - client)
+            histograms[2].add(client)
+
+    # Record a count (e.g. order queue length) in a histogram
+    def record(self, name, value):
+        if not self.enabled:
+            return
+        if name not in self.values:
+            self.values[name] = Histogram(COUNT_BUCKETS)
+        self.values[name].add(value)
+
+    def summary(self):
+        return {
+            "steps": {key: histogram.to_dict() for key, histogram in self.steps.items()},
+            "subsystems": {name: {"total": total.to_dict(), "local": local.to_dict(), "client": client.to_dict()} for name, (total, local, client) in self.subsystems.items()},
+            "values": {name: histogram.to_dict() for name, histogram in self.values.items()},
+            "client_requests": self.request_count,
+            "client_time": self.client_time,
+        }
+
+    # Write summary (plus any extra info) as JSON
+    def save(self, path, extra=None):
+        summary = self.summary()
+        if extra:
+            summary.update(extra)
+
+        with open(path, "w") as file:
+            json.dump(summary, file, indent=2)
@@ -0,0 +1,190 @@
+import mmap, zlib, struct, time
+
+import numpy as np
+
+from s2clientprotocol import sc2api_pb2 as sc_pb
+
+
+# Frame kinds
+KIND_GAME_INFO = 1 # Response with game_info
+KIND_GAME_DATA = 2 # Response with data
+KIND_OBSERVATION = 3 # Response with observation
+KIND_ACTION = 4 # Request with action (what we sent)
+KIND_QUERY_REQUEST = 5 # Request with query
+KIND_QUERY_RESPONSE = 6 # Response with query
+
+MAGIC = b"SC2REC01"
+FRAME_HEADER = struct.Struct("<IIB") # Compressed payload length, step, kind
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("step", "<u4"), ("kind", "u1"), ("padding", "V3")]) # One entry per frame in the .idx file
+
+REQUEST_KINDS = {"action": KIND_ACTION, "query": KIND_QUERY_REQUEST}
+RESPONSE_KINDS = {"game_info": KIND_GAME_INFO, "data": KIND_GAME_DATA, "observation": KIND_OBSERVATION, "query": KIND_QUERY_RESPONSE}
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+# Records a game into an append-only log: each step's observation, the actions we sent and the queries we made (with responses),
+# as zlib compressed protobuf frames. An index file next to it holds the offset of every frame, so RecordingReader can
+# jump to any step through mmap without reading the whole log.
+class ObservationRecorder:
+    def __init__(self, path, compression_level=1):
+        self.path = path
+        self.compression_level = compression_level
+        self.file = open(path, "wb", buffering=1 << 20)
+        self.index = open(index_path(path), "wb", buffering=1 << 16)
+        self.file.write(MAGIC)
+        self.offset = len(MAGIC)
+        self.step = 0 # Step of the latest observation
+        self.observation_count = 0
+        self.frame_count = 0
+        self.write_time = 0.0 # Total time spent recording (seconds)
+
+    # Wrap the client's request method, so everything we send and receive gets recorded.
+    # With a real connection, the bytes that went over the websocket are recorded as they are (serializing big observations again would be slow)
+    def attach(self, client):
+        connection = None
+        if hasattr(client._ws, "receive_bytes"):
+            connection = RecordedConnection(client._ws)
+            client._ws = connection
+
+        execute = client._execute
+        async def recorded_execute(**kwargs):
+            response = await execute(**kwargs)
+            if not self.file.closed:
+                request_type = next(iter(kwargs))
+                if request_type == "observation":
+                    self.step = self.observation_count
+                    self.observation_count += 1
+                if request_type in REQUEST_KINDS:
+                    self.write(REQUEST_KINDS[request_type], connection.request_bytes if connection else sc_pb.Request(**kwargs).SerializeToString())
+                if request_type in RESPONSE_KINDS:
+                    self.write(RESPONSE_KINDS[request_type], connection.response_bytes if connection else response.SerializeToString())
+            return response
+        client._execute = recorded_execute
+
+    # Write a frame (serialized Request or Response)
+    def write(self, kind, data):
+        start = time.perf_counter()
+
+        payload = zlib.compress(data, self.compression_level)
+        self.file.write(FRAME_HEADER.pack(len(payload), self.step, kind))
+        self.file.write(payload)
+
+        entry = np.zeros(1, dtype=INDEX_DTYPE)
+        entry["offset"], entry["step"], entry["kind"] = self.offset, self.step, kind
+        self.index.write(entry.tobytes())
+
+        self.offset += FRAME_HEADER.size + len(payload)
+        self.frame_count += 1
+        self.write_time += time.perf_counter() - start
+
+    # Record game info and data that were fetched before recording started (sc2.GameInfo and sc2.GameData objects)
+    def write_game_info(self, game_info, game_data):
+        self.write(KIND_GAME_INFO, sc_pb.Response(game_info=game_info._proto).SerializeToString())
+        self.write(KIND_GAME_DATA, sc_pb.Response(data=sc_pb.ResponseData(
+            abilities=[ability._proto for ability in game_data.abilities.values()],
+            units=[unit._proto for unit in game_data.units.values()],
+            upgrades=[upgrade._proto for upgrade in game_data.upgrades.values()])).SerializeToString())
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+            self.index.close()
+
+
+# Websocket wrapper that keeps the last request and response bytes
+class RecordedConnection:
+    def __init__(self, ws):
+        self.ws = ws
+        self.request_bytes = None
+        self.response_bytes = None
+
+    async def send_bytes(self, data):
+        self.request_bytes = data
+        return await self.ws.send_bytes(data)
+
+    async def receive_bytes(self):
+        self.response_bytes = await self.ws.receive_bytes()
+        return self.response_bytes
+
+    def __getattr__(self, name):
+        return getattr(self.ws, name)
+
+
+# Sequence of the recorded observations (ResponseObservation), parsed on access
+class RecordedObservations:
+    def __init__(self, reader):
+        self.reader = reader
+        self.frames = np.flatnonzero(reader.entries["kind"] == KIND_OBSERVATION)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, step):
+        return self.reader.response(self.frames[step]).observation
+
+
+# Reads a log written by ObservationRecorder through mmap
+class RecordingReader:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        assert self.data[:len(MAGIC)] == MAGIC, f"{path} is not a recording"
+
+        # Ignore index entries past the end of the log (e.g. if the game crashed while recording)
+        with open(index_path(path), "rb") as file:
+            index = file.read()
+        entries = np.frombuffer(index[:len(index) - len(index) % INDEX_DTYPE.itemsize], dtype=INDEX_DTYPE)
+        self.entries = entries[entries["offset"] < len(self.data)]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def close(self):
+        self.data.close()
+
+    # Decompressed payload of frame number i
+    def payload(self, i):
+        offset = int(self.entries["offset"][i])
+        length, step, kind = FRAME_HEADER.unpack_from(self.data, offset)
+        start = offset + FRAME_HEADER.size
+        return zlib.decompress(self.data[start:start + length])
+
+    def response(self, i):
+        response = sc_pb.Response()
+        response.ParseFromString(self.payload(i))
+        return response
+
+    def request(self, i):
+        request = sc_pb.Request()
+        request.ParseFromString(self.payload(i))
+        return request
+
+    # Frame numbers of a kind (optionally only for one step)
+    def frames(self, kind, step=None):
+        matches = self.entries["kind"] == kind
+        if step is not None:
+            matches &= self.entries["step"] == step
+        return np.flatnonzero(matches)
+
+    def game_info(self):
+        return self.response(self.frames(KIND_GAME_INFO)[0]).game_info
+
+    def game_data(self):
+        return self.response(self.frames(KIND_GAME_DATA)[0]).data
+
+    def observations(self):
+        return RecordedObservations(self)
+
+    # Actions (ActionRaw) we sent during step
+    def actions(self, step):
+        return [action.action_raw for i in self.frames(KIND_ACTION, step) for action in self.request(i).action.actions if action.HasField("action_raw")]
+
+    # All recorded queries as (RequestQuery, ResponseQuery) pairs. Each query request is directly followed by its response
+    def queries(self):
+        requests = self.frames(KIND_QUERY_REQUEST)
+        responses = set(self.frames(KIND_QUERY_RESPONSE))
+        return [(self.request(i).query, self.response(i + 1).query) for i in requests if i + 1 in responses]
@@ -0,0 +1,193 @@
+import numpy as np
+
+from sc2.constants import HARVEST_GATHER, HARVEST_RETURN
+
+from assignment import assign_workers, SECOND_WORKER_COST, CLOSE_PATCH_WEIGHT
+
+
+BASE_RESOURCE_DISTANCE = 10 # Minerals and geysers this close to a town hall belong to its base
+WORKERS_PER_MINERAL_FIELD = 2
+WORKERS_PER_GAS = 3
+MINERAL_SLOT_COST = 1000 # Extra cost of a mineral spot when transferring workers, so assimilators are filled first
+
+
+def position_key(unit):
+    return (round(unit.position.x, 1), round(unit.position.y, 1))
+
+
+# Minerals and geysers of one of our bases, found once when the town hall appears
+class Base:
+    def __init__(self, townhall_tag, position, mineral_tags, geysers):
+        self.townhall_tag = townhall_tag
+        self.position = position
+        self.mineral_tags = mineral_tags # Closest to the town hall first
+        self.geysers = geysers # Vespene geyser tag -> position (rounded)
+        self.assimilators = {} # Our assimilators on this base's geysers (ready or not): tag -> position (rounded)
+
+
+# Tracks which resource each worker mines, per base, so saturation and transfers don't need distance scans.
+# Bases (town hall -> minerals and geysers) are set up when a town hall appears, and assignments are read from
+# workers' gather orders each step, so the cost is a dict lookup per worker.
+class ResourceManager:
+    def __init__(self):
+        self.bases = {} # Town hall tag -> Base
+        self.resource_bases = {} # Mineral field or assimilator tag -> Base
+        self.assignments = {} # Worker tag -> resource tag
+        self.resource_workers = {} # Resource tag -> set of worker tags
+        self.gas_ideal = {} # Assimilator tag -> ideal workers (0 when not ready or depleted)
+        self.mineral_count = 0
+        self.resource_units = {} # Tag -> this step's mineral field, vespene geyser or assimilator
+        self.worker_units = {} # Tag -> this step's worker
+
+    def assign(self, worker_tag, resource_tag):
+        old_resource_tag = self.assignments.get(worker_tag)
+        if old_resource_tag == resource_tag:
+            return
+        if old_resource_tag is not None:
+            self.resource_workers[old_resource_tag].discard(worker_tag)
+        if resource_tag is None:
+            self.assignments.pop(worker_tag, None)
+        else:
+            self.assignments[worker_tag] = resource_tag
+            self.resource_workers.setdefault(resource_tag, set()).add(worker_tag)
+
+    def unassign(self, worker_tag):
+        self.assign(worker_tag, None)
+
+    def add_base(self, townhall, minerals, geysers):
+        position = townhall.position
+        def close(units):
+            if not units:
+                return []
+            positions = np.array([(unit.position.x, unit.position.y) for unit in units])
+            distances = np.hypot(positions[:, 0] - position.x, positions[:, 1] - position.y)
+            return [units[i] for i in np.argsort(distances) if distances[i] < BASE_RESOURCE_DISTANCE]
+
+        base = Base(townhall.tag, position, [mineral.tag for mineral in close(minerals)], {geyser.tag: position_key(geyser) for geyser in close(geysers)})
+        self.bases[townhall.tag] = base
+        for tag in base.mineral_tags:
+            self.resource_bases[tag] = base
+
+    def remove_resource(self, tag):
+        self.resource_bases.pop(tag, None)
+        self.gas_ideal.pop(tag, None)
+        for worker_tag in self.resource_workers.pop(tag, ()):
+            del self.assignments[worker_tag]
+
+    # Sync with this step's town halls, mineral fields, vespene geysers, our assimilators and our workers. Must be called once per step
+    def update(self, townhalls, minerals, geysers, assimilators, workers):
+        self.resource_units = {unit.tag: unit for units in [minerals, geysers, assimilators] for unit in units}
+        self.worker_units = {worker.tag: worker for worker in workers}
+
+        # Bases that were taken or lost
+        townhall_tags = set()
+        for townhall in townhalls:
+            townhall_tags.add(townhall.tag)
+            if townhall.tag not in self.bases:
+                self.add_base(townhall, minerals, geysers)
+        for tag in [tag for tag in self.bases if tag not in townhall_tags]:
+            base = self.bases.pop(tag)
+            for resource_tag in base.mineral_tags + list(base.assimilators):
+                self.remove_resource(resource_tag)
+
+        # Mined out mineral fields
+        if len(minerals) != self.mineral_count:
+            self.mineral_count = len(minerals)
+            mineral_tags = minerals.tags
+            for base in self.bases.values():
+                gone = [tag for tag in base.mineral_tags if tag not in mineral_tags]
+                for tag in gone:
+                    self.remove_resource(tag)
+                if gone:
+                    base.mineral_tags = [tag for tag in base.mineral_tags if tag in mineral_tags]
+
+        # Assimilators (on a geyser of one of our bases)
+        assimilator_tags = set()
+        for assimilator in assimilators:
+            tag = assimilator.tag
+            assimilator_tags.add(tag)
+            if tag not in self.resource_bases:
+                position = position_key(assimilator)
+                base = next((base for base in self.bases.values() if position in base.geysers.values()), None)
+                if base is None:
+                    continue
+                self.resource_bases[tag] = base
+                base.assimilators[tag] = position
+            self.gas_ideal[tag] = WORKERS_PER_GAS if assimilator.is_ready and assimilator.vespene_contents > 0 else 0
+        for tag in [tag for tag in self.gas_ideal if tag not in assimilator_tags]:
+            self.resource_bases[tag].assimilators.pop(tag)
+            self.remove_resource(tag)
+
+        # Worker assignments, from their orders. Returning workers keep their assignment, others (idle, building...) are unassigned
+        for tag, worker in self.worker_units.items():
+            orders = worker.orders
+            ability = orders[0].ability.id if orders else None
+            if ability == HARVEST_GATHER and orders[0].target in self.resource_bases:
+                self.assign(tag, orders[0].target)
+            elif ability != HARVEST_RETURN or tag not in self.assignments:
+                self.unassign(tag)
+        for tag in [tag for tag in self.assignments if tag not in self.worker_units]:
+            self.unassign(tag)
+
+    def workers_on(self, resource_tag):
+        return len(self.resource_workers.get(resource_tag, ()))
+
+    # Workers mining minerals at the base, and how many it needs
+    def mineral_saturation(self, townhall_tag):
+        base = self.bases[townhall_tag]
+        return sum(self.workers_on(tag) for tag in base.mineral_tags), WORKERS_PER_MINERAL_FIELD * len(base.mineral_tags)
+
+    # Mineral field of the base with the fewest workers (closest to the town hall on ties), or None if the base is mined out or not ready
+    def mineral_for(self, townhall_tag):
+        base = self.bases.get(townhall_tag)
+        if not base or not base.mineral_tags:
+            return None
+        return self.resource_units[min(base.mineral_tags, key=self.workers_on)]
+
+    # Vespene geysers of the base without an assimilator
+    def free_geysers(self, townhall_tag):
+        base = self.bases.get(townhall_tag)
+        if not base:
+            return []
+        taken = set(base.assimilators.values())
+        return [self.resource_units[tag] for tag, position in base.geysers.items() if position not in taken and tag in self.resource_units]
+
+    # Workers to move so every assimilator and then every base's minerals are saturated, as (worker, resource, town hall tag) tuples.
+    # Surplus workers are taken from oversaturated assimilators and bases in one pass over the bases, and matched to the open
+    # spots with the least total distance (see assignment.py)
+    def transfers(self):
+        surplus = []
+        slot_tags = [] # Resource tag of each open spot (one per missing worker)
+        slot_costs = []
+        for tag, ideal in self.gas_ideal.items():
+            workers = self.resource_workers.get(tag, set())
+            if len(workers) > ideal:
+                surplus.extend(sorted(workers)[ideal:])
+            for i in range(len(workers), ideal):
+                slot_tags.append(tag)
+                slot_costs.append(0)
+        for townhall_tag, base in self.bases.items():
+            actual, ideal = self.mineral_saturation(townhall_tag)
+            if actual > ideal:
+                # Take workers from the fields with the most workers
+                for tag in sorted(base.mineral_tags, key=self.workers_on, reverse=True):
+                    workers = self.resource_workers.get(tag, set())
+                    excess = min(len(workers) - WORKERS_PER_MINERAL_FIELD, actual - ideal)
+                    if excess > 0:
+                        surplus.extend(sorted(workers)[:excess])
+                        actual -= excess
+                continue
+
+            for tag in base.mineral_tags:
+                position = self.resource_units[tag].position
+                for i in range(self.workers_on(tag), WORKERS_PER_MINERAL_FIELD):
+                    slot_tags.append(tag)
+                    slot_costs.append(MINERAL_SLOT_COST + i * SECOND_WORKER_COST + CLOSE_PATCH_WEIGHT * position.distance_to(base.position))
+
+        if not surplus or not slot_tags:
+            return []
+
+        workers = [self.worker_units[tag] for tag in surplus]
+        slots = assign_workers([(worker.position.x, worker.position.y) for worker in workers],
+                               [(self.resource_units[tag].position.x, self.resource_units[tag].position.y) for tag in slot_tags], slot_costs)
+        return [(worker, self.resource_units[slot_tags[slot]], self.resource_bases[slot_tags[slot]].townhall_tag) for worker, slot in zip(workers, slots) if slot >= 0]
@@ -6,22 +6,29 @@ import random
 
 # Load bot
 from cannon_lover_bot import CannonLoverBot
+from profiler import profile_path_for_replay
+from map_pool import MAP_POOL
 bot = Bot(Race.Protoss, CannonLoverBot())
+replay_path = "Example.SC2Replay"
 
 # Start game
 if __name__ == '__main__':
     if "--LadderServer" in sys.argv:
         # Ladder game started by LadderManager
         print("Starting ladder game...")
+        bot.ai.profile_path = "LadderGame.profile.json"
         run_ladder_game(bot)
     else:
         # Local game
         print("Starting local game...")
-        map_name = random.choice(["(2)16-BitLE", "(2)AcidPlantLE", "(2)CatalystLE", "(2)DreamcatcherLE", "(2)LostandFoundLE", "(2)RedshiftLE", "(4)DarknessSanctuaryLE"])
+        map_name = random.choice(MAP_POOL)
         #map_name = random.choice(["ProximaStationLE", "NewkirkPrecinctTE", "OdysseyLE", "MechDepotLE", "AscensiontoAiurLE", "BelShirVestigeLE"])
         #map_name = "(2)16-BitLE"
+        bot.ai.profile_path = profile_path_for_replay(replay_path)
+        if "--record" in sys.argv:
+            bot.ai.recording_path = replay_path + ".sc2rec"
         sc2.run_game(sc2.maps.get(map_name), [
             #Human(Race.Terran),
             bot,
             Computer(Race.Random, Difficulty.VeryHard) # CheatInsane VeryHard
-        ], realtime=False, save_replay_as="Example.SC2Replay")
+        ], realtime=False, save_replay_as=replay_path)
@@ -0,0 +1,88 @@
+import time
+
+
+# Task priorities
+PRIORITY_LOW = 0 # Deferred when the last step went over budget, or when the task doesn't fit in what's left of this step's budget
+PRIORITY_NORMAL = 1 # Deferred only when this step has already used up its budget
+PRIORITY_HIGH = 2 # Always runs when due (micro and defense)
+
+
+class Task:
+    def __init__(self, name, cadence=1, priority=PRIORITY_NORMAL, budget=0.0):
+        self.name = name
+        self.cadence = cadence # Run every cadence steps
+        self.priority = priority
+        self.budget = budget # Expected wall-clock time (seconds) the task needs
+        self.last_run = None # Iteration the task last ran
+        self.run_count = 0
+        self.defer_count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+
+# Runs on_step subsystems at their own cadence, and defers low priority ones when a step runs out of wall-clock time.
+# Call begin_step() at the start of on_step(), run each subsystem through run(), and call end_step() at the end.
+class Scheduler:
+    def __init__(self, step_budget):
+        self.step_budget = step_budget # Wall-clock time (seconds) one step is allowed to take
+        self.tasks = {}
+        self.iteration = 0
+        self.step_start = None
+        self.last_step_time = 0.0
+        self.overrun_count = 0 # Number of steps that went over budget
+        self.step_count = 0
+
+    def add_task(self, name, cadence=1, priority=PRIORITY_NORMAL, budget=0.0):
+        self.tasks[name] = Task(name, cadence, priority, budget)
+
+    def begin_step(self, iteration):
+        self.iteration = iteration
+        self.step_start = time.perf_counter()
+
+    def end_step(self):
+        self.last_step_time = time.perf_counter() - self.step_start
+        self.step_count += 1
+        if self.last_step_time > self.step_budget:
+            self.overrun_count += 1
+
+    # Time (seconds) used so far in this step
+    def elapsed(self):
+        return time.perf_counter() - self.step_start
+
+    # Check if task is due and there's time for it this step. Tasks that are skipped for time stay due, so they run as soon as there's time again
+    def should_run(self, name):
+        task = self.tasks[name]
+
+        if task.last_run is not None and self.iteration - task.last_run < task.cadence:
+            return False
+
+        if task.priority == PRIORITY_HIGH:
+            return True
+
+        elapsed = self.elapsed()
+        if task.priority == PRIORITY_NORMAL:
+            over_budget = elapsed > self.step_budget
+        else:
+            over_budget = self.last_step_time > self.step_budget or elapsed + task.budget > self.step_budget
+
+        if over_budget:
+            task.defer_count += 1
+            return False
+
+        return True
+
+    # Run a subsystem (coroutine function) if it should run this step. Returns whether it ran
+    async def run(self, name, function, *args):
+        if not self.should_run(name):
+            return False
+
+        task = self.tasks[name]
+        start = time.perf_counter()
+        await function(*args)
+        duration = time.perf_counter() - start
+
+        task.last_run = self.iteration
+        task.run_count += 1
+        task.total_time += duration
+        task.max_time = max(task.max_time, duration)
+        return True
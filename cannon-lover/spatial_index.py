@@ -0,0 +1,114 @@
+import math
+
+import sc2
+
+
+# Uniform grid over a set of units, built once per step. Radius and nearest queries only look
+# at the grid cells that can contain a match, instead of scanning every unit like sc2.units.Units does.
+class SpatialIndex:
+    def __init__(self, units, game_data, cell_size=8):
+        self.game_data = game_data
+        self.cell_size = cell_size
+        self.cells = {}
+        self.amount = 0
+
+        # Cell bounds, so nearest queries know when to stop searching
+        self.min_cell_x = self.min_cell_y = math.inf
+        self.max_cell_x = self.max_cell_y = -math.inf
+
+        for unit in units:
+            # Cache position and type, as both are rebuilt from the protobuf on every access
+            position = unit.position
+            cell_x = int(position.x // cell_size)
+            cell_y = int(position.y // cell_size)
+
+            key = (cell_x, cell_y)
+            if key not in self.cells:
+                self.cells[key] = []
+            self.cells[key].append((position.x, position.y, unit.type_id, unit))
+            self.amount += 1
+
+            self.min_cell_x = min(self.min_cell_x, cell_x)
+            self.min_cell_y = min(self.min_cell_y, cell_y)
+            self.max_cell_x = max(self.max_cell_x, cell_x)
+            self.max_cell_y = max(self.max_cell_y, cell_y)
+
+    @property
+    def exists(self):
+        return self.amount > 0
+
+    # Yield (distance squared, unit) for all matching units within distance of position
+    def _within(self, distance, position, types=None, predicate=None):
+        if isinstance(position, sc2.unit.Unit):
+            position = position.position
+        if types is not None and not isinstance(types, (set, frozenset)):
+            types = {types}
+
+        x, y = position.x, position.y
+        distance_squared = distance * distance
+        cell_size = self.cell_size
+
+        for cell_x in range(int((x - distance) // cell_size), int((x + distance) // cell_size) + 1):
+            for cell_y in range(int((y - distance) // cell_size), int((y + distance) // cell_size) + 1):
+                for unit_x, unit_y, type_id, unit in self.cells.get((cell_x, cell_y), ()):
+                    if types is not None and type_id not in types:
+                        continue
+
+                    d = (unit_x - x) ** 2 + (unit_y - y) ** 2
+                    if d < distance_squared and (predicate is None or predicate(unit)):
+                        yield d, unit
+
+    # Same as Units.closer_than(), but optionally filtered by unit type(s) and a predicate
+    def closer_than(self, distance, position, types=None, predicate=None):
+        return sc2.units.Units([unit for d, unit in self._within(distance, position, types, predicate)], self.game_data)
+
+    # Check if any matching unit is within distance (stops at the first match)
+    def any_closer_than(self, distance, position, types=None, predicate=None):
+        for match in self._within(distance, position, types, predicate):
+            return True
+        return False
+
+    # Same as Units.closest_to(), but returns None instead of failing when nothing matches (within max_distance)
+    def closest_to(self, position, types=None, predicate=None, max_distance=math.inf):
+        if not self.cells:
+            return None
+        if isinstance(position, sc2.unit.Unit):
+            position = position.position
+        if types is not None and not isinstance(types, (set, frozenset)):
+            types = {types}
+
+        x, y = position.x, position.y
+        cell_size = self.cell_size
+        center_x = int(x // cell_size)
+        center_y = int(y // cell_size)
+
+        # Never search further out than the outermost occupied cell
+        max_ring = max(
+            center_x - self.min_cell_x, self.max_cell_x - center_x,
+            center_y - self.min_cell_y, self.max_cell_y - center_y, 0)
+        if max_distance < math.inf:
+            max_ring = min(max_ring, int(max_distance // cell_size) + 1)
+
+        closest = None
+        closest_distance_squared = max_distance * max_distance
+
+        # Search rings of cells around the position, closest ring first
+        for ring in range(0, max_ring + 1):
+            for cell_x in range(center_x - ring, center_x + ring + 1):
+                # Only the edges of the ring, the inside has already been searched
+                step = 1 if cell_x in (center_x - ring, center_x + ring) else 2 * ring
+                for cell_y in range(center_y - ring, center_y + ring + 1, max(step, 1)):
+                    for unit_x, unit_y, type_id, unit in self.cells.get((cell_x, cell_y), ()):
+                        if types is not None and type_id not in types:
+                            continue
+
+                        d = (unit_x - x) ** 2 + (unit_y - y) ** 2
+                        if d < closest_distance_squared and (predicate is None or predicate(unit)):
+                            closest_distance_squared = d
+                            closest = unit
+
+            # Units in later rings are at least this far away, so we can't do better
+            if closest is not None and closest_distance_squared <= (ring * cell_size) ** 2:
+                break
+
+        return closest
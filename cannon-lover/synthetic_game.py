@@ -0,0 +1,288 @@
+import math, random
+
+import numpy as np
+
+import sc2
+from sc2.constants import *
+from sc2.data import Race, Difficulty, Attribute, Alliance, DisplayType
+
+from s2clientprotocol import (
+    sc2api_pb2 as sc_pb,
+    common_pb2 as common_pb,
+    raw_pb2 as raw_pb,
+)
+
+from offline_client import OfflineClient
+
+
+LIGHT, ARMORED, BIOLOGICAL, MECHANICAL, PSIONIC, MASSIVE, STRUCTURE = (
+    Attribute.Light.value, Attribute.Armored.value, Attribute.Biological.value, Attribute.Mechanical.value,
+    Attribute.Psionic.value, Attribute.Massive.value, Attribute.Structure.value)
+
+# Unit types known to synthetic games (roughly the real game values):
+# type: (race, minerals, vespene, food, creation ability, attributes, radius, health, shield, armor, speed, weapons)
+# where weapons is a list of (target type, damage, attacks, range, cooldown, (bonus attribute, bonus damage) or None)
+UNIT_TYPES = {
+    PROBE: (Race.Protoss, 50, 0, 1, NEXUSTRAIN_PROBE, [LIGHT, MECHANICAL], 0.375, 20, 20, 0, 3.94, [(1, 5, 1, 0.1, 1.07, None)]),
+    ZEALOT: (Race.Protoss, 100, 0, 2, GATEWAYTRAIN_ZEALOT, [LIGHT, BIOLOGICAL], 0.5, 100, 50, 1, 3.15, [(1, 8, 2, 0.1, 0.86, None)]),
+    STALKER: (Race.Protoss, 125, 50, 2, GATEWAYTRAIN_STALKER, [ARMORED, MECHANICAL], 0.625, 80, 80, 1, 4.13, [(3, 13, 1, 6, 1.34, (ARMORED, 5))]),
+    SENTRY: (Race.Protoss, 50, 100, 2, GATEWAYTRAIN_SENTRY, [LIGHT, MECHANICAL, PSIONIC], 0.5, 40, 40, 1, 3.15, [(3, 6, 1, 5, 0.71, None)]),
+    IMMORTAL: (Race.Protoss, 275, 100, 4, ROBOTICSFACILITYTRAIN_IMMORTAL, [ARMORED, MECHANICAL], 0.75, 200, 100, 1, 3.15, [(1, 20, 1, 6, 1.04, (ARMORED, 30))]),
+    COLOSSUS: (Race.Protoss, 300, 200, 6, ROBOTICSFACILITYTRAIN_COLOSSUS, [ARMORED, MECHANICAL, MASSIVE], 1.0, 200, 150, 1, 3.15, [(1, 10, 2, 7, 1.07, (LIGHT, 5))]),
+    OBSERVER: (Race.Protoss, 25, 75, 1, ROBOTICSFACILITYTRAIN_OBSERVER, [LIGHT, MECHANICAL], 0.5, 40, 20, 0, 2.63, []),
+    NEXUS: (Race.Protoss, 400, 0, 0, PROTOSSBUILD_NEXUS, [ARMORED, STRUCTURE], 2.75, 1000, 1000, 1, 0, []),
+    PYLON: (Race.Protoss, 100, 0, 0, PROTOSSBUILD_PYLON, [ARMORED, STRUCTURE], 1.125, 200, 200, 1, 0, []),
+    GATEWAY: (Race.Protoss, 150, 0, 0, PROTOSSBUILD_GATEWAY, [ARMORED, STRUCTURE], 1.8125, 500, 500, 1, 0, []),
+    WARPGATE: (Race.Protoss, 150, 0, 0, MORPH_WARPGATE, [ARMORED, STRUCTURE], 1.8125, 500, 500, 1, 0, []),
+    FORGE: (Race.Protoss, 150, 0, 0, PROTOSSBUILD_FORGE, [ARMORED, STRUCTURE], 1.8125, 400, 400, 1, 0, []),
+    CYBERNETICSCORE: (Race.Protoss, 150, 0, 0, PROTOSSBUILD_CYBERNETICSCORE, [ARMORED, STRUCTURE], 1.8125, 550, 550, 1, 0, []),
+    TWILIGHTCOUNCIL: (Race.Protoss, 150, 100, 0, PROTOSSBUILD_TWILIGHTCOUNCIL, [ARMORED, STRUCTURE], 1.8125, 500, 500, 1, 0, []),
+    ROBOTICSFACILITY: (Race.Protoss, 150, 100, 0, PROTOSSBUILD_ROBOTICSFACILITY, [ARMORED, STRUCTURE], 1.8125, 450, 450, 1, 0, []),
+    ROBOTICSBAY: (Race.Protoss, 150, 150, 0, PROTOSSBUILD_ROBOTICSBAY, [ARMORED, STRUCTURE], 1.8125, 500, 500, 1, 0, []),
+    PHOTONCANNON: (Race.Protoss, 150, 0, 0, PROTOSSBUILD_PHOTONCANNON, [ARMORED, STRUCTURE], 1.125, 150, 150, 1, 0, [(3, 20, 1, 7, 0.89, None)]),
+    ASSIMILATOR: (Race.Protoss, 75, 0, 0, PROTOSSBUILD_ASSIMILATOR, [ARMORED, STRUCTURE], 2.125, 450, 450, 1, 0, []),
+    SCV: (Race.Terran, 50, 0, 1, COMMANDCENTERTRAIN_SCV, [LIGHT, BIOLOGICAL, MECHANICAL], 0.375, 45, 0, 0, 3.94, [(1, 5, 1, 0.1, 1.07, None)]),
+    MARINE: (Race.Terran, 50, 0, 1, BARRACKSTRAIN_MARINE, [LIGHT, BIOLOGICAL], 0.375, 45, 0, 0, 3.15, [(3, 6, 1, 5, 0.61, None)]),
+    MARAUDER: (Race.Terran, 100, 25, 2, BARRACKSTRAIN_MARAUDER, [ARMORED, BIOLOGICAL], 0.5625, 125, 0, 1, 3.15, [(1, 10, 1, 6, 1.07, (ARMORED, 10))]),
+    COMMANDCENTER: (Race.Terran, 400, 0, 0, TERRANBUILD_COMMANDCENTER, [ARMORED, MECHANICAL, STRUCTURE], 2.75, 1500, 0, 1, 0, []),
+    SUPPLYDEPOT: (Race.Terran, 100, 0, 0, TERRANBUILD_SUPPLYDEPOT, [ARMORED, MECHANICAL, STRUCTURE], 1.125, 400, 0, 1, 0, []),
+    BARRACKS: (Race.Terran, 150, 0, 0, TERRANBUILD_BARRACKS, [ARMORED, MECHANICAL, STRUCTURE], 1.8125, 1000, 0, 1, 0, []),
+    BUNKER: (Race.Terran, 100, 0, 0, TERRANBUILD_BUNKER, [ARMORED, MECHANICAL, STRUCTURE], 1.8125, 400, 0, 1, 0, []),
+    MINERALFIELD: (Race.NoRace, 0, 0, 0, None, [STRUCTURE], 1.125, 0, 0, 0, 0, []),
+    VESPENEGEYSER: (Race.NoRace, 0, 0, 0, None, [STRUCTURE], 2.125, 0, 0, 0, 0, []),
+}
+
+# Abilities besides the creation abilities above, that the bot uses or that show up in orders
+OTHER_ABILITIES = [
+    MOVE, ATTACK, STOP, HOLDPOSITION, PATROL, HARVEST_GATHER, HARVEST_RETURN, CANCEL, RALLY_BUILDING,
+    EFFECT_CHRONOBOOSTENERGYCOST, EFFECT_BLINK_STALKER, GUARDIANSHIELD_GUARDIANSHIELD,
+    RESEARCH_WARPGATE, RESEARCH_BLINK, RESEARCH_CHARGE, RESEARCH_EXTENDEDTHERMALLANCE,
+    WARPGATETRAIN_ZEALOT, WARPGATETRAIN_STALKER, WARPGATETRAIN_SENTRY,
+] + [getattr(sc2.constants, "FORGERESEARCH_PROTOSS%sLEVEL%d" % (name, level)) for name in ["GROUNDWEAPONS", "GROUNDARMOR", "SHIELDS"] for level in range(1, 4)]
+
+# Abilities each unit type has available, answered for ability queries
+TYPE_ABILITIES = {
+    NEXUS: [NEXUSTRAIN_PROBE, EFFECT_CHRONOBOOSTENERGYCOST],
+    GATEWAY: [GATEWAYTRAIN_ZEALOT, GATEWAYTRAIN_STALKER, GATEWAYTRAIN_SENTRY, MORPH_WARPGATE],
+    WARPGATE: [WARPGATETRAIN_ZEALOT, WARPGATETRAIN_STALKER, WARPGATETRAIN_SENTRY],
+    CYBERNETICSCORE: [RESEARCH_WARPGATE],
+    TWILIGHTCOUNCIL: [RESEARCH_BLINK, RESEARCH_CHARGE],
+    FORGE: [FORGERESEARCH_PROTOSSGROUNDWEAPONSLEVEL1, FORGERESEARCH_PROTOSSGROUNDARMORLEVEL1, FORGERESEARCH_PROTOSSSHIELDSLEVEL1],
+    ROBOTICSFACILITY: [ROBOTICSFACILITYTRAIN_IMMORTAL, ROBOTICSFACILITYTRAIN_OBSERVER],
+    STALKER: [EFFECT_BLINK_STALKER],
+    SENTRY: [GUARDIANSHIELD_GUARDIANSHIELD],
+}
+
+
+# Game data (ResponseData) for all of UNIT_TYPES and their abilities
+def synthetic_game_data():
+    data = sc_pb.ResponseData()
+
+    abilities = [ability for (race, minerals, vespene, food, ability, *rest) in UNIT_TYPES.values() if ability is not None] + OTHER_ABILITIES
+    for ability in abilities:
+        name = "".join(part.title() for part in ability.name.split("_"))
+        data.abilities.add(ability_id=ability.value, link_name=name, button_name=name, friendly_name=name, available=True)
+
+    for unit_type, (race, minerals, vespene, food, ability, attributes, radius, health, shield, armor, speed, weapons) in UNIT_TYPES.items():
+        unit_data = data.units.add(
+            unit_id=unit_type.value, name=unit_type.name.title(), available=True, race=race.value,
+            mineral_cost=minerals, vespene_cost=vespene, food_required=food, ability_id=ability.value if ability else 0,
+            has_minerals=unit_type == MINERALFIELD, has_vespene=unit_type == VESPENEGEYSER,
+            attributes=attributes, armor=armor, movement_speed=speed, sight_range=9)
+        for target, damage, attacks, weapon_range, cooldown, bonus in weapons:
+            weapon = unit_data.weapons.add(type=target, damage=damage, attacks=attacks, range=weapon_range, speed=cooldown)
+            if bonus:
+                weapon.damage_bonus.add(attribute=bonus[0], bonus=bonus[1])
+
+    return data
+
+
+# Image data for a grid indexed as [x, y], laid out the way sc2.pixel_map.PixelMap reads it
+def image_data(grid):
+    width, height = grid.shape
+    rows = grid.T[(-np.arange(height)) % height]
+    return common_pb.ImageData(bits_per_pixel=8, size=common_pb.Size2DI(x=width, y=height), data=rows.astype(np.uint8).tobytes())
+
+
+# Game info (ResponseGameInfo) for an open, flat map
+def synthetic_game_info(map_size, enemy_start_location, enemy_race=Race.Terran, difficulty=Difficulty.VeryHard, map_name="Synthetic"):
+    grid = np.ones((map_size, map_size), dtype=np.uint8)
+    return sc_pb.ResponseGameInfo(
+        map_name=map_name,
+        player_info=[
+            sc_pb.PlayerInfo(player_id=1, type=sc_pb.Participant, race_requested=Race.Protoss.value),
+            sc_pb.PlayerInfo(player_id=2, type=sc_pb.Computer, race_requested=enemy_race.value, difficulty=difficulty.value),
+        ],
+        start_raw=raw_pb.StartRaw(
+            map_size=common_pb.Size2DI(x=map_size, y=map_size),
+            pathing_grid=image_data(grid),
+            placement_grid=image_data(grid),
+            terrain_height=image_data(grid * 200),
+            playable_area=common_pb.RectangleI(p0=common_pb.PointI(x=0, y=0), p1=common_pb.PointI(x=map_size, y=map_size)),
+            start_locations=[common_pb.Point2D(x=enemy_start_location[0], y=enemy_start_location[1])],
+        ),
+    )
+
+
+class SyntheticUnit:
+    def __init__(self, tag, unit_type, alliance, x, y, build_progress=1.0, display_type=DisplayType.Visible):
+        race, minerals, vespene, food, ability, attributes, radius, health, shield, armor, speed, weapons = UNIT_TYPES[unit_type]
+        self.tag = tag
+        self.unit_type = unit_type
+        self.alliance = alliance
+        self.display_type = display_type
+        self.x, self.y = x, y
+        self.radius = radius
+        self.build_progress = build_progress
+        self.health = self.health_max = health
+        self.shield = self.shield_max = shield
+        self.energy = 50 if unit_type in [NEXUS, SENTRY] else 0
+        self.mineral_contents = 1800 if unit_type == MINERALFIELD else 0
+        self.vespene_contents = 2250 if unit_type == VESPENEGEYSER else 0
+        self.assigned_harvesters = 0
+        self.ideal_harvesters = 0
+        self.order = None # (ability, target tag or (x, y))
+
+    def add_to(self, units):
+        owner = {Alliance.Self.value: 1, Alliance.Enemy.value: 2}.get(self.alliance.value, 16)
+        unit = units.add(
+            display_type=self.display_type.value, alliance=self.alliance.value, tag=self.tag, unit_type=self.unit_type.value,
+            owner=owner, pos=common_pb.Point(x=self.x, y=self.y, z=12), facing=0, radius=self.radius, build_progress=self.build_progress,
+            health=self.health, health_max=self.health_max, shield=self.shield, shield_max=self.shield_max, energy=self.energy,
+            mineral_contents=self.mineral_contents, vespene_contents=self.vespene_contents,
+            assigned_harvesters=self.assigned_harvesters, ideal_harvesters=self.ideal_harvesters)
+        if self.order:
+            ability, target = self.order
+            if isinstance(target, tuple):
+                unit.orders.add(ability_id=ability.value, target_world_space_pos=common_pb.Point(x=target[0], y=target[1]))
+            else:
+                unit.orders.add(ability_id=ability.value, target_unit_tag=target)
+
+
+# Generate an OfflineClient for a game where our army (on two bases) meets an approaching enemy army halfway through.
+# The game lasts steps steps, game_step game loops apart. Everything is random but repeatable (seeded).
+# enemy_race, difficulty and map_name only change what the game info reports (the enemy always plays Terran units)
+def synthetic_game(steps=200, map_size=128, army_size=20, enemy_army_size=20, game_step=8, seed=0, enemy_race=Race.Terran, difficulty=Difficulty.VeryHard, map_name="Synthetic"):
+    rng = random.Random(seed)
+    center = (map_size / 2, map_size / 2)
+    next_tag = [0x100000000]
+
+    units = []
+    def add(unit_type, alliance, x, y, **kwargs):
+        unit = SyntheticUnit(next_tag[0], unit_type, alliance, x, y, **kwargs)
+        next_tag[0] += 1
+        units.append(unit)
+        return unit
+
+    # Mineral line (8 patches in an arc) and 2 geysers on the side of a base facing away from the map center
+    def add_resources(base):
+        angle = math.atan2(base[1] - center[1], base[0] - center[0])
+        minerals = []
+        for i in range(8):
+            a = angle + math.radians(-60 + i * 120 / 7)
+            minerals.append(add(MINERALFIELD, Alliance.Neutral, round(base[0] + 7 * math.cos(a)), math.floor(base[1] + 7 * math.sin(a)) + 0.5))
+        for side in [-1, 1]:
+            a = angle + side * math.radians(90)
+            add(VESPENEGEYSER, Alliance.Neutral, math.floor(base[0] + 7 * math.cos(a)) + 0.5, math.floor(base[1] + 7 * math.sin(a)) + 0.5)
+        return minerals
+
+    quarter, three_quarters = math.floor(map_size / 4) + 0.5, math.floor(map_size * 3 / 4) + 0.5
+    main, natural = (quarter, quarter), (quarter, center[1] + 2.5)
+    enemy_main, enemy_natural = (three_quarters, three_quarters), (three_quarters, center[1] - 2.5)
+    for base in [(center[0] + 0.5, quarter), (center[0] + 0.5, three_quarters), enemy_main, enemy_natural]:
+        add_resources(base)
+
+    # Our bases, with probes mining
+    probes = []
+    for base in [main, natural]:
+        nexus = add(NEXUS, Alliance.Self, *base)
+        nexus.assigned_harvesters = nexus.ideal_harvesters = 16
+        for mineral in add_resources(base):
+            for i in range(2):
+                probe = add(PROBE, Alliance.Self, (base[0] + mineral.x) / 2, (base[1] + mineral.y) / 2)
+                probe.order = (HARVEST_GATHER, mineral.tag)
+                probes.append((probe, base, mineral))
+
+    # Tech structures in the main, and some pylons and cannons
+    toward_center = lambda base, distance, side: (
+        math.floor(base[0] + distance * (center[0] - base[0]) / 60 + side) + 0.5,
+        math.floor(base[1] + distance * (center[1] - base[1]) / 60 - side) + 0.5)
+    for i, unit_type in enumerate([GATEWAY, GATEWAY, FORGE, CYBERNETICSCORE, TWILIGHTCOUNCIL]):
+        add(unit_type, Alliance.Self, *toward_center(main, 8 + 4 * i, 4))
+    pylons = [add(PYLON, Alliance.Self, x - 0.5, y - 0.5) for x, y in [toward_center(main, 10, -3), toward_center(main, 20, -3), toward_center(natural, 8, -2)]]
+    for i in range(3):
+        add(PHOTONCANNON, Alliance.Self, *toward_center(natural, 6 + 3 * i, 3 - 2 * i))
+
+    # Armies: ours waits in front of the natural, theirs walks over from their natural
+    army_position = toward_center(natural, 12, 0)
+    army = [add(rng.choice([STALKER, STALKER, STALKER, ZEALOT, ZEALOT, SENTRY]), Alliance.Self, army_position[0] + rng.uniform(-4, 4), army_position[1] + rng.uniform(-4, 4)) for i in range(army_size)]
+    enemy_army = [add(rng.choice([MARINE, MARINE, MARINE, MARAUDER]), Alliance.Enemy, enemy_natural[0] + rng.uniform(-4, 4), enemy_natural[1] + rng.uniform(-4, 4)) for i in range(enemy_army_size)]
+    for unit in enemy_army:
+        unit.order = (ATTACK, army_position)
+
+    # Enemy bases are only known as snapshots
+    for base in [enemy_main, enemy_natural]:
+        add(COMMANDCENTER, Alliance.Enemy, *base, display_type=DisplayType.Snapshot)
+
+    own_units = [unit for unit in units if unit.alliance == Alliance.Self]
+    food_used = sum(UNIT_TYPES[unit.unit_type][3] for unit in own_units)
+    xs, ys = np.meshgrid(np.arange(map_size) + 0.5, np.arange(map_size) + 0.5, indexing="ij")
+
+    observations = []
+    for step in range(steps):
+        # Probes move between nexus and mineral patch
+        for probe, base, mineral in probes:
+            t = (math.sin(step * 0.3 + probe.tag) + 1) / 2
+            probe.x = base[0] + (mineral.x - base[0]) * (0.3 + 0.6 * t)
+            probe.y = base[1] + (mineral.y - base[1]) * (0.3 + 0.6 * t)
+
+        # Enemy army walks towards ours, and both sides take damage once they meet
+        for unit in enemy_army:
+            dx, dy = army_position[0] - unit.x, army_position[1] - unit.y
+            distance = math.hypot(dx, dy)
+            if distance > 6:
+                speed = 0.5 + rng.uniform(0, 0.2)
+                unit.x += dx / distance * speed
+                unit.y += dy / distance * speed
+            else:
+                unit.health = max(1, unit.health - rng.randint(0, 2))
+
+        for unit in army:
+            unit.x += rng.uniform(-0.3, 0.3)
+            unit.y += rng.uniform(-0.3, 0.3)
+            if any(math.hypot(enemy.x - unit.x, enemy.y - unit.y) < 7 for enemy in enemy_army):
+                if unit.shield > 0:
+                    unit.shield = max(0, unit.shield - rng.randint(0, 3))
+                else:
+                    unit.health = max(1, unit.health - rng.randint(0, 2))
+
+        # Everything within sight of our units is visible, the rest is fogged
+        visible = np.zeros((map_size, map_size), dtype=bool)
+        for unit in own_units:
+            visible |= (xs - unit.x) ** 2 + (ys - unit.y) ** 2 < 11 ** 2
+        visibility = np.where(visible, 2, 1)
+
+        response = sc_pb.ResponseObservation()
+        observation = response.observation
+        observation.game_loop = step * game_step
+        observation.player_common.player_id = 1
+        observation.player_common.minerals = 600
+        observation.player_common.vespene = 300
+        observation.player_common.food_cap = 200
+        observation.player_common.food_used = food_used
+        observation.raw_data.map_state.visibility.CopyFrom(image_data(visibility))
+        observation.raw_data.map_state.creep.CopyFrom(image_data(np.zeros((map_size, map_size))))
+        for pylon in pylons:
+            observation.raw_data.player.power_sources.add(pos=common_pb.Point(x=pylon.x, y=pylon.y, z=12), radius=6.5, tag=pylon.tag)
+
+        for unit in units:
+            # Enemy units out of sight are not part of the observation
+            if unit.alliance == Alliance.Enemy and unit.display_type == DisplayType.Visible and not visible[min(int(unit.x), map_size - 1), min(int(unit.y), map_size - 1)]:
+                continue
+            unit.add_to(observation.raw_data.units)
+
+        observations.append(response)
+
+    return OfflineClient(
+        synthetic_game_info(map_size, enemy_main, enemy_race, difficulty, map_name), synthetic_game_data(), observations,
+        type_abilities={unit_type.value: [ability.value for ability in abilities] for unit_type, abilities in TYPE_ABILITIES.items()})
@@ -0,0 +1,55 @@
+import itertools
+
+import numpy as np
+
+from assignment import linear_assignment, assign_to_patches
+
+
+# Lowest total cost of any assignment, by trying them all
+def brute_force_cost(costs):
+    rows, columns = costs.shape
+    if rows <= columns:
+        return min(sum(costs[row, column] for row, column in enumerate(permutation)) for permutation in itertools.permutations(range(columns), rows))
+    return min(sum(costs[row, column] for column, row in enumerate(permutation)) for permutation in itertools.permutations(range(rows), columns))
+
+
+def check_assignment(costs, assignment):
+    rows, columns = costs.shape
+    assigned = assignment[assignment >= 0]
+    assert len(set(assigned.tolist())) == len(assigned) # Each column at most once
+    assert len(assigned) == min(rows, columns)
+    return costs[np.flatnonzero(assignment >= 0), assigned].sum()
+
+
+def test_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for i in range(200):
+        rows, columns = rng.integers(1, 7, 2)
+        costs = rng.uniform(0, 10, (rows, columns))
+        if i % 4 == 0:
+            costs = np.round(costs) # Ties
+        assignment = linear_assignment(costs)
+        assert np.isclose(check_assignment(costs, assignment), brute_force_cost(costs))
+
+
+def test_empty():
+    assert len(linear_assignment(np.zeros((0, 3)))) == 0
+    assert linear_assignment(np.zeros((2, 0))).tolist() == [-1, -1]
+
+
+def test_patches_take_two_workers_at_most():
+    rng = np.random.default_rng(1)
+    patches = rng.uniform(0, 10, (8, 2))
+    workers = rng.uniform(0, 10, (20, 2))
+    assigned = assign_to_patches(workers, patches, townhall_position=(5, 5))
+    assert np.count_nonzero(assigned == -1) == 4
+    assert np.bincount(assigned[assigned >= 0], minlength=8).tolist() == [2] * 8
+
+
+def test_every_patch_gets_one_worker_first():
+    # A mineral line: patches on an arc 6 from the town hall, less than SECOND_WORKER_COST apart
+    angles = np.linspace(0, 0.6, 8)
+    patches = np.stack([5 + 6 * np.cos(angles), 5 + 6 * np.sin(angles)], axis=1)
+    workers = np.repeat(patches[:1], 8, axis=0) # All workers next to the same patch
+    assigned = assign_to_patches(workers, patches, townhall_position=(5, 5))
+    assert sorted(assigned.tolist()) == list(range(8))
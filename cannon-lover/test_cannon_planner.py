@@ -0,0 +1,99 @@
+import math
+import types
+
+import numpy as np
+
+from sc2.position import Point2
+
+from cannon_planner import CannonPlanner, PYLON_POWER_RADIUS
+
+
+TARGET = Point2((55, 20))
+
+
+# A straight path along y = 20 towards TARGET, with the ground distance left at each cell
+def straight_path():
+    path = np.array([(x + 0.5, 20.5) for x in range(5, 55)])
+    return path, TARGET[0] - path[:, 0]
+
+
+def plan(placeable=None, sight_sources=()):
+    if placeable is None:
+        placeable = np.ones((64, 40), dtype=bool)
+    path, path_distances = straight_path()
+    planner = CannonPlanner()
+    planner.plan(placeable, path, path_distances, TARGET, 40, 10, 2, sight_sources)
+    return planner
+
+
+def footprint(position):
+    return {(int(position[0]) + dx, int(position[1]) + dy) for dx in (-1, 0) for dy in (-1, 0)}
+
+
+def test_spots_are_free_and_powered():
+    placeable = np.ones((64, 40), dtype=bool)
+    placeable[20:30, 15:25] = False # A blocked area on the path
+    planner = plan(placeable)
+    assert len(planner.steps) == 5
+
+    cells = []
+    for step in planner.steps:
+        assert len(step.cannons) == 2
+        for cannon in step.cannons:
+            assert math.hypot(cannon.x - step.pylon.x, cannon.y - step.pylon.y) <= PYLON_POWER_RADIUS
+        for position in [step.pylon] + step.cannons:
+            assert all(placeable[cell] for cell in footprint(position))
+            cells.extend(footprint(position))
+    assert len(cells) == len(set(cells)) # No overlapping buildings
+
+    # Pylons get closer to the target, and each one's cannons are closest to the target first
+    pylon_distances = [step.pylon.distance_to(TARGET) for step in planner.steps]
+    assert pylon_distances == sorted(pylon_distances, reverse=True)
+    for step in planner.steps:
+        assert step.cannons[0].distance_to(TARGET) <= step.cannons[1].distance_to(TARGET)
+
+
+def test_hidden_spots_are_preferred():
+    planner = plan()
+    first = planner.steps[0].pylon
+    sight_sources = [((first.x, first.y), 3)] # An enemy structure that sees the first pylon spot
+    hidden = plan(sight_sources=sight_sources)
+    assert hidden.steps[0].pylon.distance_to(first) > 3
+
+
+def test_cursor_follows_our_pylons():
+    planner = plan()
+    steps = planner.steps
+    planner.update([], [])
+    assert planner.next_pylon() == steps[0].pylon
+    assert planner.next_cannon() is None
+
+    planner.update([types.SimpleNamespace(tag=1, position=steps[0].pylon)], [])
+    assert planner.next_pylon() == steps[1].pylon
+    assert planner.location() == steps[1].pylon
+    assert planner.next_cannon() == (1, steps[0].cannons[0])
+
+    planner.update([types.SimpleNamespace(tag=1, position=steps[0].pylon)], [types.SimpleNamespace(tag=2, position=steps[0].cannons[0])])
+    assert planner.next_cannon() == (1, steps[0].cannons[1])
+
+    # A destroyed pylon is rebuilt first
+    planner.update([types.SimpleNamespace(tag=3, position=steps[1].pylon)], [])
+    assert planner.next_pylon() == steps[0].pylon
+
+
+def test_skip():
+    planner = plan()
+    steps = planner.steps
+    planner.update([types.SimpleNamespace(tag=1, position=steps[0].pylon)], [])
+    planner.skip(steps[0].cannons[0])
+    assert planner.next_cannon() == (1, steps[0].cannons[1])
+    planner.skip(steps[1].pylon)
+    assert planner.next_pylon() == steps[2].pylon
+    planner.skip((0, 0)) # Not a spot
+    assert planner.next_pylon() == steps[2].pylon
+
+
+def test_no_path():
+    planner = CannonPlanner()
+    planner.plan(np.ones((10, 10), dtype=bool), np.zeros((0, 2)), np.zeros(0), TARGET, 40, 10, 2)
+    assert planner.steps == [] and planner.location() is None and planner.next_pylon() is None
@@ -0,0 +1,63 @@
+import math
+
+import numpy as np
+
+import sc2
+from sc2.constants import ZEALOT, STALKER, MARAUDER, MARINE
+
+from synthetic_game import synthetic_game_data
+from combat_sim import CombatSimulator
+
+
+def simulator():
+    return CombatSimulator(sc2.game_data.GameData(synthetic_game_data()))
+
+
+def army(unit_type, count, health):
+    return [unit_type.value] * count, [health] * count, [False] * count
+
+
+def test_square_law():
+    # Same units, twice as many: the bigger side wins with sqrt(1 - 1/4) of its health left
+    winner, own_remaining, enemy_remaining = simulator().predict(*army(ZEALOT, 10, 150), *army(ZEALOT, 5, 150))
+    assert winner == 1
+    assert math.isclose(own_remaining, 1500 * math.sqrt(0.75))
+    assert enemy_remaining == 0
+
+    winner, own_remaining, enemy_remaining = simulator().predict(*army(ZEALOT, 5, 150), *army(ZEALOT, 10, 150))
+    assert winner == -1
+    assert own_remaining == 0
+    assert math.isclose(enemy_remaining, 1500 * math.sqrt(0.75))
+
+
+def test_even_fight_is_a_draw():
+    assert simulator().predict(*army(STALKER, 6, 160), *army(STALKER, 6, 160)) == (0, 0.0, 0.0)
+
+
+def test_empty_side():
+    assert simulator().predict(*army(ZEALOT, 3, 150), [], [], []) == (1, 450.0, 0.0)
+    assert simulator().predict([], [], [], *army(MARINE, 2, 45)) == (-1, 0.0, 90.0)
+
+
+def test_upgrades_decide_an_even_fight():
+    assert simulator().predict(*army(ZEALOT, 8, 150), *army(ZEALOT, 8, 150), own_upgrades=(1, 0))[0] == 1
+    assert simulator().predict(*army(ZEALOT, 8, 150), *army(ZEALOT, 8, 150), enemy_upgrades=(0, 1))[0] == -1
+
+
+def test_bonus_damage_against_armored():
+    combat = simulator()
+    rows = np.array([combat.row(MARAUDER.value), combat.row(STALKER.value), combat.row(ZEALOT.value)])
+    dps, weapon_range = combat.dps_matrix(rows[:1], rows[1:], np.zeros(2, dtype=bool), 0, 0)
+    assert dps[0, 0] > dps[0, 1] # Marauders deal bonus damage to armored stalkers, not to light zealots
+    assert weapon_range[0, 0] == 6
+
+
+def test_range_advantage():
+    # Stalkers shoot the zealots while they close in, so the zealots win with less health left than the square law alone gives them
+    combat = simulator()
+    winner, own_remaining, enemy_remaining = combat.predict(*army(STALKER, 10, 160), *army(ZEALOT, 10, 150))
+    rows = np.array([combat.row(STALKER.value), combat.row(ZEALOT.value)])
+    dps = combat.dps_matrix(rows, rows[::-1], np.zeros(2, dtype=bool), 0, 0)[0]
+    stalker_strength, zealot_strength = 10 * dps[0, 0] * 1600, 10 * dps[1, 1] * 1500
+    assert winner == -1
+    assert 0 < enemy_remaining < 1500 * math.sqrt(1 - stalker_strength / zealot_strength)
@@ -0,0 +1,79 @@
+import numpy as np
+
+import sc2
+from sc2.constants import MARINE, MARAUDER, BARRACKS
+from sc2.position import Point2
+
+from synthetic_game import synthetic_game_data
+from enemy_memory import EnemyMemory
+
+
+# Just what EnemyMemory reads from a unit
+class FakeUnit:
+    def __init__(self, tag, type_id, x, y, is_structure=False):
+        self.tag = tag
+        self.type_id = type_id
+        self.position = Point2((x, y))
+        self.health = 45
+        self.shield = 0
+        self.is_visible = True
+        self.is_ready = True
+        self.is_flying = False
+        self.is_structure = is_structure
+
+
+def memory(**kwargs):
+    return EnemyMemory(sc2.game_data.GameData(synthetic_game_data()), **kwargs)
+
+
+def test_grows_past_capacity():
+    enemies = memory(capacity=2)
+    units = [FakeUnit(i + 1, MARINE, i, 2 * i) for i in range(5)]
+    enemies.update(units, 0)
+    assert len(enemies) == 5
+    assert enemies.capacity >= 5
+    assert sorted(unit.tag for unit in enemies.units()) == [1, 2, 3, 4, 5]
+    assert enemies.positions[enemies.slots[5]].tolist() == [4, 8]
+    assert enemies.composition.amount(MARINE) == 5
+
+
+def test_forgets_dead_units_and_reuses_slots():
+    enemies = memory(capacity=4)
+    enemies.update([FakeUnit(1, MARINE, 0, 0), FakeUnit(2, MARAUDER, 1, 1)], 0)
+    slot = enemies.slots[1]
+    enemies.update([], 8, dead_tags=[1, 99])
+    assert 1 not in enemies.slots and len(enemies) == 1
+    assert enemies.composition.amount(MARINE) == 0 and enemies.composition.amount(MARAUDER) == 1
+
+    enemies.update([FakeUnit(3, MARINE, 2, 2)], 16)
+    assert enemies.slots[3] == slot
+    assert enemies.capacity == 4
+
+
+def test_forgets_units_missing_where_we_look():
+    enemies = memory()
+    enemies.update([FakeUnit(1, MARINE, 5.5, 5.5), FakeUnit(2, MARINE, 20.5, 20.5)], 0)
+    visible = np.zeros((32, 32), dtype=bool)
+    visible[0:10, 0:10] = True
+    enemies.update([], 8, visible)
+    assert list(enemies.slots) == [2] # The first one's position is in vision without it, the second one is in the fog
+
+
+def test_forgets_units_by_age_but_not_structures():
+    enemies = memory(max_unit_age=100)
+    enemies.update([FakeUnit(1, MARINE, 0, 0), FakeUnit(2, BARRACKS, 10, 10, is_structure=True)], 0)
+    enemies.update([], 100)
+    assert len(enemies) == 2
+    enemies.update([], 101)
+    assert list(enemies.slots) == [2]
+    assert enemies.composition.total_count == 0
+
+
+def test_morph_changes_composition():
+    enemies = memory()
+    enemies.update([FakeUnit(1, MARINE, 0, 0)], 0)
+    enemies.update([FakeUnit(1, MARAUDER, 0, 0)], 8)
+    assert enemies.composition.amount(MARINE) == 0
+    assert enemies.composition.amount(MARAUDER) == 1
+    assert enemies.composition.total_count == 1
+    assert enemies.composition.ratio(MARAUDER) == 1
@@ -0,0 +1,126 @@
+import heapq
+import math
+import types
+
+import numpy as np
+
+from sc2.pixel_map import PixelMap
+from s2clientprotocol import common_pb2
+
+from flow_field import FlowField, FlowFields
+
+
+# Shortest distances to target's cell with the same steps as FlowField (8 neighbours, no cutting corners)
+def dijkstra(pathable, target):
+    width, height = pathable.shape
+    distances = np.full(pathable.shape, np.inf)
+    distances[target] = 0
+    queue = [(0.0, target)]
+    while queue:
+        distance, (x, y) = heapq.heappop(queue)
+        if distance > distances[x, y]:
+            continue
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                nx, ny = x + dx, y + dy
+                if (dx, dy) == (0, 0) or not (0 <= nx < width and 0 <= ny < height) or not pathable[nx, ny]:
+                    continue
+                if dx and dy and not (pathable[x + dx, y] and pathable[x, y + dy]):
+                    continue
+                step = distance + (math.sqrt(2) if dx and dy else 1)
+                if step < distances[nx, ny]:
+                    distances[nx, ny] = step
+                    heapq.heappush(queue, (step, (nx, ny)))
+    return distances
+
+
+def random_grid(rng, size=40):
+    pathable = rng.random((size, size)) > 0.3
+    pathable[:, size // 2] = False # A wall with one gap
+    pathable[5, size // 2] = True
+    return pathable
+
+
+def test_reachability_and_distances_match_dijkstra():
+    rng = np.random.default_rng(0)
+    for i in range(10):
+        pathable = random_grid(rng)
+        xs, ys = np.nonzero(pathable)
+        target = (int(xs[0]), int(ys[0]))
+        field = FlowField(pathable, (target[0] + 0.5, target[1] + 0.5))
+        expected = dijkstra(pathable, target)
+
+        reachable = np.isfinite(expected)
+        assert np.array_equal(np.isfinite(field.distances), reachable)
+        # Fewest steps first, so never shorter than the shortest path, and not much longer
+        assert np.all(field.distances[reachable] >= expected[reachable] - 1e-3)
+        assert np.all(field.distances[reachable] <= expected[reachable] * 1.15 + 1e-3)
+
+
+def test_path_leads_to_target():
+    rng = np.random.default_rng(1)
+    pathable = random_grid(rng)
+    field = FlowField(pathable, (5.5, 5.5))
+    xs, ys = np.nonzero(np.isfinite(field.distances))
+    start = (xs[-1] + 0.5, ys[-1] + 0.5)
+    cells, distances = field.path(start)
+    assert tuple(cells[-1]) == (5.5, 5.5)
+    assert np.all(np.diff(distances) < 0)
+    assert pathable[(cells[:, 0] - 0.5).astype(int), (cells[:, 1] - 0.5).astype(int)].all()
+    assert field.towards(start, 1000) == (5.5, 5.5)
+
+
+def test_unreachable():
+    pathable = np.ones((10, 10), dtype=bool)
+    pathable[5, :] = False
+    field = FlowField(pathable, (2.5, 2.5))
+    assert field.distance((8.5, 8.5)) is None
+    assert field.towards((8.5, 8.5)) is None
+    assert len(field.path((8.5, 8.5))[0]) == 0
+
+
+def test_unpathable_target_starts_from_closest_cell():
+    pathable = np.ones((20, 20), dtype=bool)
+    pathable[8:12, 8:12] = False # A building on the target
+    field = FlowField(pathable, (10, 10))
+    assert math.isclose(field.distance((7.5, 9.5)), math.hypot(2.5, 0.5), rel_tol=1e-5) # One of the closest cells, which starts with its distance
+    assert field.distance((10.5, 15.5)) is not None
+
+
+def flow_fields(pathable):
+    width, height = pathable.shape
+    # PixelMap rows are stored top down (see pixel_map_to_array())
+    data = np.flip(pathable.T, axis=0).astype(np.uint8) * 255
+    grid = common_pb2.ImageData(bits_per_pixel=8, size=common_pb2.Size2DI(x=width, y=height), data=data.tobytes())
+    return FlowFields(types.SimpleNamespace(pathing_grid=PixelMap(grid)), recompute_interval=20)
+
+
+def test_fields_are_recomputed_at_most_one_per_step():
+    fields = flow_fields(np.ones((30, 30), dtype=bool))
+    fields.set_target("a", (2.5, 2.5))
+    fields.set_target("b", (27.5, 27.5))
+    fields.set_game_loop(0)
+    assert fields.distance("a", (2.5, 10.5)) == 8
+    fields.distance("b", (2.5, 10.5))
+    assert fields.compute_count == 2
+
+    # A wall: too soon to recompute, so the old fields are used
+    fields.update([(0, 6, 29, 1)])
+    fields.set_game_loop(8)
+    assert fields.distance("a", (2.5, 10.5)) == 8
+    fields.distance("b", (2.5, 10.5))
+    assert fields.compute_count == 2
+
+    # Old enough: one field per step
+    fields.set_game_loop(24)
+    assert fields.distance("a", (2.5, 10.5)) > 8
+    fields.distance("b", (2.5, 10.5))
+    assert fields.compute_count == 3
+    fields.set_game_loop(32)
+    fields.distance("b", (2.5, 10.5))
+    assert fields.compute_count == 4
+
+    # A moved target is recomputed right away
+    fields.set_target("a", (5.5, 2.5))
+    assert fields.distance("a", (5.5, 2.5)) == 0
+    assert fields.compute_count == 5
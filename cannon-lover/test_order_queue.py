@@ -0,0 +1,76 @@
+import itertools
+
+import sc2
+from sc2.constants import ZEALOT, STALKER, MOVE, ATTACK, GATEWAYTRAIN_ZEALOT
+from sc2.position import Point2
+from s2clientprotocol import raw_pb2
+
+from synthetic_game import synthetic_game_data
+from base_bot import BaseBot
+
+
+GAME_DATA = sc2.game_data.GameData(synthetic_game_data())
+
+
+# Our unit, optionally already carrying out an order (ability, target position or unit tag)
+def unit(tag, unit_type=ZEALOT, order=None):
+    proto = raw_pb2.Unit(tag=tag, unit_type=unit_type.value, alliance=1, health=100, health_max=100)
+    proto.pos.x, proto.pos.y = tag, tag
+    if order is not None:
+        ability, target = order
+        current = proto.orders.add(ability_id=ability.value)
+        if isinstance(target, int):
+            current.target_unit_tag = target
+        else:
+            current.target_world_space_pos.x, current.target_world_space_pos.y = target
+    return sc2.unit.Unit(proto, GAME_DATA)
+
+
+def send(bot, actions):
+    actions = [action for action in actions if not bot.is_redundant_order(action)]
+    return bot.coalesce_orders(actions)
+
+
+def test_drops_orders_the_unit_is_carrying_out():
+    bot = BaseBot()
+    moving, attacking = unit(1, order=(MOVE, (10, 10))), unit(2, order=(ATTACK, 7))
+    actions = send(bot, [
+        moving.move(Point2((10, 10))), # Same order
+        moving.move(Point2((10.05, 10))), # Within order_target_epsilon
+        attacking.attack(unit(7, STALKER)), # Same unit target
+        attacking.attack(Point2((7, 7))), # Different target
+    ])
+    assert [(action.unit.tag, action.ability) for action in actions] == [(2, ATTACK)]
+
+
+def test_drops_orders_given_twice():
+    bot = BaseBot()
+    zealot = unit(1)
+    actions = send(bot, [zealot.move(Point2((5, 5))), zealot.move(Point2((5, 5))), zealot.move(Point2((5, 5)), queue=True)])
+    assert len(actions) == 2 # Queued orders are never dropped
+
+
+def test_keeps_orders_without_target():
+    bot = BaseBot()
+    gateway = unit(1)
+    actions = [gateway(GATEWAYTRAIN_ZEALOT), gateway(GATEWAYTRAIN_ZEALOT)]
+    assert send(bot, actions) == actions # Each queues up another zealot
+
+
+def test_identical_orders_are_next_to_each_other():
+    bot = BaseBot()
+    units = [unit(tag) for tag in range(1, 5)]
+    target = Point2((20, 20))
+    actions = send(bot, [units[0].attack(target), units[1].move(target), units[2].attack(target), units[3].move(target)])
+    assert [action.unit.tag for action in actions] == [1, 3, 2, 4]
+    assert len(list(itertools.groupby(actions, key=lambda action: action.combining_tuple))) == 2 # Sent as two commands
+
+
+def test_orders_of_one_unit_keep_their_order():
+    bot = BaseBot()
+    first, second = unit(1), unit(2)
+    a, b = Point2((10, 10)), Point2((20, 20))
+    actions = send(bot, [first.move(a), second.move(b), first.move(b, queue=True), second.move(a, queue=True), second.move(b, queue=True)])
+    for tag in [1, 2]:
+        own = [action for action in actions if action.unit.tag == tag]
+        assert [(action.target, action.queue) for action in own] == ([(a, False), (b, True)] if tag == 1 else [(b, False), (a, True), (b, True)])
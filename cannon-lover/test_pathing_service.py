@@ -0,0 +1,66 @@
+import asyncio
+
+from sc2.position import Point2
+
+from pathing_service import PathingService
+
+
+# Stand-in for the game client: distances are straight lines, except to blocked points (no path), and every request is counted
+class FakeClient:
+    def __init__(self, blocked=()):
+        self.blocked = set(blocked)
+        self.requests = []
+
+    async def query_pathings(self, pairs):
+        self.requests.append(pairs)
+        return [0.0 if end in self.blocked else start.distance_to(end) for start, end in pairs]
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+def test_batch_is_one_request():
+    client = FakeClient(blocked=[Point2((9, 9))])
+    pathing = PathingService(client)
+    distances = run(pathing.distances([(Point2((0, 0)), Point2((3, 4))), (Point2((0, 0)), Point2((6, 8))), (Point2((0, 0)), Point2((9, 9)))]))
+    assert distances == [5.0, 10.0, None]
+    assert len(client.requests) == 1
+    assert pathing.request_count == 1
+
+
+def test_memo_hits():
+    client = FakeClient()
+    pathing = PathingService(client)
+    run(pathing.distances([(Point2((0, 0)), Point2((3, 4)))]))
+
+    # Same pair, and a pair that rounds to the same key: no request
+    assert run(pathing.distance(Point2((0, 0)), Point2((3, 4)))) == 5.0
+    assert run(pathing.distance(Point2((0.2, 0.1)), Point2((3.1, 4.2)))) == 5.0
+    assert len(client.requests) == 1
+
+    # Only the new pair is asked for, and repeats in a batch are asked for once
+    run(pathing.distances([(Point2((0, 0)), Point2((3, 4))), (Point2((0, 0)), Point2((0, 2))), (Point2((0, 0)), Point2((0, 2)))]))
+    assert len(client.requests) == 2
+    assert len(client.requests[1]) == 1
+
+
+def test_memo_reset():
+    client = FakeClient()
+    pathing = PathingService(client, max_memo_size=2)
+    run(pathing.distances([(Point2((0, 0)), Point2((1, 1)))]))
+
+    # Remembered pair plus two new ones don't fit, so the memo is reset and the whole batch is asked for
+    distances = run(pathing.distances([(Point2((0, 0)), Point2((1, 1))), (Point2((0, 0)), Point2((0, 2))), (Point2((0, 0)), Point2((0, 3)))]))
+    assert distances == [Point2((0, 0)).distance_to(Point2((1, 1))), 2.0, 3.0]
+    assert len(client.requests) == 2
+    assert len(client.requests[1]) == 3
+
+
+def test_invalidate():
+    client = FakeClient()
+    pathing = PathingService(client)
+    run(pathing.distances([(Point2((0, 0)), Point2((3, 4)))]))
+    pathing.invalidate()
+    assert run(pathing.distance(Point2((0, 0)), Point2((3, 4)))) == 5.0
+    assert len(client.requests) == 2
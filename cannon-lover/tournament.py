@@ -0,0 +1,147 @@
+# Play a batch of CannonLoverBot games across a process pool (one worker per core) and collect them into one report.
+# Games run against the offline stand-in client (synthetic games, see synthetic_game.py) unless --live is given.
+# Usage: python tournament.py [--games 20] [--maps ...] [--races Terran Zerg] [--difficulties VeryHard] [--live] [--timeout 600] [--report tournament]
+import os, csv, json, time, asyncio, argparse, logging, itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import sc2
+from sc2 import Race, Difficulty
+from sc2.player import Bot, Computer
+
+from benchmark import summarize
+from map_pool import MAP_POOL
+
+
+REPORT_FIELDS = ["game", "map", "race", "difficulty", "seed", "result", "game_loop", "game_time", "steps", "wall_time", "step_ms_mean", "step_ms_p50", "step_ms_p95", "step_ms_max", "error"]
+
+
+# List of games to play: the map/race/difficulty combinations in turn until there are count games
+def schedule_games(count, maps, races, difficulties, seed=0):
+    combinations = itertools.cycle(itertools.product(maps, races, difficulties))
+    return [{"game": i, "map": map_name, "race": race, "difficulty": difficulty, "seed": seed + i}
+            for i, (map_name, race, difficulty) in zip(range(count), combinations)]
+
+
+# Play one game (in a worker process) and return its report row
+def play_game(game, live=False, steps=200, timeout=None):
+    from cannon_lover_bot import CannonLoverBot
+
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.set_event_loop(asyncio.new_event_loop())
+
+    bot = CannonLoverBot()
+    bot.profiling = False
+    bot.random.seed(game["seed"]) # Same random choices for the same game, so results can be reproduced
+
+    durations = []
+    on_step = bot.on_step
+    async def timed_on_step(iteration):
+        start = time.perf_counter()
+        await on_step(iteration)
+        durations.append(time.perf_counter() - start)
+    bot.on_step = timed_on_step
+
+    race, difficulty = Race[game["race"]], Difficulty[game["difficulty"]]
+    if live:
+        players = [Bot(Race.Protoss, bot), Computer(race, difficulty)]
+        coroutine = sc2.main._host_game(sc2.maps.get(game["map"]), players, realtime=False)
+    else:
+        from synthetic_game import synthetic_game
+        from offline_client import run_offline_game
+        bot.map_cache_dir = None # The synthetic map only borrows the ladder map's name, so keep its analysis out of the map cache
+        client = synthetic_game(steps=steps, seed=game["seed"], enemy_race=race, difficulty=difficulty, map_name=game["map"])
+        coroutine = run_offline_game(bot, client)
+
+    row = dict(game, result=None, game_loop=None, game_time=None, steps=0, error=None)
+    start = time.perf_counter()
+    try:
+        result = asyncio.get_event_loop().run_until_complete(asyncio.wait_for(coroutine, timeout))
+        row["result"] = result.name if result else None
+    except asyncio.TimeoutError:
+        row["result"] = "Timeout"
+    except Exception as e:
+        row["result"] = "Error"
+        row["error"] = repr(e)
+    row["wall_time"] = time.perf_counter() - start
+
+    if getattr(bot, "state", None):
+        row["game_loop"] = bot.state.game_loop
+        row["game_time"] = bot.get_game_time()
+    row["steps"] = len(durations)
+    if durations:
+        for key, value in summarize(durations, 1000).items():
+            row["step_ms_" + key] = value
+    return row
+
+
+# Play all games across a process pool. Returns report rows in game order
+def run_tournament(games, live=False, steps=200, timeout=None, workers=None):
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = {executor.submit(play_game, game, live, steps, timeout): game for game in games}
+        for future in as_completed(futures):
+            try:
+                row = future.result()
+            except Exception as e: # Worker process died
+                row = dict(futures[future], result="Error", error=repr(e))
+            print("Game %d on %s vs %s %s: %s" % (row["game"], row["map"], row["race"], row["difficulty"], row["result"]))
+            rows.append(row)
+    return sorted(rows, key=lambda row: row["game"])
+
+
+# Results per opponent race and overall
+def aggregate(rows):
+    def totals(rows):
+        results = {}
+        for row in rows:
+            results[row["result"]] = results.get(row["result"], 0) + 1
+        step_times = [row["step_ms_p95"] for row in rows if row.get("step_ms_p95") is not None]
+        return {
+            "games": len(rows),
+            "results": results,
+            "win_rate": results.get("Victory", 0) / len(rows) if rows else 0,
+            "step_ms_p95_max": max(step_times) if step_times else None,
+        }
+
+    return {
+        "total": totals(rows),
+        "by_race": {race: totals([row for row in rows if row["race"] == race]) for race in sorted(set(row["race"] for row in rows))},
+        "by_map": {map_name: totals([row for row in rows if row["map"] == map_name]) for map_name in sorted(set(row["map"] for row in rows))},
+    }
+
+
+# Write report_path.csv (one row per game) and report_path.json (games and aggregates)
+def save_report(rows, report_path):
+    with open(report_path + ".csv", "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+    with open(report_path + ".json", "w") as file:
+        json.dump({"summary": aggregate(rows), "games": rows}, file, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a batch of CannonLoverBot games")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--maps", nargs="+", default=MAP_POOL)
+    parser.add_argument("--races", nargs="+", default=["Terran", "Zerg", "Protoss", "Random"], choices=[race.name for race in Race if race != Race.NoRace])
+    parser.add_argument("--difficulties", nargs="+", default=["VeryHard"], choices=[difficulty.name for difficulty in Difficulty])
+    parser.add_argument("--live", action="store_true", help="Play real games (needs the game binary) instead of offline synthetic games")
+    parser.add_argument("--steps", type=int, default=200, help="Steps per offline game")
+    parser.add_argument("--timeout", type=float, default=None, help="Wall-clock seconds before a game is given up on")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default one per core)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", default="tournament", help="Report path, without .csv/.json")
+    args = parser.parse_args()
+
+    games = schedule_games(args.games, args.maps, args.races, args.difficulties, args.seed)
+    rows = run_tournament(games, args.live, args.steps, args.timeout, args.workers)
+    save_report(rows, args.report)
+
+    summary = aggregate(rows)["total"]
+    print("%d games: %s (report saved to %s.csv/.json)" % (summary["games"], summary["results"], args.report))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import numpy as np
+
+
+LOOPS_PER_SECOND = 22.4 # Game loops per second on faster game speed
+
+
+# Remembers health and shield of our units over the last `length` steps, in ring buffers (one row per unit) keyed by tag.
+# Besides health and shield, each sample holds the total damage the unit has taken so far, so damage taken over the whole
+# window is one subtraction and shield regeneration doesn't hide damage. Rows are freed when units die.
+class UnitHistory:
+    def __init__(self, length=16, capacity=64):
+        self.length = length
+        self.slots = {} # Tag -> row
+        self.free_slots = list(range(capacity - 1, -1, -1))
+        self.tags = np.zeros(capacity, dtype=np.uint64)
+        self.loops = np.zeros((capacity, length), dtype=np.int64) # Game loop of each sample
+        self.health = np.zeros((capacity, length), dtype=np.float64)
+        self.shield = np.zeros((capacity, length), dtype=np.float64)
+        self.damage = np.zeros((capacity, length), dtype=np.float64) # Total damage taken up to each sample
+        self.head = np.zeros(capacity, dtype=np.int64) # Column of the latest sample
+        self.count = np.zeros(capacity, dtype=np.int64) # Number of samples (up to length)
+        self.updated = np.zeros(capacity, dtype=np.int64) # Step of the latest sample
+        self.is_used = np.zeros(capacity, dtype=bool)
+        self.step = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    @property
+    def capacity(self):
+        return len(self.tags)
+
+    # Double the number of rows
+    def grow(self):
+        capacity = self.capacity
+        for name in ["tags", "loops", "health", "shield", "damage", "head", "count", "updated", "is_used"]:
+            array = getattr(self, name)
+            grown = np.zeros((capacity * 2,) + array.shape[1:], dtype=array.dtype)
+            grown[:capacity] = array
+            setattr(self, name, grown)
+        self.free_slots.extend(range(capacity * 2 - 1, capacity - 1, -1))
+
+    def allocate(self, tag):
+        if not self.free_slots:
+            self.grow()
+        slot = self.free_slots.pop()
+        self.slots[tag] = slot
+        self.tags[slot] = tag
+        self.head[slot] = self.length - 1 # So the first sample goes to column 0
+        self.count[slot] = 0
+        self.is_used[slot] = True
+        return slot
+
+    def free(self, slot):
+        del self.slots[int(self.tags[slot])]
+        self.is_used[slot] = False
+        self.free_slots.append(slot)
+
+    # Add a sample for each of our units. dead_tags are the units that died this step. Must be called once per step
+    def update(self, units, game_loop, dead_tags=()):
+        self.step += 1
+        for tag in dead_tags:
+            if tag in self.slots:
+                self.free(self.slots[tag])
+
+        if units:
+            slots = np.array([self.slots[unit.tag] if unit.tag in self.slots else self.allocate(unit.tag) for unit in units], dtype=np.int64)
+            health = np.array([unit.health for unit in units], dtype=np.float64)
+            shield = np.array([unit.shield for unit in units], dtype=np.float64)
+
+            previous = self.head[slots]
+            has_previous = self.count[slots] > 0
+            lost = (self.health[slots, previous] + self.shield[slots, previous]) - (health + shield)
+            damage = np.where(has_previous, self.damage[slots, previous] + np.maximum(lost, 0), 0)
+
+            head = (previous + 1) % self.length
+            self.head[slots] = head
+            self.count[slots] = np.minimum(self.count[slots] + 1, self.length)
+            self.loops[slots, head] = game_loop
+            self.health[slots, head] = health
+            self.shield[slots, head] = shield
+            self.damage[slots, head] = damage
+            self.updated[slots] = self.step
+
+        # Free rows of units we haven't seen for the whole window (e.g. morphed into something with a new tag)
+        stale = self.is_used & (self.updated <= self.step - self.length)
+        for slot in np.flatnonzero(stale):
+            self.free(slot)
+
+    # Row and columns of the oldest and latest samples of a unit (None if we don't have two samples yet)
+    def window(self, unit):
+        slot = self.slots.get(unit.tag)
+        if slot is None or self.count[slot] < 2:
+            return None
+        head = self.head[slot]
+        return slot, (head - self.count[slot] + 1) % self.length, head
+
+    # Average damage per game second taken during the last `length` steps
+    def damage_per_second(self, unit):
+        window = self.window(unit)
+        if window is None:
+            return 0.0
+        slot, oldest, head = window
+        loops = self.loops[slot, head] - self.loops[slot, oldest]
+        if loops <= 0:
+            return 0.0
+        return float(self.damage[slot, head] - self.damage[slot, oldest]) * LOOPS_PER_SECOND / loops
+
+    # Game seconds until the unit dies if it keeps taking damage at the current rate (inf if it isn't taking damage)
+    def time_to_death(self, unit):
+        damage_per_second = self.damage_per_second(unit)
+        if damage_per_second <= 0:
+            return float("inf")
+        return (unit.health + unit.shield) / damage_per_second
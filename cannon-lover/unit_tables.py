@@ -0,0 +1,45 @@
+import sc2
+
+
+# Units grouped by type in one pass, so lookups by type don't filter all units again.
+# table(NEXUS) or table(GATEWAY, WARPGATE) give all units of the types, and table.ready(), table.not_ready() and table.idle()
+# (ready and without orders) the same subsets as Units.ready, Units.not_ready and Units.ready.noqueue. Built once per step.
+class UnitTable:
+    def __init__(self, units, game_data):
+        self.game_data = game_data
+        self.by_type = {} # Type -> list of units
+        for unit in units:
+            self.by_type.setdefault(unit.type_id, []).append(unit)
+        self.cache = {} # (subset, types) -> Units
+
+    def lookup(self, subset, types):
+        key = (subset, types)
+        if key not in self.cache:
+            units = [unit for unit_type in types for unit in self.by_type.get(unit_type, ())]
+            if subset == "ready":
+                units = [unit for unit in units if unit.is_ready]
+            elif subset == "not_ready":
+                units = [unit for unit in units if not unit.is_ready]
+            elif subset == "idle":
+                units = [unit for unit in units if unit.is_ready and not unit.orders]
+            self.cache[key] = sc2.units.Units(units, self.game_data)
+        return self.cache[key]
+
+    def __call__(self, *types):
+        return self.lookup("all", types)
+
+    def ready(self, *types):
+        return self.lookup("ready", types)
+
+    def not_ready(self, *types):
+        return self.lookup("not_ready", types)
+
+    def idle(self, *types):
+        return self.lookup("idle", types)
+
+    # Number of units of the types (same as table(*types).amount)
+    def amount(self, *types):
+        return sum(len(self.by_type.get(unit_type, ())) for unit_type in types)
+
+    def exists(self, *types):
+        return any(unit_type in self.by_type for unit_type in types)
@@ -0,0 +1,80 @@
+import numpy as np
+
+import sc2
+
+from map_grid import pixel_map_to_array
+
+
+# Hands out warp-in spots for warpgates: pathable cells inside a power field (pylons and phasing warp prisms)
+# that aren't covered by a structure or a ground unit. Spots are on every other cell, so units warped in next to each other
+# don't overlap, and each spot is only handed out once per step.
+class WarpPlanner:
+    def __init__(self, game_info, spacing=2):
+        self.pathable = pixel_map_to_array(game_info.pathing_grid) > 0
+        self.spacing = spacing
+        self.power_sources = ()
+        self.blocked = None
+        self.units = ()
+        self.available = None # Cells we can warp in to this step (computed when first needed)
+        self.taken = set() # Spots handed out this step
+        self.spots_cache = {}
+
+    # Set this step's power sources (e.g. self.state.psionic_matrix.sources), blocked cells (e.g. PlacementGrid.occupied > 0)
+    # and ground units. Must be called once per step, before take()
+    def update(self, power_sources, blocked, units):
+        self.power_sources = power_sources
+        self.blocked = blocked
+        self.units = units
+        self.available = None
+        self.taken = set()
+        self.spots_cache = {}
+
+    # Boolean grid [x, y] of cells a unit can be warped in to
+    def available_cells(self):
+        if self.available is None:
+            width, height = self.pathable.shape
+            powered = np.zeros(self.pathable.shape, dtype=bool)
+            for source in self.power_sources:
+                position, radius = source.position, source.radius
+                x0, x1 = max(int(position.x - radius), 0), min(int(position.x + radius) + 1, width)
+                y0, y1 = max(int(position.y - radius), 0), min(int(position.y + radius) + 1, height)
+                if x0 >= x1 or y0 >= y1:
+                    continue
+                xs, ys = np.meshgrid(np.arange(x0, x1) + 0.5, np.arange(y0, y1) + 0.5, indexing="ij")
+                powered[x0:x1, y0:y1] |= (xs - position.x) ** 2 + (ys - position.y) ** 2 <= radius ** 2
+
+            available = self.pathable & powered
+            if self.blocked is not None:
+                available &= ~self.blocked
+
+            # Cells under ground units
+            for unit in self.units:
+                position = unit.position
+                radius = max(unit.radius, 0.5)
+                available[max(int(position.x - radius), 0):int(position.x + radius) + 1, max(int(position.y - radius), 0):int(position.y + radius) + 1] = False
+
+            self.available = available
+        return self.available
+
+    # All warp-in spots (within max_distance of near, if given), closest first
+    def spots(self, near, max_distance=None):
+        key = (round(near.x), round(near.y), max_distance)
+        if key not in self.spots_cache:
+            available = self.available_cells()
+            xs, ys = np.nonzero(available)
+            lattice = (xs % self.spacing == 0) & (ys % self.spacing == 0)
+            xs, ys = xs[lattice] + 0.5, ys[lattice] + 0.5
+
+            distances = np.hypot(xs - near.x, ys - near.y)
+            within = distances <= (max_distance if max_distance is not None else np.inf)
+            order = np.argsort(distances[within], kind="stable")
+            self.spots_cache[key] = [(float(x), float(y)) for x, y in zip(xs[within][order], ys[within][order])]
+        return self.spots_cache[key]
+
+    # Closest spot to near that hasn't been handed out this step, or None if there's none
+    def take(self, near, max_distance=None):
+        for spot in self.spots(near, max_distance):
+            if spot not in self.taken:
+                self.taken.add(spot)
+                return sc2.position.Point2(spot)
+        return None